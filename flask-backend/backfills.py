@@ -0,0 +1,53 @@
+import time
+
+
+def backfill_in_batches(conn, table, key, statement, chunk_size=1000, pause=0.0, log=print):
+    """Run `statement` over ranges of `table`.`key`, one committed batch each.
+
+    `statement` is bound with %(lo)s / %(hi)s (half-open key range) and
+    should be idempotent, so an interrupted backfill can simply be re-run.
+    Committing per batch keeps row locks and WAL bursts short; `pause`
+    seconds between batches further throttles a backfill on a busy primary.
+    Returns the total row count reported by the statement.
+    """
+    with conn.cursor() as cur:
+        cur.execute(f"SELECT MIN({key}) AS lo, MAX({key}) AS hi FROM {table};")
+        bounds = cur.fetchone()
+    conn.commit()
+    if bounds["lo"] is None:
+        return 0
+
+    total = 0
+    for start in range(bounds["lo"], bounds["hi"] + 1, chunk_size):
+        with conn.cursor() as cur:
+            cur.execute(statement, {"lo": start, "hi": start + chunk_size})
+            total += cur.rowcount
+        conn.commit()
+        log(f"{table} {start}..{start + chunk_size - 1}: {total} updated so far")
+        if pause:
+            time.sleep(pause)
+    return total
+
+def backfill_last_activity(conn, chunk_size=1000, log=print):
+    """Populate Accounts.last_activity_at for existing accounts.
+
+    Rows the fraud trigger has already filled in are skipped, and GREATEST
+    keeps a newer value written concurrently. Returns the number of
+    accounts updated.
+    """
+    return backfill_in_batches(
+        conn, "Accounts", "account_id",
+        """
+        UPDATE Accounts a
+        SET last_activity_at = GREATEST(a.last_activity_at, t.last_tx)
+        FROM (
+          SELECT account_id, MAX(transaction_time) AS last_tx
+          FROM Transactions
+          WHERE account_id >= %(lo)s AND account_id < %(hi)s
+          GROUP BY account_id
+        ) t
+        WHERE a.account_id = t.account_id
+          AND a.last_activity_at IS NULL;
+        """,
+        chunk_size, log=log
+    )
@@ -0,0 +1,155 @@
+"""Hammer one account with concurrent deposits and withdrawals through the
+deposit/withdraw routes and check that no update was lost.
+
+    cd flask-backend && python -m bench.balance_concurrency --threads 8 --requests 500
+
+Requests go through the Flask test client (routes, JWT and the connection
+pool included) from worker threads. With --legacy the same mix runs as
+the old SELECT / compute / UPDATE sequence on direct connections instead,
+for comparison. A throwaway user and account are created; the ledger is
+append-only, so they stay behind afterwards, emptied back to SYS-CASH and
+blocked.
+"""
+import argparse
+import random
+import threading
+import time
+from decimal import Decimal
+
+import psycopg2
+from flask_jwt_extended import create_access_token
+from psycopg2.extras import RealDictCursor
+
+import config
+from app import app
+
+OPENING_BALANCE = Decimal("1000.00")
+
+
+def setup(conn):
+    tag = f"bench{time.time_ns()}"
+    with conn.cursor() as cur:
+        cur.execute(
+            "INSERT INTO Users (username, email, role) VALUES (%s, %s, 'user')"
+            " RETURNING user_id;", (tag, f"{tag}@bench.invalid")
+        )
+        user_id = cur.fetchone()["user_id"]
+        cur.execute(
+            "INSERT INTO Accounts (user_id, account_number, balance) VALUES (%s, %s, %s)"
+            " RETURNING account_id;", (user_id, tag[-20:], OPENING_BALANCE)
+        )
+        acct_id = cur.fetchone()["account_id"]
+        cur.execute(
+            "SELECT post_journal(ARRAY[%s, cash_account_id()], ARRAY[%s, -%s]::NUMERIC[],"
+            " ARRAY[NULL, NULL]::INT[]);", (acct_id, OPENING_BALANCE, OPENING_BALANCE)
+        )
+    conn.commit()
+    return user_id, acct_id
+
+def teardown(conn, acct_id):
+    with conn.cursor() as cur:
+        cur.execute(
+            "SELECT post_journal(ARRAY[%(a)s, cash_account_id()],"
+            " ARRAY[-account_balance(%(a)s), account_balance(%(a)s)], ARRAY[NULL, NULL]::INT[])"
+            " WHERE account_balance(%(a)s) <> 0;", {"a": acct_id}
+        )
+        cur.execute("UPDATE Accounts SET account_status = 'blocked', balance = 0"
+                    " WHERE account_id = %s;", (acct_id,))
+    conn.commit()
+
+def route_worker(user_id, acct_id, ops, results):
+    client = app.test_client()
+    with app.app_context():
+        token = create_access_token(identity=str(user_id), additional_claims={"role": "user"})
+    headers = {"Authorization": f"Bearer {token}"}
+    for kind, amount in ops:
+        r = client.post(f"/api/user/accounts/{acct_id}/{kind}",
+                        json={"amount": amount}, headers=headers)
+        results.append((kind, amount, r.status_code == 201))
+
+def legacy_worker(user_id, acct_id, ops, results):
+    # The pre-CTE route body: read, compute in Python, write back. This
+    # works on the Accounts.balance snapshot, bypassing the ledger.
+    conn = psycopg2.connect(config.DATABASE_URL, cursor_factory=RealDictCursor)
+    try:
+        for kind, amount in ops:
+            with conn.cursor() as cur:
+                cur.execute(
+                    "SELECT balance FROM Accounts WHERE account_id = %s AND user_id = %s;",
+                    (acct_id, user_id)
+                )
+                balance = cur.fetchone()["balance"]
+                if kind == "withdraw" and balance < amount:
+                    conn.rollback()
+                    results.append((kind, amount, False))
+                    continue
+                new_bal = balance + amount if kind == "deposit" else balance - amount
+                cur.execute("UPDATE Accounts SET balance = %s WHERE account_id = %s;",
+                            (new_bal, acct_id))
+                cur.execute(
+                    "INSERT INTO Transactions (account_id, transaction_type, amount, details)"
+                    " VALUES (%s, %s, %s, 'bench');",
+                    (acct_id, "deposit" if kind == "deposit" else "withdrawal", amount)
+                )
+            conn.commit()
+            results.append((kind, amount, True))
+    finally:
+        conn.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent balance update benchmark.")
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=500, help="Per thread.")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--legacy", action="store_true",
+                        help="Run the old read-modify-write sequence instead.")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    plans = [
+        [(rng.choice(("deposit", "withdraw")), rng.randint(1, 50))
+         for _ in range(args.requests)]
+        for _ in range(args.threads)
+    ]
+    conn = psycopg2.connect(config.DATABASE_URL, cursor_factory=RealDictCursor)
+    user_id, acct_id = setup(conn)
+    try:
+        results = []
+        worker = legacy_worker if args.legacy else route_worker
+        threads = [threading.Thread(target=worker, args=(user_id, acct_id, ops, results))
+                   for ops in plans]
+        started = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - started
+
+        with conn.cursor() as cur:
+            cur.execute(
+                "SELECT balance FROM Accounts WHERE account_id = %s;" if args.legacy
+                else "SELECT account_balance(%s) AS balance;", (acct_id,)
+            )
+            balance = cur.fetchone()["balance"]
+            cur.execute(
+                "SELECT COALESCE(SUM(CASE WHEN transaction_type = 'deposit'"
+                " THEN amount ELSE -amount END), 0) AS net"
+                " FROM Transactions WHERE account_id = %s;", (acct_id,)
+            )
+            ledger = OPENING_BALANCE + cur.fetchone()["net"]
+        conn.commit()
+    finally:
+        teardown(conn, acct_id)
+        conn.close()
+
+    expected = OPENING_BALANCE + sum(
+        (a if kind == "deposit" else -a) for kind, a, ok in results if ok)
+    rejected = sum(1 for _, _, ok in results if not ok)
+    print(f"{'legacy' if args.legacy else 'routes'}: {len(results)} requests,"
+          f" {args.threads} threads, {len(results) / elapsed:,.0f} req/s, {rejected} rejected")
+    print(f"balance {balance}, expected {expected}, transactions say {ledger}")
+    ok = balance == expected == ledger and balance >= 0
+    print("NO LOST UPDATES" if ok else f"LOST UPDATES: off by {balance - expected}")
+
+if __name__ == "__main__":
+    main()
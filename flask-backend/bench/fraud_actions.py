@@ -0,0 +1,161 @@
+"""Triage of pending fraud incidents one HTTP request per log, through
+/api/admin/update-fraud-action and /api/admin/resolve/<log_id>, versus
+batched through /api/admin/fraud-logs/actions.
+
+    cd flask-backend && python -m bench.fraud_actions --incidents 10000 --batch-size 10000
+
+Each incident is one transaction with one pending log, on throwaway
+accounts. The same seeded actions run once per mode, from a fresh pending
+state, then once more as one operation per account. The accounts hold no
+ledger postings, so everything is deleted at the end.
+"""
+import argparse
+import random
+import time
+
+import psycopg2
+from flask_jwt_extended import create_access_token
+from psycopg2.extras import RealDictCursor
+
+import config
+from app import app
+
+ACTIONS = ("resolved", "blocked", "restricted", "limited")
+
+
+def setup(conn, n_accounts, n_incidents):
+    tag = f"bench{time.time_ns()}"
+    with conn.cursor() as cur:
+        cur.execute(
+            "INSERT INTO Users (username, email, role) VALUES (%s, %s, 'user')"
+            " RETURNING user_id;", (tag, f"{tag}@bench.invalid")
+        )
+        user_id = cur.fetchone()["user_id"]
+        cur.execute(
+            "INSERT INTO Accounts (user_id, account_number)"
+            " SELECT %s, %s || lpad(i::text, 5, '0') FROM generate_series(1, %s) i"
+            " RETURNING account_id;", (user_id, tag[-15:], n_accounts)
+        )
+        accounts = sorted(r["account_id"] for r in cur.fetchall())
+        # A day apart, so the rules have nothing to flag.
+        cur.execute(
+          """
+          INSERT INTO Transactions (account_id, transaction_type, amount, transaction_time)
+          SELECT (%s::int[])[1 + i %% %s], 'deposit', 10, now() - make_interval(days => i / %s)
+          FROM generate_series(0, %s - 1) i
+          RETURNING transaction_id;
+          """,
+          (accounts, n_accounts, n_accounts, n_incidents)
+        )
+        transactions = [r["transaction_id"] for r in cur.fetchall()]
+        cur.execute(
+          """
+          INSERT INTO TransactionLogs (transaction_id, detected_rule)
+          SELECT unnest(%s::int[]), 'bench'
+          RETURNING log_id;
+          """,
+          (transactions,)
+        )
+        logs = sorted(r["log_id"] for r in cur.fetchall())
+    conn.commit()
+    return user_id, accounts, logs
+
+def reset(conn, accounts, logs):
+    with conn.cursor() as cur:
+        cur.execute("UPDATE Accounts SET account_status = 'active' WHERE account_id = ANY(%s);",
+                    (accounts,))
+        cur.execute("UPDATE TransactionLogs SET status = 'pending' WHERE log_id = ANY(%s);",
+                    (logs,))
+    conn.commit()
+
+def pending(conn, logs):
+    with conn.cursor() as cur:
+        cur.execute("SELECT COUNT(*) AS n FROM TransactionLogs"
+                    " WHERE log_id = ANY(%s) AND status = 'pending';", (logs,))
+        n = cur.fetchone()["n"]
+    conn.commit()
+    return n
+
+def teardown(conn, user_id, accounts):
+    with conn.cursor() as cur:
+        cur.execute(
+            "DELETE FROM TransactionLogs f USING Transactions t"
+            " WHERE f.transaction_id = t.transaction_id AND t.account_id = ANY(%s);",
+            (accounts,)
+        )
+        cur.execute("DELETE FROM Transactions WHERE account_id = ANY(%s);", (accounts,))
+        cur.execute("DELETE FROM Accounts WHERE account_id = ANY(%s);", (accounts,))
+        cur.execute("DELETE FROM Users WHERE user_id = %s;", (user_id,))
+    conn.commit()
+
+def per_item(client, headers, ops, account_of):
+    for log_id, action in ops:
+        if action == "resolved":
+            client.post(f"/api/admin/resolve/{log_id}", headers=headers)
+        else:
+            client.post("/api/admin/update-fraud-action", headers=headers, json={
+                "log_id": log_id, "account_id": account_of[log_id], "new_status": action})
+    return len(ops)
+
+def batched(client, headers, ops, batch_size):
+    requests = 0
+    for i in range(0, len(ops), batch_size):
+        resp = client.post("/api/admin/fraud-logs/actions", headers=headers,
+                           json={"operations": ops[i:i + batch_size]})
+        assert resp.status_code == 200, resp.get_json()
+        assert not resp.get_json()["failed"], resp.get_json()
+        requests += 1
+    return requests
+
+def timed(conn, label, logs, n_incidents, fn):
+    started = time.perf_counter()
+    requests = fn()
+    elapsed = time.perf_counter() - started
+    left = pending(conn, logs)
+    print(f"{label:<12}: {n_incidents} incidents in {requests} requests, {elapsed:.2f}s,"
+          f" {n_incidents / elapsed:,.0f} incidents/s, {left} left pending")
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-item vs batch fraud incident triage benchmark.")
+    parser.add_argument("--incidents", type=int, default=10000)
+    parser.add_argument("--accounts", type=int, default=1000)
+    parser.add_argument("--batch-size", type=int, default=config.INCIDENT_BATCH_MAX)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    conn = psycopg2.connect(config.DATABASE_URL, cursor_factory=RealDictCursor)
+    user_id, accounts, logs = setup(conn, args.accounts, args.incidents)
+    try:
+        with conn.cursor() as cur:
+            cur.execute(
+                "SELECT f.log_id, t.account_id FROM TransactionLogs f"
+                " JOIN Transactions t ON t.transaction_id = f.transaction_id"
+                " WHERE f.log_id = ANY(%s);", (logs,)
+            )
+            account_of = {r["log_id"]: r["account_id"] for r in cur.fetchall()}
+        conn.commit()
+
+        rng = random.Random(args.seed)
+        ops = [(log_id, rng.choice(ACTIONS)) for log_id in logs]
+        client = app.test_client()
+        with app.app_context():
+            token = create_access_token(identity="0", additional_claims={"role": "admin"})
+        headers = {"Authorization": f"Bearer {token}"}
+
+        timed(conn, "per-item", logs, args.incidents,
+              lambda: per_item(client, headers, ops, account_of))
+        reset(conn, accounts, logs)
+        timed(conn, "batch", logs, args.incidents,
+              lambda: batched(client, headers,
+                              [{"log_id": l, "action": a} for l, a in ops], args.batch_size))
+        reset(conn, accounts, logs)
+        timed(conn, "batch/acct", logs, args.incidents,
+              lambda: batched(client, headers,
+                              [{"account_id": a, "action": rng.choice(ACTIONS)} for a in accounts],
+                              args.batch_size))
+    finally:
+        teardown(conn, user_id, accounts)
+        conn.close()
+
+if __name__ == "__main__":
+    main()
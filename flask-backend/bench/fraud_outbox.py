@@ -0,0 +1,156 @@
+"""Route latency with fraud detection in the trigger (sync) versus queued
+to the outbox (async), and how fast the outbox workers catch up.
+
+    cd flask-backend && python -m bench.fraud_outbox --threads 8 --requests 200
+
+The same seeded deposit/withdraw mix runs through the routes once per
+mode, on fresh accounts. In async mode the outbox is then drained with
+the worker pool from outbox.py. The detection mode is restored at the
+end. The throwaway user and accounts stay behind (the ledger is
+append-only), emptied back to SYS-CASH and blocked.
+"""
+import argparse
+import random
+import threading
+import time
+from decimal import Decimal
+
+import psycopg2
+from flask_jwt_extended import create_access_token
+from psycopg2.extras import RealDictCursor
+
+import config
+from app import app
+from outbox import OutboxWorkers, outbox_lag
+
+OPENING_BALANCE = Decimal("1000.00")
+
+
+def setup(conn, n_accounts):
+    tag = f"bench{time.time_ns()}"
+    with conn.cursor() as cur:
+        cur.execute(
+            "INSERT INTO Users (username, email, role) VALUES (%s, %s, 'user')"
+            " RETURNING user_id;", (tag, f"{tag}@bench.invalid")
+        )
+        user_id = cur.fetchone()["user_id"]
+        accounts = []
+        for i in range(n_accounts):
+            cur.execute(
+                "INSERT INTO Accounts (user_id, account_number, balance) VALUES (%s, %s, %s)"
+                " RETURNING account_id;", (user_id, f"{tag[-17:]}{i:03d}", OPENING_BALANCE)
+            )
+            accounts.append(cur.fetchone()["account_id"])
+        cur.execute(
+            "SELECT post_journal(%s || cash_account_id(), %s || -%s::NUMERIC,"
+            " array_fill(NULL::INT, ARRAY[%s]));",
+            (accounts, [OPENING_BALANCE] * n_accounts, OPENING_BALANCE * n_accounts,
+             n_accounts + 1)
+        )
+    conn.commit()
+    return user_id, accounts
+
+def teardown(conn, accounts):
+    with conn.cursor() as cur:
+        for acct_id in accounts:
+            cur.execute(
+                "SELECT post_journal(ARRAY[%(a)s, cash_account_id()],"
+                " ARRAY[-account_balance(%(a)s), account_balance(%(a)s)], ARRAY[NULL, NULL]::INT[])"
+                " WHERE account_balance(%(a)s) <> 0;", {"a": acct_id}
+            )
+        cur.execute("UPDATE Accounts SET account_status = 'blocked', balance = 0"
+                    " WHERE account_id = ANY(%s);", (accounts,))
+    conn.commit()
+
+def set_mode(conn, mode):
+    with conn.cursor() as cur:
+        cur.execute("SELECT fraud_detection_mode() AS mode;")
+        previous = cur.fetchone()["mode"]
+        cur.execute("SELECT set_fraud_detection_mode(%s);", (mode,))
+    conn.commit()
+    return previous
+
+def worker(user_id, ops, latencies):
+    client = app.test_client()
+    with app.app_context():
+        token = create_access_token(identity=str(user_id), additional_claims={"role": "user"})
+    headers = {"Authorization": f"Bearer {token}"}
+    for acct_id, kind, amount in ops:
+        started = time.perf_counter()
+        client.post(f"/api/user/accounts/{acct_id}/{kind}", json={"amount": amount},
+                    headers=headers)
+        latencies.append(time.perf_counter() - started)
+
+def percentile(sorted_values, p):
+    return sorted_values[min(len(sorted_values) - 1, int(p / 100 * len(sorted_values)))]
+
+def run(conn, mode, args):
+    user_id, accounts = setup(conn, args.accounts)
+    rng = random.Random(args.seed)
+    plans = [
+        [(rng.choice(accounts), rng.choice(("deposit", "withdraw")), rng.randint(1, 50))
+         for _ in range(args.requests)]
+        for _ in range(args.threads)
+    ]
+    latencies = []
+    threads = [threading.Thread(target=worker, args=(user_id, ops, latencies))
+               for ops in plans]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    ms = lambda s: f"{s * 1000:.1f}ms"
+    print(f"{mode:<5}: {len(latencies)} requests, {len(latencies) / elapsed:,.0f} req/s,"
+          f" p50 {ms(percentile(latencies, 50))} p95 {ms(percentile(latencies, 95))}"
+          f" p99 {ms(percentile(latencies, 99))}")
+    return accounts
+
+def main():
+    parser = argparse.ArgumentParser(description="Sync vs async fraud detection benchmark.")
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=200, help="Per thread.")
+    parser.add_argument("--accounts", type=int, default=50)
+    parser.add_argument("--workers", type=int, default=config.FRAUD_WORKERS)
+    parser.add_argument("--batch-size", type=int, default=config.FRAUD_BATCH_SIZE)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    conn = psycopg2.connect(config.DATABASE_URL, cursor_factory=RealDictCursor)
+    previous = set_mode(conn, "sync")
+    created = []
+    try:
+        created += run(conn, "sync", args)
+        set_mode(conn, "async")
+        created += run(conn, "async", args)
+        with conn.cursor() as cur:
+            lag = outbox_lag(cur)
+        conn.commit()
+        print(f"queued {lag['pending']}, oldest {lag['oldest_age_seconds'] or 0:.2f}s")
+
+        pool = OutboxWorkers(args.workers, args.batch_size, poll_interval=0.05)
+        started = time.perf_counter()
+        pool.start()
+        while True:
+            time.sleep(0.05)
+            with conn.cursor() as cur:
+                lag = outbox_lag(cur)
+            conn.commit()
+            if not lag["pending"]:
+                break
+        pool.stop()
+        elapsed = time.perf_counter() - started
+        stats = pool.stats()
+        print(f"drained {stats['processed']} in {stats['batches']} batches with"
+              f" {args.workers} workers: {stats['processed'] / elapsed:,.0f} tx/s,"
+              f" {stats['errors']} errors")
+    finally:
+        set_mode(conn, previous)
+        teardown(conn, created)
+        conn.close()
+
+if __name__ == "__main__":
+    main()
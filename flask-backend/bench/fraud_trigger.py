@@ -0,0 +1,83 @@
+"""Rows/second of multi-row Transactions inserts under the legacy FOR EACH
+ROW fraud trigger (db/schema_and_trigger.sql) versus the installed
+statement-level trigger (db/migrations/003).
+
+    cd flask-backend && python -m bench.fraud_trigger --rows 50000
+
+Every run happens inside a transaction that is rolled back, so the target
+database is left untouched.
+"""
+import argparse
+import os
+import re
+import time
+
+import psycopg2
+
+import config
+
+SCHEMA_FILE = os.path.join(os.path.dirname(__file__), "..", "db", "schema_and_trigger.sql")
+
+LEGACY_TRIGGER = """
+  DROP TRIGGER IF EXISTS trigger_detect_fraud ON Transactions;
+  CREATE TRIGGER trigger_detect_fraud
+  AFTER INSERT ON Transactions
+  FOR EACH ROW
+  EXECUTE FUNCTION detect_fraud_on_transaction();
+"""
+
+# ~1 in 20 rows is a large withdrawal that fires 'Large Withdrawal'.
+INSERT_ROWS = """
+  INSERT INTO Transactions (account_id, transaction_type, amount, details)
+  SELECT a.ids[1 + g %% array_length(a.ids, 1)],
+         CASE WHEN g %% 2 = 0 THEN 'deposit' ELSE 'withdrawal' END,
+         CASE WHEN g %% 20 = 1 THEN 15000 ELSE 100 END,
+         'bench'
+  FROM generate_series(1, %s) g,
+       (SELECT array_agg(account_id) AS ids FROM Accounts) a;
+"""
+
+def legacy_function_sql():
+    with open(SCHEMA_FILE) as f:
+        sql = f.read()
+    m = re.search(
+        r"CREATE OR REPLACE FUNCTION detect_fraud_on_transaction\(\).*?LANGUAGE plpgsql;",
+        sql, re.S
+    )
+    return m.group(0)
+
+def run(conn, rows, setup=None):
+    with conn.cursor() as cur:
+        try:
+            if setup:
+                cur.execute(setup)
+            started = time.perf_counter()
+            cur.execute(INSERT_ROWS, (rows,))
+            elapsed = time.perf_counter() - started
+            cur.execute(
+                "SELECT COUNT(*) FROM TransactionLogs tl JOIN Transactions t"
+                " USING (transaction_id) WHERE t.details = 'bench';"
+            )
+            flagged = cur.fetchone()[0]
+        finally:
+            conn.rollback()
+    return elapsed, flagged
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the fraud detection trigger.")
+    parser.add_argument("--rows", type=int, default=50000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    conn = psycopg2.connect(config.DATABASE_URL)
+    legacy_setup = legacy_function_sql() + LEGACY_TRIGGER
+    try:
+        for name, setup in (("row trigger", legacy_setup), ("statement trigger", None)):
+            best, flagged = min(run(conn, args.rows, setup) for _ in range(args.repeat))
+            print(f"{name:<18} {args.rows / best:>12,.0f} rows/s"
+                  f"  ({best:.3f}s, {flagged} flagged)")
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,361 @@
+"""End-to-end load on the HTTP API: a weighted mix of deposit, withdraw,
+transfer, user transaction listing and admin requests from concurrent
+clients over real connections, with throughput and p50/p95/p99 latency per
+route, and baselines to compare later runs against.
+
+    cd flask-backend && flask --app app generate-data --users 10000 --seed 1
+    python -m bench.http_load --users 200 --concurrency 16 --duration 60 --save-baseline main
+    python -m bench.http_load --users 200 --concurrency 16 --duration 60 --compare main
+
+The app is started as `flask run` (threaded) against DATABASE_URL, unless
+--url points at a running server. Clients log in through /api/auth/login
+as the synthetic users <prefix>0 .. <prefix>N-1 (password "password") made
+by generate-data, and as --admin. Each client keeps one keep-alive
+connection, acts as a random user per request and sends the next request
+as soon as the last one returns (closed loop).
+Requests started during --warmup are not counted; those started in the
+measured window are, however long they take. Money requests post real
+journals to the synthetic accounts; amounts are small, so runs can repeat.
+
+Baselines are JSON in bench/baselines/, one per name, and only mean
+anything on the machine and data they were taken with. --compare exits 1
+when a route's p95 or p99 is more than --tolerance slower, or its
+throughput that much lower, than in the baseline.
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+from urllib.parse import urlsplit
+
+BASELINE_DIR = os.path.join(os.path.dirname(__file__), "baselines")
+BACKEND_DIR = os.path.join(os.path.dirname(__file__), "..")
+
+# Route -> default weight in the mix.
+MIX = {
+    "deposit":           30,
+    "withdraw":          25,
+    "transfer":          15,
+    "user_transactions": 20,
+    "admin_dashboard":    8,
+    "admin_fraud_logs":   2,
+}
+# Parameters a comparison needs to match.
+COMPARED_PARAMS = ("users", "concurrency", "duration", "mix", "user_prefix")
+
+
+def parse_mix(text):
+    mix = dict(MIX)
+    for part in filter(None, (text or "").split(",")):
+        name, _, weight = part.partition("=")
+        if name not in MIX:
+            raise argparse.ArgumentTypeError(f"unknown route {name!r}; expected one of {sorted(MIX)}")
+        try:
+            mix[name] = float(weight)
+        except ValueError:
+            raise argparse.ArgumentTypeError(f"weight of {name} must be a number")
+    if not any(mix.values()):
+        raise argparse.ArgumentTypeError("every weight is zero")
+    return mix
+
+
+# ─── SERVER ──────────────────────────────────────────────────────────────────
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def start_server(port, log_file, timeout=30):
+    """Run the app with `flask run` in a subprocess and wait until it
+    answers."""
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "flask", "--app", "app", "run", "--host", "127.0.0.1",
+         "--port", str(port), "--no-reload", "--no-debugger", "--with-threads"],
+        cwd=BACKEND_DIR, stdout=log_file, stderr=subprocess.STDOUT,
+    )
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            break
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=1)
+            conn.request("OPTIONS", "/api/ping")   # the CORS preflight; no database
+            conn.getresponse().read()
+            conn.close()
+            return proc
+        except OSError:
+            time.sleep(0.2)
+    proc.kill()
+    log_file.seek(0)
+    raise SystemExit(f"server did not start:\n{log_file.read().decode(errors='replace')[-2000:]}")
+
+
+# ─── CLIENTS ─────────────────────────────────────────────────────────────────
+class Client:
+    """One keep-alive connection; reconnects after a connection error."""
+
+    def __init__(self, host, port):
+        self.host, self.port = host, port
+        self.conn = None
+
+    def request(self, method, path, body=None, token=None):
+        if self.conn is None:
+            self.conn = http.client.HTTPConnection(self.host, self.port, timeout=60)
+        headers = {"Content-Type": "application/json"}
+        if token:
+            headers["Authorization"] = f"Bearer {token}"
+        try:
+            self.conn.request(method, path, body=json.dumps(body) if body is not None else None,
+                              headers=headers)
+            resp = self.conn.getresponse()
+            data = resp.read()
+        except (OSError, http.client.HTTPException):
+            self.conn.close()
+            self.conn = None
+            raise
+        if resp.getheader("Connection", "").lower() == "close":
+            self.conn.close()
+            self.conn = None
+        return resp.status, data
+
+    def json(self, method, path, body=None, token=None):
+        status, data = self.request(method, path, body, token)
+        return status, json.loads(data) if data else None
+
+def login(client, username, password):
+    status, body = client.json("POST", "/api/auth/login",
+                                           {"username": username, "password": password})
+    if status != 200:
+        raise SystemExit(f"login as {username} failed ({status}); for synthetic users run"
+                         " `flask --app app generate-data` first, or check --user-prefix")
+    return body["access_token"]
+
+def sign_in(client, args):
+    """Tokens and account ids of the synthetic users, and an admin token."""
+    users = []
+    for i in range(args.users):
+        token = login(client, f"{args.user_prefix}{i}", "password")
+        status, accounts = client.json("GET", "/api/user/accounts", token=token)
+        if status != 200:
+            raise SystemExit(f"listing accounts of {args.user_prefix}{i} failed ({status})")
+        if accounts:
+            users.append((token, [a["account_id"] for a in accounts]))
+    admin_user, _, admin_password = args.admin.partition(":")
+    return users, login(client, admin_user, admin_password)
+
+def next_request(route, rng, accounts, all_accounts):
+    """(method, path, body) of one request on `route`."""
+    if route in ("deposit", "withdraw"):
+        return ("POST", f"/api/user/accounts/{rng.choice(accounts)}/{route}",
+                {"amount": rng.randint(1, 50)})
+    if route == "transfer":
+        src = rng.choice(accounts)
+        dst = rng.choice(all_accounts)
+        if dst == src:
+            dst = all_accounts[(all_accounts.index(src) + 1) % len(all_accounts)]
+        return "POST", "/api/user/transfer", {"source_id": src, "dest_id": dst,
+                                              "amount": rng.randint(1, 20)}
+    if route == "user_transactions":
+        return "GET", "/api/user/transactions?limit=50", None
+    if route == "admin_dashboard":
+        return "GET", "/api/admin/dashboard", None
+    return "GET", "/api/admin/fraud-logs", None
+
+def worker(index, host, port, users, admin_token, args, start, measure_from, stop, samples):
+    rng = random.Random(args.seed * 1000 + index)
+    all_accounts = [a for _, accts in users for a in accts]
+    client = Client(host, port)
+    routes, weights = zip(*((r, w) for r, w in args.mix.items() if w))
+    start.wait()
+    while time.perf_counter() < stop[0]:
+        route = rng.choices(routes, weights)[0]
+        token, accounts = rng.choice(users)
+        method, path, body = next_request(route, rng, accounts, all_accounts)
+        if route.startswith("admin_"):
+            token = admin_token
+        started = time.perf_counter()
+        try:
+            status, _ = client.request(method, path, body, token)
+        except (OSError, http.client.HTTPException):
+            status = 0
+        # Counted by start time, so requests slower than the window are
+        # still measured.
+        if started >= measure_from[0]:
+            samples.append((route, status, time.perf_counter() - started))
+
+
+# ─── RESULTS ─────────────────────────────────────────────────────────────────
+def percentile(sorted_values, p):
+    return sorted_values[min(len(sorted_values) - 1, int(p / 100 * len(sorted_values)))]
+
+def summarize(samples, seconds):
+    """Per route and in total: requests, req/s, errors (5xx or no
+    response), rejected (4xx) and latency percentiles in ms."""
+    by_route = {}
+    for route, status, latency in samples:
+        by_route.setdefault(route, []).append((status, latency))
+    by_route["total"] = [(status, latency) for _, status, latency in samples]
+    results = {}
+    for route, rows in by_route.items():
+        latencies = sorted(latency for _, latency in rows)
+        if not latencies:
+            continue
+        ms = lambda p: round(percentile(latencies, p) * 1000, 2)
+        results[route] = {
+            "requests": len(rows),
+            "rps":      round(len(rows) / seconds, 1),
+            "errors":   sum(1 for status, _ in rows if status == 0 or status >= 500),
+            "rejected": sum(1 for status, _ in rows if 400 <= status < 500),
+            "p50_ms":   ms(50),
+            "p95_ms":   ms(95),
+            "p99_ms":   ms(99),
+            "max_ms":   round(latencies[-1] * 1000, 2),
+        }
+    return results
+
+def print_results(results):
+    print(f"{'route':<18} {'requests':>9} {'req/s':>8} {'errors':>7} {'4xx':>6}"
+          f" {'p50':>9} {'p95':>9} {'p99':>9} {'max':>9}")
+    for route in sorted(results, key=lambda r: (r == "total", r)):
+        r = results[route]
+        print(f"{route:<18} {r['requests']:>9} {r['rps']:>8.1f} {r['errors']:>7} {r['rejected']:>6}"
+              f" {r['p50_ms']:>7.1f}ms {r['p95_ms']:>7.1f}ms {r['p99_ms']:>7.1f}ms {r['max_ms']:>7.1f}ms")
+
+def baseline_path(name):
+    return os.path.join(BASELINE_DIR, f"{name}.json")
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(baseline, params, results, tolerance):
+    """Print each route against the baseline; returns the regressed routes."""
+    for key in COMPARED_PARAMS:
+        if baseline["params"].get(key) != params[key]:
+            print(f"warning: {key} was {baseline['params'].get(key)!r} in the baseline,"
+                  f" now {params[key]!r}")
+    print(f"\nagainst baseline from {baseline['created']} ({baseline.get('commit') or 'unknown commit'}),"
+          f" tolerance {tolerance:.0%}")
+    print(f"{'route':<18} {'req/s':>16} {'p95':>20} {'p99':>20}")
+    change = lambda old, new: (new - old) / old if old else 0.0
+    regressed = []
+    for route in sorted(results, key=lambda r: (r == "total", r)):
+        old, new = baseline["routes"].get(route), results[route]
+        if old is None:
+            print(f"{route:<18} (not in baseline)")
+            continue
+        rps, p95, p99 = (change(old["rps"], new["rps"]), change(old["p95_ms"], new["p95_ms"]),
+                         change(old["p99_ms"], new["p99_ms"]))
+        bad = rps < -tolerance or p95 > tolerance or p99 > tolerance or \
+            (new["errors"] and not old["errors"])
+        if bad:
+            regressed.append(route)
+        print(f"{route:<18} {new['rps']:>8.1f} {rps:>+7.1%} {new['p95_ms']:>10.1f}ms {p95:>+7.1%}"
+              f" {new['p99_ms']:>10.1f}ms {p99:>+7.1%}" + ("  REGRESSION" if bad else ""))
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="HTTP load benchmark of the API routes.")
+    parser.add_argument("--url", default=None,
+                        help="Benchmark a running server instead of starting one.")
+    parser.add_argument("--users", type=int, default=100,
+                        help="Synthetic users to log in as; each request acts as a random one.")
+    parser.add_argument("--user-prefix", default="syn1_",
+                        help="Username prefix given to (or defaulted by) generate-data.")
+    parser.add_argument("--admin", default="admin:admin123", help="username:password")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=30.0, help="Measured seconds.")
+    parser.add_argument("--warmup", type=float, default=5.0)
+    parser.add_argument("--mix", type=parse_mix, default=dict(MIX),
+                        help="route=weight overrides, e.g. admin_fraud_logs=0,transfer=30."
+                             f" Routes: {', '.join(MIX)}.")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--save-baseline", metavar="NAME", default=None)
+    parser.add_argument("--compare", metavar="NAME", default=None)
+    parser.add_argument("--tolerance", type=float, default=0.15,
+                        help="Allowed relative slowdown before --compare fails.")
+    args = parser.parse_args()
+
+    baseline = None
+    if args.compare:
+        try:
+            with open(baseline_path(args.compare)) as f:
+                baseline = json.load(f)
+        except FileNotFoundError:
+            raise SystemExit(f"no baseline {args.compare!r} in {BASELINE_DIR}")
+
+    server = log_file = None
+    if args.url:
+        parts = urlsplit(args.url)
+        host, port = parts.hostname, parts.port or 80
+    else:
+        host, port = "127.0.0.1", free_port()
+        log_file = tempfile.TemporaryFile()
+        server = start_server(port, log_file)
+    try:
+        users, admin_token = sign_in(Client(host, port), args)
+        if not users:
+            raise SystemExit("none of the users has an account")
+
+        samples = []
+        start = threading.Event()
+        measure_from, stop = [None], [None]
+        threads = [threading.Thread(target=worker, args=(i, host, port, users, admin_token, args,
+                                                         start, measure_from, stop, samples))
+                   for i in range(args.concurrency)]
+        for t in threads:
+            t.start()
+        # Clients start together; the clock starts with them.
+        now = time.perf_counter()
+        measure_from[0], stop[0] = now + args.warmup, now + args.warmup + args.duration
+        start.set()
+        for t in threads:
+            t.join()
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+            log_file.close()
+
+    params = {
+        "users":       args.users,
+        "user_prefix": args.user_prefix,
+        "concurrency": args.concurrency,
+        "duration":    args.duration,
+        "warmup":      args.warmup,
+        "mix":         args.mix,
+        "seed":        args.seed,
+    }
+    results = summarize(samples, args.duration)
+    print(f"{len(users)} users, {args.concurrency} clients, {args.duration:.0f}s"
+          f" after {args.warmup:.0f}s warmup")
+    print_results(results)
+
+    if args.save_baseline:
+        os.makedirs(BASELINE_DIR, exist_ok=True)
+        with open(baseline_path(args.save_baseline), "w") as f:
+            json.dump({"created": datetime.now().isoformat(timespec="seconds"),
+                       "commit":  git_commit(),
+                       "params":  params,
+                       "routes":  results}, f, indent=2, sort_keys=True)
+        print(f"baseline saved to {baseline_path(args.save_baseline)}")
+    if baseline is not None:
+        regressed = compare(baseline, params, results, args.tolerance)
+        if regressed:
+            print(f"{len(regressed)} routes regressed: {', '.join(regressed)}")
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
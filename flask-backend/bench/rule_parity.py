@@ -0,0 +1,139 @@
+"""Check that rule_engine.evaluate() produces the same TransactionLogs and
+account verdicts as the fraud trigger on generated data, and compare
+their throughput.
+
+    cd flask-backend && python -m bench.rule_parity --rows 20000 --seed 7
+
+Everything runs inside a transaction that is rolled back.
+"""
+import argparse
+import random
+import sys
+import time
+from datetime import timedelta
+
+import psycopg2
+from psycopg2.extras import RealDictCursor, execute_values
+
+import config
+from rule_engine import TransactionBatch, evaluate, load_context, load_rules
+
+TYPES = ("deposit", "withdrawal", "transfer_in", "transfer_out")
+
+def make_accounts(cur, rng, n_accounts, now):
+    cur.execute("SELECT user_id FROM Users ORDER BY user_id LIMIT 1;")
+    user_id = cur.fetchone()["user_id"]
+    rows = [
+        (user_id, f"PAR{now:%H%M%S}{i:06d}",
+         now - timedelta(days=rng.choice((10, 400))))
+        for i in range(n_accounts)
+    ]
+    execute_values(
+        cur,
+        "INSERT INTO Accounts (user_id, account_number, created_at) VALUES %s"
+        " RETURNING account_id;",
+        rows, page_size=len(rows), fetch=True
+    )
+    cur.execute(
+        "SELECT account_id FROM Accounts WHERE account_number LIKE %s;",
+        (f"PAR{now:%H%M%S}%",)
+    )
+    return [r["account_id"] for r in cur.fetchall()]
+
+def make_rows(rng, accounts, n_rows, start, span_days):
+    rows = []
+    while len(rows) < n_rows:
+        acct = rng.choice(accounts)
+        t = start + timedelta(seconds=rng.uniform(0, span_days * 86400))
+        # Bursts of small withdrawals seconds apart feed the window rules.
+        burst = rng.randint(8, 15) if rng.random() < 0.05 else 1
+        for _ in range(burst):
+            amount = (rng.choice((15000, 20000)) if rng.random() < 0.03
+                      else rng.choice((10, 25, 40)) if burst > 1
+                      else round(rng.uniform(5, 900), 2))
+            ttype = "withdrawal" if burst > 1 else rng.choice(TYPES)
+            rows.append((acct, ttype, amount, t, "parity"))
+            t += timedelta(seconds=rng.uniform(1, 20))
+    return rows[:n_rows]
+
+def insert(cur, rows):
+    # One statement, as the trigger evaluates per statement.
+    execute_values(
+        cur,
+        "INSERT INTO Transactions"
+        " (transaction_id, account_id, transaction_type, amount, transaction_time, details)"
+        " VALUES %s;",
+        rows, page_size=len(rows)
+    )
+
+def main():
+    parser = argparse.ArgumentParser(description="Fraud rule engine / trigger parity check.")
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--accounts", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    conn = psycopg2.connect(config.DATABASE_URL, cursor_factory=RealDictCursor)
+    try:
+        cur = conn.cursor()
+        cur.execute("SELECT NOW()::timestamp AS now;")
+        now = cur.fetchone()["now"]
+        accounts = make_accounts(cur, rng, args.accounts, now)
+
+        # Older activity first (history for windows and idle gaps) ...
+        history = make_rows(rng, accounts, args.rows // 4, now - timedelta(days=300), 5)
+        history += make_rows(rng, accounts, args.rows // 4, now - timedelta(days=2), 1)
+        # ... then the batch under test, with ids reserved up front.
+        batch = make_rows(rng, accounts, args.rows, now - timedelta(hours=20), 1)
+
+        cur.execute(
+            "SELECT nextval('transactions_transaction_id_seq') AS id"
+            " FROM generate_series(1, %s);", (len(history) + len(batch),)
+        )
+        ids = [r["id"] for r in cur.fetchall()]
+        history = [(i,) + r for i, r in zip(ids, history)]
+        batch = [(i,) + r for i, r in zip(ids[len(history):], batch)]
+        insert(cur, history)
+
+        tx = TransactionBatch(*zip(*batch))
+        rules = load_rules(cur)
+        hist, prior = load_context(cur, tx, rules)
+        started = time.perf_counter()
+        logs, verdicts = evaluate(tx, rules, hist, prior)
+        engine_s = time.perf_counter() - started
+
+        started = time.perf_counter()
+        insert(cur, batch)
+        trigger_s = time.perf_counter() - started
+
+        cur.execute(
+            "SELECT transaction_id, rule_id FROM TransactionLogs"
+            " WHERE transaction_id = ANY(%s);", ([r[0] for r in batch],)
+        )
+        db_logs = {(r["transaction_id"], r["rule_id"]) for r in cur.fetchall()}
+        engine_logs = {(l["transaction_id"], l["rule_id"]) for l in logs}
+
+        cur.execute(
+            "SELECT account_id, account_status, risk_level FROM Accounts"
+            " WHERE account_id = ANY(%s);", (list(verdicts),)
+        )
+        mismatched = [
+            r["account_id"] for r in cur.fetchall()
+            if (r["account_status"], r["risk_level"])
+               != (verdicts[r["account_id"]]["action"], verdicts[r["account_id"]]["risk_level"])
+        ]
+    finally:
+        conn.rollback()
+        conn.close()
+
+    print(f"rows {len(batch)}, trigger logs {len(db_logs)}, engine logs {len(engine_logs)}")
+    print(f"only in trigger: {len(db_logs - engine_logs)}, only in engine: {len(engine_logs - db_logs)},"
+          f" account verdict mismatches: {len(mismatched)}")
+    print(f"trigger {len(batch) / trigger_s:,.0f} rows/s, engine {len(batch) / engine_s:,.0f} rows/s")
+    ok = db_logs == engine_logs and not mismatched
+    print("PARITY OK" if ok else "PARITY FAILED")
+    sys.exit(0 if ok else 1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""Contention benchmark for POST /api/user/transfer: N workers move small
+amounts between a small hot set of accounts in random directions.
+
+    cd flask-backend && python -m bench.transfer_contention --workers 16 --accounts 4
+
+Reports throughput, latency percentiles and response codes, and checks
+that money was conserved and no balance went negative. A throwaway user
+owning the hot accounts is created; the ledger is append-only, so they
+stay behind afterwards, emptied back to SYS-CASH and blocked.
+"""
+import argparse
+import random
+import threading
+import time
+from collections import Counter
+from decimal import Decimal
+
+import psycopg2
+from flask_jwt_extended import create_access_token
+from psycopg2.extras import RealDictCursor
+
+import config
+from app import app
+
+OPENING_BALANCE = Decimal("100.00")
+
+
+def setup(conn, n_accounts):
+    tag = f"bench{time.time_ns()}"
+    with conn.cursor() as cur:
+        cur.execute(
+            "INSERT INTO Users (username, email, role) VALUES (%s, %s, 'user')"
+            " RETURNING user_id;", (tag, f"{tag}@bench.invalid")
+        )
+        user_id = cur.fetchone()["user_id"]
+        accounts = []
+        for i in range(n_accounts):
+            cur.execute(
+                "INSERT INTO Accounts (user_id, account_number, balance) VALUES (%s, %s, %s)"
+                " RETURNING account_id;", (user_id, f"{tag[-17:]}{i:03d}", OPENING_BALANCE)
+            )
+            accounts.append(cur.fetchone()["account_id"])
+        cur.execute(
+            "SELECT post_journal(%s || cash_account_id(), %s || -%s::NUMERIC,"
+            " array_fill(NULL::INT, ARRAY[%s]));",
+            (accounts, [OPENING_BALANCE] * n_accounts, OPENING_BALANCE * n_accounts,
+             n_accounts + 1)
+        )
+    conn.commit()
+    return user_id, accounts
+
+def teardown(conn, accounts):
+    with conn.cursor() as cur:
+        for acct_id in accounts:
+            cur.execute(
+                "SELECT post_journal(ARRAY[%(a)s, cash_account_id()],"
+                " ARRAY[-account_balance(%(a)s), account_balance(%(a)s)], ARRAY[NULL, NULL]::INT[])"
+                " WHERE account_balance(%(a)s) <> 0;", {"a": acct_id}
+            )
+        cur.execute("UPDATE Accounts SET account_status = 'blocked', balance = 0"
+                    " WHERE account_id = ANY(%s);", (accounts,))
+    conn.commit()
+
+def worker(user_id, accounts, n, seed, latencies, codes):
+    rng = random.Random(seed)
+    client = app.test_client()
+    with app.app_context():
+        token = create_access_token(identity=str(user_id), additional_claims={"role": "user"})
+    headers = {"Authorization": f"Bearer {token}"}
+    for _ in range(n):
+        src, dst = rng.sample(accounts, 2)
+        started = time.perf_counter()
+        r = client.post("/api/user/transfer", headers=headers,
+                        json={"source_id": src, "dest_id": dst, "amount": rng.randint(1, 20)})
+        latencies.append(time.perf_counter() - started)
+        codes[r.status_code] += 1
+
+def percentile(sorted_values, p):
+    return sorted_values[min(len(sorted_values) - 1, int(p / 100 * len(sorted_values)))]
+
+def main():
+    parser = argparse.ArgumentParser(description="Transfer contention benchmark.")
+    parser.add_argument("--workers", type=int, default=16)
+    parser.add_argument("--accounts", type=int, default=4, help="Size of the hot set.")
+    parser.add_argument("--requests", type=int, default=200, help="Per worker.")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    conn = psycopg2.connect(config.DATABASE_URL, cursor_factory=RealDictCursor)
+    user_id, accounts = setup(conn, args.accounts)
+    try:
+        latencies, codes = [], Counter()
+        threads = [
+            threading.Thread(target=worker, args=(user_id, accounts, args.requests,
+                                                  args.seed + i, latencies, codes))
+            for i in range(args.workers)
+        ]
+        started = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - started
+
+        with conn.cursor() as cur:
+            cur.execute(
+                "SELECT SUM(account_balance(a)) AS total, MIN(account_balance(a)) AS low"
+                " FROM unnest(%s) AS a;", (accounts,)
+            )
+            totals = cur.fetchone()
+        conn.commit()
+    finally:
+        teardown(conn, accounts)
+        conn.close()
+
+    latencies.sort()
+    ms = lambda s: f"{s * 1000:.1f}ms"
+    print(f"{len(latencies)} transfers, {args.workers} workers, {args.accounts} hot accounts:"
+          f" {len(latencies) / elapsed:,.0f} req/s")
+    print(f"p50 {ms(percentile(latencies, 50))}  p95 {ms(percentile(latencies, 95))}"
+          f"  p99 {ms(percentile(latencies, 99))}  max {ms(latencies[-1])}")
+    print("responses: " + ", ".join(f"{code}={n}" for code, n in sorted(codes.items())))
+    ok = (totals["total"] == OPENING_BALANCE * args.accounts and totals["low"] >= 0
+          and not any(code >= 500 for code in codes))
+    print(f"total {totals['total']}, lowest {totals['low']}: "
+          + ("CONSISTENT" if ok else "INCONSISTENT"))
+
+if __name__ == "__main__":
+    main()
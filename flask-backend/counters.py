@@ -0,0 +1,44 @@
+from psycopg2.extensions import ISOLATION_LEVEL_REPEATABLE_READ
+
+# Dashboard counter name -> query for its true value.
+COUNTER_QUERIES = {
+    "total_users":        "SELECT COUNT(*) AS n FROM Users;",
+    "total_transactions": "SELECT COUNT(*) AS n FROM Transactions;",
+    "fraud_incidents":    "SELECT COUNT(*) AS n FROM TransactionLogs WHERE status = 'pending';",
+}
+
+def read_counters(cur):
+    cur.execute("SELECT name, SUM(value) AS value FROM DashboardCounters GROUP BY name;")
+    counters = {name: 0 for name in COUNTER_QUERIES}
+    counters.update({row["name"]: int(row["value"]) for row in cur.fetchall()})
+    return counters
+
+def reconcile_counters(conn):
+    """Recompute every counter and apply the difference as a correction.
+
+    The true counts and the shard sums are read from one REPEATABLE READ
+    snapshot, so writes racing with the reconcile are either in both or in
+    neither and the delta is exact without locking the counted tables.
+    Returns {name: (counted, true_value, delta)}.
+    """
+    old_level = conn.isolation_level
+    conn.set_isolation_level(ISOLATION_LEVEL_REPEATABLE_READ)
+    try:
+        with conn.cursor() as cur:
+            counted = read_counters(cur)
+            actual = {}
+            for name, query in COUNTER_QUERIES.items():
+                cur.execute(query)
+                actual[name] = cur.fetchone()["n"]
+        conn.commit()
+    finally:
+        conn.set_isolation_level(old_level)
+
+    report = {}
+    with conn.cursor() as cur:
+        for name in COUNTER_QUERIES:
+            delta = actual[name] - counted[name]
+            cur.execute("SELECT bump_counter(%s, %s);", (name, delta))
+            report[name] = (counted[name], actual[name], delta)
+    conn.commit()
+    return report
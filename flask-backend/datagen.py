@@ -0,0 +1,487 @@
+# Synthetic data for performance work: users, accounts and a transaction
+# history with Zipfian account activity, a diurnal clock and transfers
+# between accounts, plus injected fraud scenarios built from the condition
+# of every active FraudRules entry. The same seed and end time give the
+# same data; only the ids depend on the database's sequences.
+#
+# Everything is COPY'd in one transaction with a balanced ledger journal
+# (db/migrations/013) per transaction, and no account ever goes below zero.
+# Transactions are loaded in time order, one COPY per chunk, so the fraud
+# trigger scores them as it would have live.
+import io
+import math
+import time
+from datetime import datetime
+
+import numpy as np
+
+KINDS = ("deposit", "withdrawal", "transfer_out", "transfer_in")
+DEPOSIT, WITHDRAWAL, TRANSFER_OUT, TRANSFER_IN = range(4)
+SIGN = np.array([1, -1, -1, 1])
+
+# Relative activity by hour of day, and by weekday from Monday.
+DIURNAL = np.array([0.20, 0.10, 0.08, 0.07, 0.08, 0.15, 0.40, 0.80, 1.20, 1.40, 1.50, 1.60,
+                    1.80, 1.60, 1.50, 1.40, 1.40, 1.50, 1.70, 1.80, 1.50, 1.10, 0.70, 0.40])
+WEEKLY = np.array([1.0, 1.0, 1.0, 1.0, 1.1, 0.8, 0.6])
+
+# Amounts in cents: log-normal (median, sigma), clipped to (1 cent, cap).
+AMOUNTS = {
+    DEPOSIT:      (300_00, 1.0, 9_000_00),
+    WITHDRAWAL:   (120_00, 1.0, 5_000_00),
+    TRANSFER_OUT: (150_00, 1.1, 5_000_00),
+}
+OPENING = (500_00, 0.8)
+
+US = 1_000_000
+DAY = 86_400 * US
+MAX_SCENARIO_ROWS = 10_000
+
+
+class DataSet:
+    """Generated rows as column arrays. Accounts and users are indexes;
+    transactions are sorted by time, and the two legs of a transfer are
+    adjacent (out first)."""
+
+    def __init__(self, n_users, account_user, account_created, tx_account, tx_kind,
+                 tx_cents, tx_time, tx_peer, tx_details, scenarios):
+        self.n_users = n_users
+        self.account_user = account_user
+        self.account_created = account_created
+        self.tx_account = tx_account
+        self.tx_kind = tx_kind
+        self.tx_cents = tx_cents
+        self.tx_time = tx_time
+        self.tx_peer = tx_peer          # other account of a transfer leg, else -1
+        self.tx_details = tx_details    # None: the default for the kind
+        self.scenarios = scenarios      # rule_id -> account indexes
+        signed = SIGN[tx_kind] * tx_cents
+        self.account_balance = np.bincount(tx_account, weights=signed,
+                                           minlength=len(account_user)).astype(np.int64)
+        self.account_last = np.full(len(account_user), np.iinfo(np.int64).min)
+        np.maximum.at(self.account_last, tx_account, tx_time)
+
+    @property
+    def n_accounts(self):
+        return len(self.account_user)
+
+    @property
+    def n_transactions(self):
+        return len(self.tx_account)
+
+
+# ─── GENERATION ──────────────────────────────────────────────────────────────
+def _to_us(dt):
+    return int(np.datetime64(dt, "us").astype(np.int64))
+
+def _clock(rng, n, start_us, days):
+    """n timestamps over `days` days from start_us, weighted by weekday
+    and hour of day."""
+    first = (start_us // DAY + 3) % 7    # 1970-01-01 was a Thursday
+    day_w = WEEKLY[(first + np.arange(days)) % 7]
+    day = rng.choice(days, n, p=day_w / day_w.sum())
+    hour = rng.choice(24, n, p=DIURNAL / DIURNAL.sum())
+    return start_us + day * DAY + hour * 3600 * US + rng.integers(0, 3600 * US, n)
+
+def _amounts(rng, kind, n):
+    median, sigma, cap = AMOUNTS[kind]
+    return np.clip(np.round(rng.lognormal(math.log(median), sigma, n)), 1, cap).astype(np.int64)
+
+def _pick(preds, numeric, default):
+    """A value satisfying every predicate of one field (None if none can
+    be found): the middle of a bounded range, a margin past a lower bound,
+    half an upper bound."""
+    lo, hi, strict_lo, choices, excluded = None, None, False, None, set()
+    for p in preds:
+        op, v = p["op"], p["value"]
+        if op == "=":
+            choices = [v] if choices is None else [c for c in choices if c == v]
+        elif op == "in":
+            choices = list(v) if choices is None else [c for c in choices if c in v]
+        elif op == "!=":
+            excluded.add(v)
+        elif op == "not_in":
+            excluded.update(v)
+        elif op in (">", ">="):
+            if lo is None or v >= lo:
+                lo, strict_lo = v, op == ">"
+        elif hi is None or v < hi:
+            hi = v
+    if choices is not None:
+        ok = [c for c in choices if c not in excluded
+              and (not numeric or ((lo is None or c > lo or (c == lo and not strict_lo))
+                                   and (hi is None or c < hi)))]
+        return ok[0] if ok else None
+    if not numeric:
+        value = default if default not in excluded else "synthetic"
+        return value if value not in excluded else None
+    if lo is None and hi is None:
+        value = default
+    elif hi is None:
+        value = max(lo * 1.25, lo + 1)
+    elif lo is None:
+        value = hi / 2
+    else:
+        value = (lo + hi) / 2
+    value = round(value, 2)
+    while value in excluded:
+        value += 0.01
+    if (lo is not None and (value < lo or (strict_lo and value == lo))) or \
+       (hi is not None and value >= hi) or value <= 0:
+        return None
+    return value
+
+def scenario(rule, rng):
+    """Rows that make `rule` fire on a fresh account: ([(offset_us, kind,
+    cents, details), ...], lead_us), where lead_us is how long before the
+    first row the account opens. None when the condition can't be met by
+    construction."""
+    cond = rule["condition"]
+    by_field = {}
+    for p in cond["where"]:
+        by_field.setdefault(p["field"], []).append(p)
+
+    ttype = _pick(by_field.get("transaction_type", []), False, "withdrawal")
+    if ttype not in KINDS:
+        ttype = next((k for k in KINDS if _pick(
+            by_field.get("transaction_type", []) + [{"op": "=", "value": k}], False, k)), None)
+    amount = _pick(by_field.get("amount", []), True, 100.0)
+    details = (_pick(by_field["details"], False, "Synthetic fraud")
+               if "details" in by_field else None)
+    if ttype is None or amount is None or (details is None and "details" in by_field):
+        return None
+    kind, cents = KINDS.index(ttype), int(round(amount * 100))
+
+    # Idle time is measured from the previous activity, here the opening
+    # deposit `lead` before the row.
+    lead = int(rng.integers(60, 3600)) * US
+    for p in by_field.get("idle_seconds", []):
+        if p["op"] in (">", ">="):
+            lead = max(lead, int((p["value"] * 1.1 + 3600) * US))
+        elif p["op"] in ("<", "<="):
+            lead = min(lead, int(p["value"] / 2 * US))
+        else:
+            return None
+
+    window = cond.get("window")
+    n = 1
+    if window is not None:
+        op, v = window["op"], window["value"]
+        per_row = 1 if window["aggregate"] == "count" else amount
+        need = v / per_row
+        if op == ">":
+            n = math.floor(need) + 1
+        elif op in (">=", "="):
+            n = math.ceil(need)
+        elif op == "!=":
+            n = math.floor(need) + 1
+        elif need < 1 or (op == "<" and need == 1):
+            return None    # a single row already reaches the bound
+        if window["aggregate"] == "sum" and op == "=" and not math.isclose(n * per_row, v):
+            return None
+        if not 1 <= n <= MAX_SCENARIO_ROWS:
+            return None
+        # All rows inside one window, ending at the last.
+        step = int(window["seconds"] * 0.8 * US / max(n - 1, 1))
+        offsets = [i * max(step, 1000) for i in range(n)]
+    else:
+        offsets = [0]
+    return [(off, kind, cents, details) for off in offsets], lead
+
+def generate(rules, n_users=10000, n_events=1000000, days=90, end=None, zipf=0.9,
+             transfer_share=0.2, fraud_per_rule=50, seed=1):
+    """Build a DataSet. `rules` are active FraudRules rows with validated
+    conditions; each gets fraud_per_rule scenarios, every one on its own
+    account. Returns (dataset, skipped rule names)."""
+    rng = np.random.default_rng(seed)
+    end_us = _to_us(end or datetime.combine(datetime.today(), datetime.min.time()))
+    start_us = end_us - days * DAY
+
+    per_user = 1 + rng.poisson(0.4, n_users)
+    account_user = np.repeat(np.arange(n_users), per_user)
+    n_acc = len(account_user)
+    ranks = rng.permutation(n_acc) + 1.0
+    weight = ranks ** -zipf
+    weight /= weight.sum()
+
+    # Activity events; a transfer becomes two rows.
+    t = _clock(rng, n_events, start_us, days)
+    src = rng.choice(n_acc, n_events, p=weight)
+    kind = np.where(rng.random(n_events) < transfer_share, TRANSFER_OUT,
+                    np.where(rng.random(n_events) < 0.45, DEPOSIT, WITHDRAWAL))
+    cents = np.empty(n_events, dtype=np.int64)
+    for k in (DEPOSIT, WITHDRAWAL, TRANSFER_OUT):
+        sel = kind == k
+        cents[sel] = _amounts(rng, k, int(sel.sum()))
+    xfer = np.flatnonzero(kind == TRANSFER_OUT)
+    dst = rng.choice(n_acc, len(xfer), p=weight)
+    dst = np.where(dst == src[xfer], (dst + 1) % n_acc, dst)
+    single = np.flatnonzero(kind != TRANSFER_OUT)
+
+    cols = {
+        "account": [src[single], np.column_stack([src[xfer], dst]).ravel()],
+        "kind":    [kind[single], np.tile([TRANSFER_OUT, TRANSFER_IN], len(xfer))],
+        "cents":   [cents[single], np.repeat(cents[xfer], 2)],
+        "time":    [t[single], np.repeat(t[xfer], 2)],
+        "peer":    [np.full(len(single), -1), np.column_stack([dst, src[xfer]]).ravel()],
+    }
+    details = {}     # row index -> details other than the kind's default
+    created = np.full(n_acc, -1, dtype=np.int64)
+
+    # Injected fraud, each scenario on a new account of a random user.
+    scenarios, skipped = {}, []
+    extra_user, extra_created = [], []
+    rows_before = sum(len(a) for a in cols["account"])
+    extra = {"account": [], "kind": [], "cents": [], "time": [], "peer": []}
+    def add(account, k, c, at, peer, d=None):
+        if d is not None:
+            details[rows_before + len(extra["account"])] = d
+        for name, value in zip(extra, (account, k, c, at, peer)):
+            extra[name].append(value)
+
+    for rule in rules:
+        if scenario(rule, rng) is None:
+            skipped.append(rule["rule_name"])
+            continue
+        accounts = scenarios[rule["rule_id"]] = []
+        for _ in range(fraud_per_rule):
+            rows, lead = scenario(rule, rng)
+            t0 = int(rng.integers(start_us, end_us - rows[-1][0]))
+            acct = n_acc + len(extra_user)
+            extra_user.append(int(rng.integers(n_users)))
+            extra_created.append(t0 - lead)
+            accounts.append(acct)
+            for off, k, c, d in rows:
+                if k == TRANSFER_OUT:
+                    peer = int(rng.choice(n_acc, p=weight))
+                    add(acct, TRANSFER_OUT, c, t0 + off, peer, d)
+                    add(peer, TRANSFER_IN, c, t0 + off, acct)
+                elif k == TRANSFER_IN:
+                    peer = int(rng.choice(n_acc, p=weight))
+                    add(peer, TRANSFER_OUT, c, t0 + off, acct)
+                    add(acct, TRANSFER_IN, c, t0 + off, peer, d)
+                else:
+                    add(acct, k, c, t0 + off, -1, d)
+    for name, values in extra.items():
+        cols[name].append(np.array(values, dtype=np.int64))
+    account_user = np.concatenate([account_user, np.array(extra_user, dtype=np.int64)])
+    created = np.concatenate([created, np.array(extra_created, dtype=np.int64)])
+    n_acc = len(account_user)
+
+    tx_account = np.concatenate(cols["account"]).astype(np.int64)
+    tx_kind = np.concatenate(cols["kind"]).astype(np.int8)
+    tx_cents = np.concatenate(cols["cents"]).astype(np.int64)
+    tx_time = np.concatenate(cols["time"]).astype(np.int64)
+    tx_peer = np.concatenate(cols["peer"]).astype(np.int64)
+
+    # Accounts open (with a deposit) shortly before their first activity,
+    # or at a random time if they have none; the deposit covers the
+    # lowest running balance, so nothing is ever overdrawn.
+    first = np.full(n_acc, np.iinfo(np.int64).max)
+    np.minimum.at(first, tx_account, tx_time)
+    unset = created < 0
+    idle = first == np.iinfo(np.int64).max
+    created[unset & ~idle] = first[unset & ~idle] - rng.integers(60 * US, DAY, int((unset & ~idle).sum()))
+    created[unset & idle] = rng.integers(start_us, end_us, int((unset & idle).sum()))
+
+    order = np.lexsort((np.arange(len(tx_time)), tx_time, tx_account))
+    signed = (SIGN[tx_kind] * tx_cents)[order]
+    acct_sorted = tx_account[order]
+    running = np.cumsum(signed)
+    starts = np.flatnonzero(np.r_[True, acct_sorted[1:] != acct_sorted[:-1]])
+    base = np.r_[0, running[starts[1:] - 1]] if len(starts) else np.array([], dtype=np.int64)
+    lowest = np.zeros(n_acc, dtype=np.int64)
+    if len(starts):
+        lowest[acct_sorted[starts]] = np.minimum.reduceat(running, starts) - base
+    median, sigma = OPENING
+    opening = np.round(rng.lognormal(math.log(median), sigma, n_acc)).astype(np.int64) \
+        + np.maximum(0, -lowest)
+
+    tx_account = np.r_[np.arange(n_acc), tx_account]
+    tx_kind = np.r_[np.full(n_acc, DEPOSIT, dtype=np.int8), tx_kind]
+    tx_cents = np.r_[opening, tx_cents]
+    tx_time = np.r_[created, tx_time]
+    tx_peer = np.r_[np.full(n_acc, -1), tx_peer]
+    details = {i + n_acc: d for i, d in details.items()}
+    for i in range(n_acc):
+        details[i] = "Opening deposit"
+
+    # Stable, so equal times keep transfer legs together and in order.
+    order = np.argsort(tx_time, kind="stable")
+    position = np.empty_like(order)
+    position[order] = np.arange(len(order))
+    tx_details = np.full(len(order), None, dtype=object)
+    for i, d in details.items():
+        tx_details[position[i]] = d
+    return DataSet(
+        n_users, account_user, created,
+        tx_account[order], tx_kind[order], tx_cents[order], tx_time[order],
+        tx_peer[order], tx_details, scenarios,
+    ), skipped
+
+
+# ─── LOADING ─────────────────────────────────────────────────────────────────
+def _reserve(cur, sequence, n):
+    """First of n consecutive values taken from `sequence`; the tables it
+    feeds are locked, so no default can take one in between."""
+    cur.execute("SELECT setval(%s, nextval(%s) + %s - 1) - %s + 1 AS first;",
+                (sequence, sequence, n, n))
+    return cur.fetchone()["first"]
+
+def _copy(cur, table, columns, lines):
+    buf = io.StringIO("".join(lines))
+    cur.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN", buf)
+
+def _money(cents):
+    sign = "-" if cents < 0 else ""
+    return f"{sign}{abs(cents) // 100}.{abs(cents) % 100:02d}"
+
+def _text(value):
+    return (value.replace("\\", "\\\\").replace("\t", "\\t")
+            .replace("\n", "\\n").replace("\r", "\\r"))
+
+def _timestamps(us):
+    return np.asarray(us, dtype="datetime64[us]").astype(str)
+
+def load(conn, data, prefix, chunk_size=100000, detection=True, log=print):
+    """COPY a DataSet in one transaction. Users, Accounts, Transactions and
+    the ledger tables are locked against other writers (SHARE ROW
+    EXCLUSIVE) until it commits. With detection=False both fraud
+    detection triggers are off during the load and restored after.
+
+    Returns a report of row counts, detections by rule, how many of each
+    rule's scenario accounts it flagged, and the throughput.
+    """
+    started = time.perf_counter()
+    n_acc, n_tx = data.n_accounts, data.n_transactions
+    kind, account = data.tx_kind, data.tx_account
+    new_journal = kind != TRANSFER_IN
+    n_journals = int(new_journal.sum())
+    report = {"users": data.n_users, "accounts": n_acc, "transactions": n_tx,
+              "postings": 0, "detections": 0, "chunks": 0}
+
+    with conn.cursor() as cur:
+        cur.execute("SELECT 1 FROM Users WHERE username LIKE %s LIMIT 1;",
+                    (prefix.replace("_", r"\_") + "%",))
+        if cur.fetchone():
+            raise ValueError(f"users named {prefix}* already exist; pick another prefix")
+        cur.execute("LOCK TABLE Users, Accounts, Transactions, LedgerPostings, AccountBalances"
+                    " IN SHARE ROW EXCLUSIVE MODE;")
+        cur.execute("SELECT fraud_detection_mode() AS mode, cash_account_id() AS cash;")
+        row = cur.fetchone()
+        mode, cash = row["mode"], row["cash"]
+        if not detection:
+            cur.execute("ALTER TABLE Transactions DISABLE TRIGGER trigger_detect_fraud,"
+                        " DISABLE TRIGGER trigger_fraud_outbox;")
+
+        first_user = _reserve(cur, "users_user_id_seq", data.n_users)
+        first_account = _reserve(cur, "accounts_account_id_seq", n_acc)
+        first_tx = _reserve(cur, "transactions_transaction_id_seq", n_tx)
+        first_journal = _reserve(cur, "ledger_journal_seq", n_journals)
+        account_ids = first_account + np.arange(n_acc)
+
+        _copy(cur, "Users", ("user_id", "username", "email", "role", "password"), (
+            f"{first_user + i}\t{prefix}{i}\t{prefix}{i}@synthetic.invalid\tuser\tpassword\n"
+            for i in range(data.n_users)))
+        width = len(str(n_acc))
+        created = _timestamps(data.account_created)
+        _copy(cur, "Accounts", ("account_id", "user_id", "account_number", "balance", "created_at"), (
+            f"{first_account + i}\t{first_user + u}\t{prefix}{i:0{width}d}\t{_money(b)}\t{c}\n"
+            for i, (u, b, c) in enumerate(zip(data.account_user.tolist(),
+                                               data.account_balance.tolist(), created))))
+        _copy(cur, "AccountBalances", ("account_id", "shard", "balance"), (
+            f"{first_account + i}\t0\t{_money(b)}\n"
+            for i, b in enumerate(data.account_balance.tolist()) if b))
+        # The fraud trigger joins Accounts; plan it for the new row count.
+        cur.execute("ANALYZE Accounts;")
+        cur.execute("SELECT create_transaction_partitions(%s::timestamp, %s::timestamp);",
+                    (str(_timestamps(data.tx_time[0])), str(_timestamps(data.tx_time[-1]))))
+        log(f"{data.n_users} users and {n_acc} accounts copied")
+
+        journal = first_journal + np.cumsum(new_journal) - 1
+        signed = SIGN[kind] * data.tx_cents
+        start = 0
+        while start < n_tx:
+            end = min(start + chunk_size, n_tx)
+            if end < n_tx and kind[end] == TRANSFER_IN:
+                end += 1    # keep both legs of a transfer in one statement
+            sl = slice(start, end)
+            ids = first_tx + np.arange(start, end)
+            times = _timestamps(data.tx_time[sl])
+            tx_lines, ledger_lines = [], []
+            for tx_id, a, k, c, s, t, peer, d, j in zip(
+                    ids.tolist(), account_ids[account[sl]].tolist(), kind[sl].tolist(),
+                    data.tx_cents[sl].tolist(), signed[sl].tolist(), times,
+                    data.tx_peer[sl].tolist(), data.tx_details[sl], journal[sl].tolist()):
+                if d is not None:
+                    d = _text(d)
+                elif k == DEPOSIT:
+                    d = "User deposit"
+                elif k == WITHDRAWAL:
+                    d = "User withdrawal"
+                else:
+                    d = f"{'To' if k == TRANSFER_OUT else 'From'} {first_account + peer}"
+                tx_lines.append(f"{tx_id}\t{a}\t{KINDS[k]}\t{_money(c)}\t{t}\t{d}\n")
+                ledger_lines.append(f"{j}\t{a}\t{_money(s)}\t{tx_id}\t{t}\n")
+                if k in (DEPOSIT, WITHDRAWAL):
+                    ledger_lines.append(f"{j}\t{cash}\t{_money(-s)}\t{tx_id}\t{t}\n")
+            _copy(cur, "Transactions", ("transaction_id", "account_id", "transaction_type",
+                                        "amount", "transaction_time", "details"), tx_lines)
+            _copy(cur, "LedgerPostings", ("journal_id", "account_id", "amount",
+                                          "transaction_id", "posted_at"), ledger_lines)
+            report["postings"] += len(ledger_lines)
+            report["chunks"] += 1
+            log(f"{end}/{n_tx} transactions copied")
+            start = end
+
+        # The trigger skips activity updates under a minute apart.
+        cur.execute(
+          """
+          UPDATE Accounts a
+          SET last_activity_at = GREATEST(a.last_activity_at, x.last_tx)
+          FROM unnest(%s::int[], %s::timestamp[]) AS x(account_id, last_tx)
+          WHERE a.account_id = x.account_id;
+          """,
+          (account_ids.tolist(), _timestamps(data.account_last).tolist())
+        )
+        if not detection:
+            cur.execute("SELECT set_fraud_detection_mode(%s);", (mode,))
+
+        last_tx = first_tx + n_tx - 1
+        cur.execute(
+          """
+          SELECT rule_id, detected_rule, COUNT(*) AS n
+          FROM TransactionLogs
+          WHERE transaction_id BETWEEN %s AND %s
+          GROUP BY rule_id, detected_rule
+          ORDER BY rule_id;
+          """,
+          (first_tx, last_tx)
+        )
+        report["by_rule"] = {r["detected_rule"]: r["n"] for r in cur.fetchall()}
+        report["detections"] = sum(report["by_rule"].values())
+        # Scenario coverage, when the trigger scored the rows in the load.
+        coverage = {}
+        for rule_id, planted in (data.scenarios.items() if detection and mode == "sync" else ()):
+            cur.execute(
+              """
+              SELECT r.rule_name, COUNT(DISTINCT t.account_id) AS flagged
+              FROM FraudRules r
+              LEFT JOIN TransactionLogs f
+                ON f.rule_id = r.rule_id AND f.transaction_id BETWEEN %s AND %s
+              LEFT JOIN Transactions t
+                ON t.transaction_id = f.transaction_id AND t.account_id = ANY(%s)
+              WHERE r.rule_id = %s
+              GROUP BY r.rule_name;
+              """,
+              (first_tx, last_tx, account_ids[planted].tolist(), rule_id)
+            )
+            row = cur.fetchone()
+            coverage[row["rule_name"]] = (row["flagged"], len(planted))
+        report["coverage"] = coverage
+        report["mode"] = mode if detection else "off"
+    conn.commit()
+
+    elapsed = time.perf_counter() - started
+    report["seconds"] = round(elapsed, 3)
+    report["rows_per_sec"] = round(n_tx / elapsed, 1) if elapsed else 0.0
+    return report
@@ -0,0 +1,345 @@
+import os
+import random
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import psycopg2
+import psycopg2.errors
+import psycopg2.extensions
+from psycopg2.extras import RealDictCursor
+from psycopg2.pool import PoolError
+
+import config
+
+
+class PoolTimeout(PoolError):
+    pass
+
+
+# ─── STATEMENT HOOKS ─────────────────────────────────────────────────────────
+_statement_hooks = []
+
+def add_statement_hook(fn):
+    """Call fn(cursor, query, vars, seconds, rows) on the executing thread
+    after every statement run on a pooled connection, failed ones included.
+    For server-side cursors each fetch is a statement of its own; COMMIT
+    and ROLLBACK are reported with cursor None."""
+    _statement_hooks.append(fn)
+
+class TimedCursor(RealDictCursor):
+    """RealDictCursor that reports each round trip to the statement hooks."""
+
+    def _report(self, query, vars, started, rows):
+        seconds = time.perf_counter() - started
+        for hook in _statement_hooks:
+            hook(self, query, vars, seconds, rows)
+
+    def _rows(self):
+        # Rows the statement returned; a server-side cursor has only
+        # declared its query at this point.
+        if self.name is None and self.description is not None and self.rowcount > 0:
+            return self.rowcount
+        return 0
+
+    def execute(self, query, vars=None):
+        started = time.perf_counter()
+        try:
+            return super().execute(query, vars)
+        finally:
+            self._report(query, vars, started, self._rows())
+
+    def executemany(self, query, vars_list):
+        started = time.perf_counter()
+        try:
+            return super().executemany(query, vars_list)
+        finally:
+            self._report(query, None, started, 0)
+
+    def copy_expert(self, sql, file, size=8192):
+        started = time.perf_counter()
+        try:
+            return super().copy_expert(sql, file, size)
+        finally:
+            self._report(sql, None, started, 0)
+
+    def _fetch(self, fetch, size):
+        if self.name is None:
+            return fetch()
+        started = time.perf_counter()
+        rows = []
+        try:
+            rows = fetch()
+            return rows
+        finally:
+            self._report(f"FETCH FORWARD {size} FROM {self.name}", None, started,
+                         len(rows) if isinstance(rows, list) else int(rows is not None))
+
+    def fetchone(self):
+        return self._fetch(super().fetchone, 1)
+
+    def fetchmany(self, size=None):
+        return self._fetch(lambda: super(TimedCursor, self).fetchmany(size),
+                           size or self.itersize)
+
+    def fetchall(self):
+        return self._fetch(super().fetchall, "ALL")
+
+class TimedConnection(psycopg2.extensions.connection):
+    """Reports COMMIT and ROLLBACK to the statement hooks (cursor None)
+    when there is a transaction to end; otherwise psycopg2 sends nothing."""
+
+    def _end(self, end, query):
+        if self.info.transaction_status == psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+            return end()
+        started = time.perf_counter()
+        try:
+            return end()
+        finally:
+            seconds = time.perf_counter() - started
+            for hook in _statement_hooks:
+                hook(None, query, None, seconds, 0)
+
+    def commit(self):
+        return self._end(super().commit, "COMMIT")
+
+    def rollback(self):
+        return self._end(super().rollback, "ROLLBACK")
+
+
+class ConnectionPool:
+    """Thread-safe psycopg2 pool with health checks, max lifetime and a
+    bounded wait for a free connection."""
+
+    def __init__(self, dsn, minconn=1, maxconn=10, max_lifetime=1800,
+                 wait_timeout=5, health_check=True, **connect_kwargs):
+        if minconn < 0 or maxconn < 1 or minconn > maxconn:
+            raise ValueError("invalid pool size: min=%s max=%s" % (minconn, maxconn))
+        self.dsn = dsn
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.max_lifetime = max_lifetime
+        self.wait_timeout = wait_timeout
+        self.health_check = health_check
+        self.connect_kwargs = connect_kwargs
+
+        self._cond = threading.Condition()
+        self._idle = deque()      # (conn, created_at)
+        self._born = {}           # id(conn) -> created_at, for every open conn
+        self._in_use = 0
+        self._size = 0            # open + being opened
+        self._waiting = 0
+        self._closed = False
+
+        self._checkouts = 0
+        self._timeouts = 0
+        self._discarded = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+        for _ in range(minconn):
+            conn = self._connect()
+            with self._cond:
+                self._size += 1
+                self._idle.append((conn, self._born[id(conn)]))
+
+    # ── internals ──
+    def _connect(self):
+        conn = psycopg2.connect(self.dsn, **self.connect_kwargs)
+        self._born[id(conn)] = time.monotonic()
+        return conn
+
+    def _expired(self, created_at):
+        return self.max_lifetime and time.monotonic() - created_at > self.max_lifetime
+
+    def _discard(self, conn):
+        self._born.pop(id(conn), None)
+        try:
+            conn.close()
+        except psycopg2.Error:
+            pass
+        with self._cond:
+            self._size -= 1
+            self._discarded += 1
+            self._cond.notify()
+
+    def _healthy(self, conn):
+        if conn.closed:
+            return False
+        if not self.health_check:
+            return True
+        try:
+            # A plain cursor and rollback: pool upkeep is not the caller's
+            # statement.
+            with conn.cursor(cursor_factory=psycopg2.extensions.cursor) as cur:
+                cur.execute("SELECT 1;")
+            psycopg2.extensions.connection.rollback(conn)
+            return True
+        except psycopg2.Error:
+            return False
+
+    # ── public API ──
+    def getconn(self, timeout=None):
+        timeout = self.wait_timeout if timeout is None else timeout
+        started = time.monotonic()
+        deadline = started + timeout
+
+        while True:
+            conn = created_at = None
+            reserve = False
+            with self._cond:
+                if self._closed:
+                    raise PoolError("connection pool is closed")
+                while not self._idle and self._size >= self.maxconn:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._timeouts += 1
+                        raise PoolTimeout(
+                            "no connection available within %.1fs" % timeout
+                        )
+                    self._waiting += 1
+                    try:
+                        self._cond.wait(remaining)
+                    finally:
+                        self._waiting -= 1
+                if self._idle:
+                    conn, created_at = self._idle.pop()
+                else:
+                    self._size += 1
+                    reserve = True
+                self._in_use += 1
+
+            if reserve:
+                try:
+                    conn = self._connect()
+                except Exception:
+                    with self._cond:
+                        self._size -= 1
+                        self._in_use -= 1
+                        self._cond.notify()
+                    raise
+            elif self._expired(created_at) or not self._healthy(conn):
+                with self._cond:
+                    self._in_use -= 1
+                self._discard(conn)
+                continue
+
+            waited = time.monotonic() - started
+            with self._cond:
+                self._checkouts += 1
+                self._wait_total += waited
+                self._wait_max = max(self._wait_max, waited)
+            return conn
+
+    def putconn(self, conn, close=False):
+        created_at = self._born.get(id(conn))
+        if not close and not conn.closed:
+            status = conn.info.transaction_status
+            if status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                try:
+                    conn.rollback()
+                except psycopg2.Error:
+                    close = True
+
+        with self._cond:
+            self._in_use -= 1
+        if (close or conn.closed or self._closed or created_at is None
+                or self._expired(created_at)):
+            self._discard(conn)
+            return
+        with self._cond:
+            self._idle.append((conn, created_at))
+            self._cond.notify()
+
+    def closeall(self):
+        with self._cond:
+            self._closed = True
+            idle, self._idle = list(self._idle), deque()
+        for conn, _ in idle:
+            self._discard(conn)
+
+    def stats(self):
+        with self._cond:
+            return {
+                "min":            self.minconn,
+                "max":            self.maxconn,
+                "size":           self._size,
+                "in_use":         self._in_use,
+                "idle":           len(self._idle),
+                "waiting":        self._waiting,
+                "checkouts":      self._checkouts,
+                "timeouts":       self._timeouts,
+                "discarded":      self._discarded,
+                "wait_ms_total":  round(self._wait_total * 1000, 3),
+                "wait_ms_avg":    round(self._wait_total * 1000 / self._checkouts, 3)
+                                  if self._checkouts else 0.0,
+                "wait_ms_max":    round(self._wait_max * 1000, 3),
+            }
+
+
+# ─── PROCESS-WIDE POOL ───────────────────────────────────────────────────────
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+def get_pool():
+    # Pools must not be shared across fork(); rebuild lazily in each worker.
+    global _pool, _pool_pid
+    if _pool is None or _pool_pid != os.getpid():
+        with _pool_lock:
+            if _pool is None or _pool_pid != os.getpid():
+                _pool = ConnectionPool(
+                    config.DATABASE_URL,
+                    minconn=config.DB_POOL_MIN,
+                    maxconn=config.DB_POOL_MAX,
+                    max_lifetime=config.DB_POOL_MAX_LIFETIME,
+                    wait_timeout=config.DB_POOL_WAIT_TIMEOUT,
+                    health_check=config.DB_POOL_HEALTH_CHECK,
+                    connection_factory=TimedConnection,
+                    cursor_factory=TimedCursor,
+                )
+                _pool_pid = os.getpid()
+    return _pool
+
+@contextmanager
+def get_db_connection():
+    """Check a connection out of the pool; it is always returned, and any
+    transaction left open (e.g. by an exception) is rolled back."""
+    pool = get_pool()
+    conn = pool.getconn()
+    broken = False
+    try:
+        yield conn
+    except psycopg2.InterfaceError:
+        broken = True
+        raise
+    finally:
+        pool.putconn(conn, close=broken or conn.closed)
+
+def pool_stats():
+    return get_pool().stats()
+
+# ─── RETRIES ─────────────────────────────────────────────────────────────────
+RETRYABLE = (psycopg2.errors.DeadlockDetected, psycopg2.errors.SerializationFailure)
+
+def run_in_transaction(conn, fn, retries=None, base_delay=None):
+    """Run fn(cur) and commit, retrying the whole transaction with jittered
+    exponential backoff on deadlock or serialization failures. Returns
+    whatever fn returns; other errors are rolled back and re-raised."""
+    retries = config.TX_RETRIES if retries is None else retries
+    base_delay = config.TX_RETRY_BASE_DELAY if base_delay is None else base_delay
+    for attempt in range(retries + 1):
+        try:
+            with conn.cursor() as cur:
+                result = fn(cur)
+            conn.commit()
+            return result
+        except RETRYABLE:
+            conn.rollback()
+            if attempt == retries:
+                raise
+            time.sleep(base_delay * (2 ** attempt) * (0.5 + random.random()))
+        except Exception:
+            conn.rollback()
+            raise
@@ -0,0 +1,63 @@
+-- Base schema the later migrations build on: the tables of
+-- db/schema_and_trigger.sql in dependency order, with the columns app.py
+-- uses (Users.password, Accounts.account_status / risk_level), and the
+-- default fraud rules. The detection trigger itself comes from 003.
+--
+-- For a database created from the old scripts, skip this and record the
+-- migrations already applied by hand instead:
+--   flask --app app migrate --baseline <last applied version>
+BEGIN;
+
+CREATE TABLE Users (
+    user_id  SERIAL PRIMARY KEY,
+    username VARCHAR(100) NOT NULL,
+    email    VARCHAR(150) UNIQUE NOT NULL,
+    role     VARCHAR(50) NOT NULL, -- 'admin' or 'user'
+    password TEXT
+);
+
+CREATE TABLE Accounts (
+    account_id     SERIAL PRIMARY KEY,
+    user_id        INT REFERENCES Users(user_id),
+    account_number VARCHAR(20) UNIQUE NOT NULL,
+    balance        NUMERIC(15, 2) DEFAULT 0.00,
+    created_at     TIMESTAMP DEFAULT NOW(),
+    account_status VARCHAR(50) DEFAULT 'active', -- active, blocked, restricted, limited
+    risk_level     VARCHAR(50)
+);
+
+CREATE TABLE Transactions (
+    transaction_id   SERIAL PRIMARY KEY,
+    account_id       INT REFERENCES Accounts(account_id) ON DELETE CASCADE,
+    transaction_type VARCHAR(50) NOT NULL, -- deposit, withdrawal, transfer_in, transfer_out
+    amount           NUMERIC(15, 2) NOT NULL,
+    transaction_time TIMESTAMP DEFAULT NOW(),
+    details          TEXT
+);
+
+CREATE TABLE FraudRules (
+    rule_id          SERIAL PRIMARY KEY,
+    rule_name        VARCHAR(255) NOT NULL,
+    rule_description TEXT,
+    action           VARCHAR(50) NOT NULL, -- block, restrict, limit
+    risk_level       VARCHAR(50) NOT NULL, -- high, medium, low
+    precedence       INT NOT NULL,
+    active           BOOLEAN DEFAULT TRUE
+);
+
+CREATE TABLE TransactionLogs (
+    log_id         SERIAL PRIMARY KEY,
+    transaction_id INT REFERENCES Transactions(transaction_id) ON DELETE CASCADE,
+    rule_id        INT REFERENCES FraudRules(rule_id),
+    detected_rule  VARCHAR(255),
+    status         VARCHAR(50) DEFAULT 'pending', -- pending, resolved
+    created_at     TIMESTAMP DEFAULT NOW()
+);
+
+INSERT INTO FraudRules (rule_name, rule_description, action, risk_level, precedence) VALUES
+('Large Withdrawal', 'Withdrawal over $10,000', 'block', 'high', 3),
+('Rapid Transactions', 'More than 10 transactions in short time', 'limit', 'low', 1),
+('Unusual Location', 'New country detected', 'restrict', 'medium', 2),
+('Inactive Account Activity', 'Activity after 6 months inactive', 'block', 'high', 3);
+
+COMMIT;
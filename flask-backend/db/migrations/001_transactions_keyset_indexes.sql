@@ -0,0 +1,18 @@
+-- Keyset pagination on (transaction_time, transaction_id) for
+-- GET /api/transactions and GET /api/user/transactions.
+-- Apply with: flask --app app migrate
+-- (No BEGIN/COMMIT: CONCURRENTLY cannot run inside a transaction block,
+-- so the runner executes it statement by statement. Do not run it with
+-- psql -f: that skips the schema_migrations record.)
+
+-- /api/transactions: newest-first walk over all transactions
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_transactions_time_id
+    ON Transactions (transaction_time DESC, transaction_id DESC);
+
+-- /api/user/transactions: resolve the user's accounts ...
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_accounts_user_id
+    ON Accounts (user_id);
+
+-- ... then walk each account newest-first from the cursor
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_transactions_account_time_id
+    ON Transactions (account_id, transaction_time DESC, transaction_id DESC);
@@ -0,0 +1,107 @@
+-- Incrementally maintained counters for GET /api/admin/dashboard.
+-- Each counter is split over 16 shard rows; writers bump a random shard so
+-- concurrent inserts do not serialize on one tuple, and readers SUM the
+-- shards (16 rows instead of a COUNT(*) scan).
+-- Drift (TRUNCATE, manual fixes) is corrected by `flask --app app reconcile-counters`.
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS DashboardCounters (
+    name  VARCHAR(50) NOT NULL,
+    shard INT NOT NULL,
+    value BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (name, shard)
+);
+
+CREATE OR REPLACE FUNCTION bump_counter(counter_name TEXT, delta BIGINT)
+RETURNS VOID AS $$
+BEGIN
+    IF delta <> 0 THEN
+        INSERT INTO DashboardCounters (name, shard, value)
+        VALUES (counter_name, floor(random() * 16)::INT, delta)
+        ON CONFLICT (name, shard)
+        DO UPDATE SET value = DashboardCounters.value + EXCLUDED.value;
+    END IF;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Statement-level: one bump per INSERT/DELETE statement, not per row.
+CREATE OR REPLACE FUNCTION count_rows_inserted()
+RETURNS TRIGGER AS $$
+BEGIN
+    PERFORM bump_counter(TG_ARGV[0], (SELECT COUNT(*) FROM new_rows));
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION count_rows_deleted()
+RETURNS TRIGGER AS $$
+BEGIN
+    PERFORM bump_counter(TG_ARGV[0], -(SELECT COUNT(*) FROM old_rows));
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Pending fraud incidents move in and out of the count on status changes.
+CREATE OR REPLACE FUNCTION count_pending_logs()
+RETURNS TRIGGER AS $$
+DECLARE
+    added   BIGINT := 0;
+    removed BIGINT := 0;
+BEGIN
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        SELECT COUNT(*) INTO added FROM new_rows WHERE status = 'pending';
+    END IF;
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        SELECT COUNT(*) INTO removed FROM old_rows WHERE status = 'pending';
+    END IF;
+    PERFORM bump_counter('fraud_incidents', added - removed);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS count_users_ins ON Users;
+CREATE TRIGGER count_users_ins AFTER INSERT ON Users
+REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION count_rows_inserted('total_users');
+
+DROP TRIGGER IF EXISTS count_users_del ON Users;
+CREATE TRIGGER count_users_del AFTER DELETE ON Users
+REFERENCING OLD TABLE AS old_rows
+FOR EACH STATEMENT EXECUTE FUNCTION count_rows_deleted('total_users');
+
+DROP TRIGGER IF EXISTS count_transactions_ins ON Transactions;
+CREATE TRIGGER count_transactions_ins AFTER INSERT ON Transactions
+REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION count_rows_inserted('total_transactions');
+
+DROP TRIGGER IF EXISTS count_transactions_del ON Transactions;
+CREATE TRIGGER count_transactions_del AFTER DELETE ON Transactions
+REFERENCING OLD TABLE AS old_rows
+FOR EACH STATEMENT EXECUTE FUNCTION count_rows_deleted('total_transactions');
+
+DROP TRIGGER IF EXISTS count_pending_logs_ins ON TransactionLogs;
+CREATE TRIGGER count_pending_logs_ins AFTER INSERT ON TransactionLogs
+REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION count_pending_logs();
+
+DROP TRIGGER IF EXISTS count_pending_logs_upd ON TransactionLogs;
+CREATE TRIGGER count_pending_logs_upd AFTER UPDATE ON TransactionLogs
+REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION count_pending_logs();
+
+DROP TRIGGER IF EXISTS count_pending_logs_del ON TransactionLogs;
+CREATE TRIGGER count_pending_logs_del AFTER DELETE ON TransactionLogs
+REFERENCING OLD TABLE AS old_rows
+FOR EACH STATEMENT EXECUTE FUNCTION count_pending_logs();
+
+-- Seed from the current data. CREATE TRIGGER holds a lock that blocks
+-- writers until COMMIT, so nothing is counted twice or missed.
+DELETE FROM DashboardCounters;
+INSERT INTO DashboardCounters (name, shard, value)
+SELECT 'total_users', 0, COUNT(*) FROM Users
+UNION ALL
+SELECT 'total_transactions', 0, COUNT(*) FROM Transactions
+UNION ALL
+SELECT 'fraud_incidents', 0, COUNT(*) FROM TransactionLogs WHERE status = 'pending';
+
+COMMIT;
@@ -0,0 +1,54 @@
+-- Replace the FOR EACH ROW fraud trigger with a statement-level one.
+-- All active rules are evaluated against every row of the statement at
+-- once through the new_transactions transition table, and each affected
+-- account is updated once. Benchmark: python -m bench.fraud_trigger
+BEGIN;
+
+DROP TRIGGER IF EXISTS trigger_detect_fraud ON Transactions;
+DROP FUNCTION IF EXISTS detect_fraud_on_transaction();
+
+CREATE OR REPLACE FUNCTION detect_fraud_on_transactions()
+RETURNS TRIGGER AS $$
+BEGIN
+    WITH matches AS (
+        -- One SELECT per rule; add a UNION ALL branch for new rules.
+        SELECT n.transaction_id, n.account_id, r.rule_id, r.rule_name
+        FROM new_transactions n
+        JOIN FraudRules r
+          ON r.active
+         AND r.rule_name = 'Large Withdrawal'
+        WHERE n.transaction_type = 'withdrawal'
+          AND n.amount > 10000
+    ),
+    logged AS (
+        -- Data-modifying CTEs always run, referenced or not.
+        INSERT INTO TransactionLogs (transaction_id, rule_id, detected_rule)
+        SELECT transaction_id, rule_id, rule_name
+        FROM matches
+    ),
+    -- Same outcome as the row trigger: the account ends up with the
+    -- highest-precedence rule of its last flagged transaction.
+    verdict AS (
+        SELECT DISTINCT ON (m.account_id)
+               m.account_id, r.action, r.risk_level
+        FROM matches m
+        JOIN FraudRules r ON r.rule_id = m.rule_id
+        ORDER BY m.account_id, m.transaction_id DESC, r.precedence DESC
+    )
+    UPDATE Accounts a
+    SET account_status = v.action,
+        risk_level     = v.risk_level
+    FROM verdict v
+    WHERE a.account_id = v.account_id;
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trigger_detect_fraud
+AFTER INSERT ON Transactions
+REFERENCING NEW TABLE AS new_transactions
+FOR EACH STATEMENT
+EXECUTE FUNCTION detect_fraud_on_transactions();
+
+COMMIT;
@@ -0,0 +1,78 @@
+-- 'Rapid Transactions': flag a transaction when its account has more than
+-- `threshold` transactions within the `window_seconds` ending at it.
+-- The window is read from idx_transactions_account_time_id (migration 001)
+-- and each probe stops after threshold + 1 index entries, so the check is
+-- bounded however long the account's history is.
+BEGIN;
+
+ALTER TABLE FraudRules
+    ADD COLUMN IF NOT EXISTS window_seconds INT,
+    ADD COLUMN IF NOT EXISTS threshold NUMERIC(15, 2);
+
+UPDATE FraudRules
+SET window_seconds = 300,
+    threshold      = 10
+WHERE rule_name = 'Rapid Transactions'
+  AND window_seconds IS NULL
+  AND threshold IS NULL;
+
+CREATE OR REPLACE FUNCTION detect_fraud_on_transactions()
+RETURNS TRIGGER AS $$
+BEGIN
+    WITH matches AS (
+        -- One SELECT per rule; add a UNION ALL branch for new rules.
+        SELECT n.transaction_id, n.account_id, r.rule_id, r.rule_name
+        FROM new_transactions n
+        JOIN FraudRules r
+          ON r.active
+         AND r.rule_name = 'Large Withdrawal'
+        WHERE n.transaction_type = 'withdrawal'
+          AND n.amount > 10000
+
+        UNION ALL
+
+        SELECT n.transaction_id, n.account_id, r.rule_id, r.rule_name
+        FROM new_transactions n
+        JOIN FraudRules r
+          ON r.active
+         AND r.rule_name = 'Rapid Transactions'
+        CROSS JOIN LATERAL (
+            SELECT COUNT(*) AS n_recent
+            FROM (
+                SELECT 1
+                FROM Transactions t
+                WHERE t.account_id = n.account_id
+                  AND t.transaction_time <= n.transaction_time
+                  AND t.transaction_time >  n.transaction_time
+                                            - make_interval(secs => COALESCE(r.window_seconds, 300))
+                LIMIT COALESCE(r.threshold, 10) + 1
+            ) w
+        ) recent
+        WHERE recent.n_recent > COALESCE(r.threshold, 10)
+    ),
+    logged AS (
+        -- Data-modifying CTEs always run, referenced or not.
+        INSERT INTO TransactionLogs (transaction_id, rule_id, detected_rule)
+        SELECT transaction_id, rule_id, rule_name
+        FROM matches
+    ),
+    -- Same outcome as the row trigger: the account ends up with the
+    -- highest-precedence rule of its last flagged transaction.
+    verdict AS (
+        SELECT DISTINCT ON (m.account_id)
+               m.account_id, r.action, r.risk_level
+        FROM matches m
+        JOIN FraudRules r ON r.rule_id = m.rule_id
+        ORDER BY m.account_id, m.transaction_id DESC, r.precedence DESC
+    )
+    UPDATE Accounts a
+    SET account_status = v.action,
+        risk_level     = v.risk_level
+    FROM verdict v
+    WHERE a.account_id = v.account_id;
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+COMMIT;
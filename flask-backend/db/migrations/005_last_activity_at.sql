@@ -0,0 +1,118 @@
+-- 'Inactive Account Activity': flag a transaction that arrives more than
+-- `window_seconds` (default 180 days) after the account's previous activity.
+-- Accounts.last_activity_at is kept current by the fraud trigger, so the
+-- check is one comparison instead of a MAX() over the account's history.
+-- Existing rows are populated by `flask --app app backfill-last-activity`;
+-- until then the trigger falls back to an index probe for NULL accounts.
+BEGIN;
+
+-- Nullable without a default: catalog-only change, no table rewrite.
+ALTER TABLE Accounts
+    ADD COLUMN IF NOT EXISTS last_activity_at TIMESTAMP;
+
+UPDATE FraudRules
+SET window_seconds = 15552000
+WHERE rule_name = 'Inactive Account Activity'
+  AND window_seconds IS NULL;
+
+CREATE OR REPLACE FUNCTION detect_fraud_on_transactions()
+RETURNS TRIGGER AS $$
+BEGIN
+    WITH matches AS (
+        -- One SELECT per rule; add a UNION ALL branch for new rules.
+        SELECT n.transaction_id, n.account_id, r.rule_id, r.rule_name
+        FROM new_transactions n
+        JOIN FraudRules r
+          ON r.active
+         AND r.rule_name = 'Large Withdrawal'
+        WHERE n.transaction_type = 'withdrawal'
+          AND n.amount > 10000
+
+        UNION ALL
+
+        SELECT n.transaction_id, n.account_id, r.rule_id, r.rule_name
+        FROM new_transactions n
+        JOIN FraudRules r
+          ON r.active
+         AND r.rule_name = 'Rapid Transactions'
+        CROSS JOIN LATERAL (
+            SELECT COUNT(*) AS n_recent
+            FROM (
+                SELECT 1
+                FROM Transactions t
+                WHERE t.account_id = n.account_id
+                  AND t.transaction_time <= n.transaction_time
+                  AND t.transaction_time >  n.transaction_time
+                                            - make_interval(secs => COALESCE(r.window_seconds, 300))
+                LIMIT COALESCE(r.threshold, 10) + 1
+            ) w
+        ) recent
+        WHERE recent.n_recent > COALESCE(r.threshold, 10)
+
+        UNION ALL
+
+        -- Gap since the account's previous activity: the prior row of the
+        -- same statement, else Accounts.last_activity_at. Accounts not yet
+        -- backfilled fall back to a one-row index probe (and are filled in
+        -- by the UPDATE below); accounts with no history use created_at.
+        SELECT g.transaction_id, g.account_id, r.rule_id, r.rule_name
+        FROM (
+            SELECT n.transaction_id, n.account_id,
+                   n.transaction_time - COALESCE(
+                       LAG(n.transaction_time) OVER (
+                           PARTITION BY n.account_id
+                           ORDER BY n.transaction_time, n.transaction_id
+                       ),
+                       a.last_activity_at,
+                       (SELECT t.transaction_time
+                        FROM Transactions t
+                        WHERE t.account_id = n.account_id
+                          AND (t.transaction_time, t.transaction_id)
+                              < (n.transaction_time, n.transaction_id)
+                        ORDER BY t.transaction_time DESC, t.transaction_id DESC
+                        LIMIT 1),
+                       a.created_at
+                   ) AS idle_for
+            FROM new_transactions n
+            JOIN Accounts a ON a.account_id = n.account_id
+        ) g
+        JOIN FraudRules r
+          ON r.active
+         AND r.rule_name = 'Inactive Account Activity'
+        WHERE g.idle_for > make_interval(secs => COALESCE(r.window_seconds, 15552000))
+    ),
+    logged AS (
+        -- Data-modifying CTEs always run, referenced or not.
+        INSERT INTO TransactionLogs (transaction_id, rule_id, detected_rule)
+        SELECT transaction_id, rule_id, rule_name
+        FROM matches
+    ),
+    -- Same outcome as the row trigger: the account ends up with the
+    -- highest-precedence rule of its last flagged transaction.
+    verdict AS (
+        SELECT DISTINCT ON (m.account_id)
+               m.account_id, r.action, r.risk_level
+        FROM matches m
+        JOIN FraudRules r ON r.rule_id = m.rule_id
+        ORDER BY m.account_id, m.transaction_id DESC, r.precedence DESC
+    ),
+    touched AS (
+        SELECT account_id, MAX(transaction_time) AS last_tx
+        FROM new_transactions
+        GROUP BY account_id
+    )
+    -- One UPDATE per account: a row may only be modified once per statement.
+    UPDATE Accounts a
+    SET last_activity_at = GREATEST(a.last_activity_at, t.last_tx),
+        account_status   = COALESCE(v.action, a.account_status),
+        risk_level       = CASE WHEN v.account_id IS NULL
+                                THEN a.risk_level ELSE v.risk_level END
+    FROM touched t
+    LEFT JOIN verdict v ON v.account_id = t.account_id
+    WHERE a.account_id = t.account_id;
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+COMMIT;
@@ -0,0 +1,252 @@
+-- Data-driven fraud rules. Each rule carries a structured `condition`:
+--
+--   {"where":  [{"field": "amount", "op": ">", "value": 10000}, ...],
+--    "window": {"seconds": 300, "aggregate": "count", "op": ">", "value": 10}}
+--
+-- `where` predicates (ANDed) test the new transaction; `window` aggregates
+-- the account's transactions that also satisfy `where` over the preceding
+-- `seconds`. Fields: amount, transaction_type, details and idle_seconds
+-- (time since the account's previous activity, not allowed with `window`).
+-- Operators: = != > >= < <= in not_in. Aggregates: count, sum (of amount).
+--
+-- compile_fraud_rules() turns the active rules into one set-based
+-- detect_fraud_on_transactions() trigger function. It runs whenever
+-- FraudRules changes and skips the rebuild when the generated code is
+-- unchanged. Rules without a condition never fire.
+BEGIN;
+
+ALTER TABLE FraudRules ADD COLUMN IF NOT EXISTS condition JSONB;
+
+UPDATE FraudRules
+SET condition = '{"where": [{"field": "transaction_type", "op": "=", "value": "withdrawal"},
+                            {"field": "amount", "op": ">", "value": 10000}]}'
+WHERE rule_name = 'Large Withdrawal' AND condition IS NULL;
+
+UPDATE FraudRules
+SET condition = jsonb_build_object('window', jsonb_build_object(
+        'seconds',   COALESCE(window_seconds, 300),
+        'aggregate', 'count',
+        'op',        '>',
+        'value',     COALESCE(threshold, 10)))
+WHERE rule_name = 'Rapid Transactions' AND condition IS NULL;
+
+UPDATE FraudRules
+SET condition = jsonb_build_object('where', jsonb_build_array(jsonb_build_object(
+        'field', 'idle_seconds',
+        'op',    '>',
+        'value', COALESCE(window_seconds, 15552000))))
+WHERE rule_name = 'Inactive Account Activity' AND condition IS NULL;
+
+-- SQL boolean expression for a `where` list against relation alias `rel`.
+CREATE OR REPLACE FUNCTION fraud_predicate(preds JSONB, rel TEXT)
+RETURNS TEXT AS $$
+DECLARE
+    p      JSONB;
+    field  TEXT;
+    op     TEXT;
+    cast_  TEXT;
+    parts  TEXT[] := ARRAY['TRUE'];
+BEGIN
+    FOR p IN SELECT * FROM jsonb_array_elements(COALESCE(preds, '[]'::jsonb))
+    LOOP
+        field := p->>'field';
+        op    := p->>'op';
+        cast_ := CASE WHEN field IN ('amount', 'idle_seconds') THEN 'numeric'
+                      WHEN field IN ('transaction_type', 'details') THEN 'text' END;
+        IF cast_ IS NULL THEN
+            RAISE EXCEPTION 'fraud rule: unknown field %', field;
+        END IF;
+
+        IF op IN ('in', 'not_in') THEN
+            IF jsonb_typeof(p->'value') <> 'array' OR jsonb_array_length(p->'value') = 0 THEN
+                RAISE EXCEPTION 'fraud rule: % needs a non-empty list', op;
+            END IF;
+            parts := parts || format('%s.%I %s (%s)', rel, field,
+                CASE op WHEN 'in' THEN 'IN' ELSE 'NOT IN' END,
+                (SELECT string_agg(format('%L::%s', v, cast_), ', ')
+                 FROM jsonb_array_elements_text(p->'value') v));
+        ELSIF op IN ('=', '!=', '>', '>=', '<', '<=') THEN
+            parts := parts || format('%s.%I %s %L::%s', rel, field,
+                CASE op WHEN '!=' THEN '<>' ELSE op END, p->>'value', cast_);
+        ELSE
+            RAISE EXCEPTION 'fraud rule: unknown operator %', op;
+        END IF;
+    END LOOP;
+    RETURN array_to_string(parts, ' AND ');
+END;
+$$ LANGUAGE plpgsql IMMUTABLE;
+
+CREATE OR REPLACE FUNCTION compile_fraud_rules()
+RETURNS BOOLEAN AS $$
+DECLARE
+    r         RECORD;
+    w         JSONB;
+    branches  TEXT[] := '{}';
+    branch    TEXT;
+    needs_idle BOOLEAN := FALSE;
+    src       TEXT;
+    body      TEXT;
+    digest    TEXT;
+BEGIN
+    -- Serialize compiles so concurrent rule changes cannot interleave.
+    PERFORM pg_advisory_xact_lock(hashtext('compile_fraud_rules'));
+
+    FOR r IN
+        SELECT rule_id, rule_name, condition
+        FROM FraudRules
+        WHERE active AND condition IS NOT NULL
+        ORDER BY rule_id
+    LOOP
+        w := r.condition->'window';
+        IF r.condition->'where' @? '$[*] ? (@.field == "idle_seconds")' THEN
+            needs_idle := TRUE;
+        END IF;
+
+        branch := format(
+            'SELECT s.transaction_id, s.account_id, %s AS rule_id, %L::VARCHAR AS rule_name FROM src s',
+            r.rule_id, r.rule_name);
+
+        IF w IS NULL THEN
+            branch := branch || ' WHERE ' || fraud_predicate(r.condition->'where', 's');
+        ELSE
+            IF w->>'aggregate' IS NULL OR w->>'aggregate' NOT IN ('count', 'sum') THEN
+                RAISE EXCEPTION 'fraud rule %: unknown aggregate %', r.rule_id, w->>'aggregate';
+            END IF;
+            IF r.condition->'where' @? '$[*] ? (@.field == "idle_seconds")' THEN
+                RAISE EXCEPTION 'fraud rule %: idle_seconds cannot be used with window', r.rule_id;
+            END IF;
+            IF (w->>'seconds')::numeric IS NULL OR (w->>'seconds')::numeric <= 0 THEN
+                RAISE EXCEPTION 'fraud rule %: window.seconds must be positive', r.rule_id;
+            END IF;
+            IF w->>'op' NOT IN ('=', '!=', '>', '>=', '<', '<=') THEN
+                RAISE EXCEPTION 'fraud rule %: unknown window operator %', r.rule_id, w->>'op';
+            END IF;
+            branch := branch || format(
+                ' CROSS JOIN LATERAL (SELECT %s AS agg FROM %s) w WHERE %s AND w.agg %s %L::numeric',
+                CASE w->>'aggregate'
+                    WHEN 'count' THEN 'COUNT(*)'
+                    ELSE 'COALESCE(SUM(t.amount), 0)' END,
+                -- An index range scan on (account_id, transaction_time);
+                -- '>'/'>=' counts stop as soon as the threshold is passed.
+                CASE WHEN w->>'aggregate' = 'count' AND w->>'op' IN ('>', '>=')
+                     THEN format('(SELECT t.amount FROM Transactions t WHERE %s LIMIT %s) t',
+                                 '%WINDOW%', floor((w->>'value')::numeric)::bigint + 1)
+                     ELSE 'Transactions t WHERE %WINDOW%' END,
+                fraud_predicate(r.condition->'where', 's'),
+                CASE w->>'op' WHEN '!=' THEN '<>' ELSE w->>'op' END,
+                w->>'value');
+            branch := replace(branch, '%WINDOW%', format(
+                't.account_id = s.account_id'
+                ' AND (t.transaction_time, t.transaction_id)'
+                ' <= (s.transaction_time, s.transaction_id)'
+                ' AND t.transaction_time > s.transaction_time - make_interval(secs => %s)'
+                ' AND %s',
+                (w->>'seconds')::numeric, fraud_predicate(r.condition->'where', 't')));
+        END IF;
+        branches := branches || branch;
+    END LOOP;
+
+    IF needs_idle THEN
+        -- Previous activity: the prior row of the same statement, else
+        -- Accounts.last_activity_at, else (not yet backfilled) a one-row
+        -- index probe, else account creation.
+        src := '
+            SELECT n.*,
+                   EXTRACT(EPOCH FROM n.transaction_time - COALESCE(
+                       LAG(n.transaction_time) OVER (
+                           PARTITION BY n.account_id
+                           ORDER BY n.transaction_time, n.transaction_id),
+                       a.last_activity_at,
+                       (SELECT t.transaction_time
+                        FROM Transactions t
+                        WHERE t.account_id = n.account_id
+                          AND (t.transaction_time, t.transaction_id)
+                              < (n.transaction_time, n.transaction_id)
+                        ORDER BY t.transaction_time DESC, t.transaction_id DESC
+                        LIMIT 1),
+                       a.created_at)) AS idle_seconds
+            FROM new_transactions n
+            JOIN Accounts a ON a.account_id = n.account_id';
+    ELSE
+        src := 'SELECT * FROM new_transactions';
+    END IF;
+
+    IF cardinality(branches) = 0 THEN
+        branches := ARRAY['SELECT NULL::INT AS transaction_id, NULL::INT AS account_id,'
+                          ' NULL::INT AS rule_id, NULL::VARCHAR AS rule_name WHERE FALSE'];
+    END IF;
+
+    body := format($tpl$
+CREATE OR REPLACE FUNCTION detect_fraud_on_transactions()
+RETURNS TRIGGER AS $fn$
+BEGIN
+    WITH src AS (%s),
+    matches AS (
+        %s
+    ),
+    logged AS (
+        INSERT INTO TransactionLogs (transaction_id, rule_id, detected_rule)
+        SELECT transaction_id, rule_id, rule_name
+        FROM matches
+    ),
+    verdict AS (
+        SELECT DISTINCT ON (m.account_id)
+               m.account_id, r.action, r.risk_level
+        FROM matches m
+        JOIN FraudRules r ON r.rule_id = m.rule_id
+        ORDER BY m.account_id, m.transaction_id DESC, r.precedence DESC
+    ),
+    touched AS (
+        SELECT account_id, MAX(transaction_time) AS last_tx
+        FROM new_transactions
+        GROUP BY account_id
+    )
+    UPDATE Accounts a
+    SET last_activity_at = GREATEST(a.last_activity_at, t.last_tx),
+        account_status   = COALESCE(v.action, a.account_status),
+        risk_level       = CASE WHEN v.account_id IS NULL
+                                THEN a.risk_level ELSE v.risk_level END
+    FROM touched t
+    LEFT JOIN verdict v ON v.account_id = t.account_id
+    WHERE a.account_id = t.account_id;
+
+    RETURN NULL;
+END;
+$fn$ LANGUAGE plpgsql;
+$tpl$, src, array_to_string(branches, E'\n        UNION ALL\n        '));
+
+    digest := md5(body);
+    IF obj_description('detect_fraud_on_transactions()'::regprocedure, 'pg_proc')
+       IS NOT DISTINCT FROM 'compiled:' || digest THEN
+        RETURN FALSE;
+    END IF;
+
+    EXECUTE body;
+    EXECUTE format('COMMENT ON FUNCTION detect_fraud_on_transactions() IS %L',
+                   'compiled:' || digest);
+    RETURN TRUE;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION recompile_fraud_rules()
+RETURNS TRIGGER AS $$
+BEGIN
+    PERFORM compile_fraud_rules();
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trigger_compile_fraud_rules ON FraudRules;
+CREATE TRIGGER trigger_compile_fraud_rules
+AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON FraudRules
+FOR EACH STATEMENT
+EXECUTE FUNCTION recompile_fraud_rules();
+
+SELECT compile_fraud_rules();
+
+-- Folded into `condition` above.
+ALTER TABLE FraudRules
+    DROP COLUMN IF EXISTS window_seconds,
+    DROP COLUMN IF EXISTS threshold;
+
+COMMIT;
@@ -0,0 +1,166 @@
+-- Keep bounded window counts on idx_transactions_account_time_id. With
+-- `where` filters in a windowed count rule, the planner could pick a
+-- sequential scan for the LIMITed probe, costing a full table scan per
+-- inserted row during bulk loads.
+BEGIN;
+
+CREATE OR REPLACE FUNCTION compile_fraud_rules()
+RETURNS BOOLEAN AS $$
+DECLARE
+    r         RECORD;
+    w         JSONB;
+    branches  TEXT[] := '{}';
+    branch    TEXT;
+    needs_idle BOOLEAN := FALSE;
+    src       TEXT;
+    body      TEXT;
+    digest    TEXT;
+BEGIN
+    -- Serialize compiles so concurrent rule changes cannot interleave.
+    PERFORM pg_advisory_xact_lock(hashtext('compile_fraud_rules'));
+
+    FOR r IN
+        SELECT rule_id, rule_name, condition
+        FROM FraudRules
+        WHERE active AND condition IS NOT NULL
+        ORDER BY rule_id
+    LOOP
+        w := r.condition->'window';
+        IF r.condition->'where' @? '$[*] ? (@.field == "idle_seconds")' THEN
+            needs_idle := TRUE;
+        END IF;
+
+        branch := format(
+            'SELECT s.transaction_id, s.account_id, %s AS rule_id, %L::VARCHAR AS rule_name FROM src s',
+            r.rule_id, r.rule_name);
+
+        IF w IS NULL THEN
+            branch := branch || ' WHERE ' || fraud_predicate(r.condition->'where', 's');
+        ELSE
+            IF w->>'aggregate' IS NULL OR w->>'aggregate' NOT IN ('count', 'sum') THEN
+                RAISE EXCEPTION 'fraud rule %: unknown aggregate %', r.rule_id, w->>'aggregate';
+            END IF;
+            IF r.condition->'where' @? '$[*] ? (@.field == "idle_seconds")' THEN
+                RAISE EXCEPTION 'fraud rule %: idle_seconds cannot be used with window', r.rule_id;
+            END IF;
+            IF (w->>'seconds')::numeric IS NULL OR (w->>'seconds')::numeric <= 0 THEN
+                RAISE EXCEPTION 'fraud rule %: window.seconds must be positive', r.rule_id;
+            END IF;
+            IF w->>'op' NOT IN ('=', '!=', '>', '>=', '<', '<=') THEN
+                RAISE EXCEPTION 'fraud rule %: unknown window operator %', r.rule_id, w->>'op';
+            END IF;
+            branch := branch || format(
+                ' CROSS JOIN LATERAL (SELECT %s AS agg FROM %s) w WHERE %s AND w.agg %s %L::numeric',
+                CASE w->>'aggregate'
+                    WHEN 'count' THEN 'COUNT(*)'
+                    ELSE 'COALESCE(SUM(t.amount), 0)' END,
+                -- An index range scan on (account_id, transaction_time);
+                -- '>'/'>=' counts stop as soon as the threshold is passed.
+                -- The ORDER BY pins the bounded probe to that index: with
+                -- extra `where` filters the planner otherwise bets on a
+                -- LIMITed seq scan stopping early.
+                CASE WHEN w->>'aggregate' = 'count' AND w->>'op' IN ('>', '>=')
+                     THEN format('(SELECT t.amount FROM Transactions t WHERE %s'
+                                 ' ORDER BY t.transaction_time DESC, t.transaction_id DESC'
+                                 ' LIMIT %s) t',
+                                 '%WINDOW%', floor((w->>'value')::numeric)::bigint + 1)
+                     ELSE 'Transactions t WHERE %WINDOW%' END,
+                fraud_predicate(r.condition->'where', 's'),
+                CASE w->>'op' WHEN '!=' THEN '<>' ELSE w->>'op' END,
+                w->>'value');
+            branch := replace(branch, '%WINDOW%', format(
+                't.account_id = s.account_id'
+                ' AND (t.transaction_time, t.transaction_id)'
+                ' <= (s.transaction_time, s.transaction_id)'
+                ' AND t.transaction_time > s.transaction_time - make_interval(secs => %s)'
+                ' AND %s',
+                (w->>'seconds')::numeric, fraud_predicate(r.condition->'where', 't')));
+        END IF;
+        branches := branches || branch;
+    END LOOP;
+
+    IF needs_idle THEN
+        -- Previous activity: the prior row of the same statement, else
+        -- Accounts.last_activity_at, else (not yet backfilled) a one-row
+        -- index probe, else account creation.
+        src := '
+            SELECT n.*,
+                   EXTRACT(EPOCH FROM n.transaction_time - COALESCE(
+                       LAG(n.transaction_time) OVER (
+                           PARTITION BY n.account_id
+                           ORDER BY n.transaction_time, n.transaction_id),
+                       a.last_activity_at,
+                       (SELECT t.transaction_time
+                        FROM Transactions t
+                        WHERE t.account_id = n.account_id
+                          AND (t.transaction_time, t.transaction_id)
+                              < (n.transaction_time, n.transaction_id)
+                        ORDER BY t.transaction_time DESC, t.transaction_id DESC
+                        LIMIT 1),
+                       a.created_at)) AS idle_seconds
+            FROM new_transactions n
+            JOIN Accounts a ON a.account_id = n.account_id';
+    ELSE
+        src := 'SELECT * FROM new_transactions';
+    END IF;
+
+    IF cardinality(branches) = 0 THEN
+        branches := ARRAY['SELECT NULL::INT AS transaction_id, NULL::INT AS account_id,'
+                          ' NULL::INT AS rule_id, NULL::VARCHAR AS rule_name WHERE FALSE'];
+    END IF;
+
+    body := format($tpl$
+CREATE OR REPLACE FUNCTION detect_fraud_on_transactions()
+RETURNS TRIGGER AS $fn$
+BEGIN
+    WITH src AS (%s),
+    matches AS (
+        %s
+    ),
+    logged AS (
+        INSERT INTO TransactionLogs (transaction_id, rule_id, detected_rule)
+        SELECT transaction_id, rule_id, rule_name
+        FROM matches
+    ),
+    verdict AS (
+        SELECT DISTINCT ON (m.account_id)
+               m.account_id, r.action, r.risk_level
+        FROM matches m
+        JOIN FraudRules r ON r.rule_id = m.rule_id
+        ORDER BY m.account_id, m.transaction_id DESC, r.precedence DESC, r.rule_id DESC
+    ),
+    touched AS (
+        SELECT account_id, MAX(transaction_time) AS last_tx
+        FROM new_transactions
+        GROUP BY account_id
+    )
+    UPDATE Accounts a
+    SET last_activity_at = GREATEST(a.last_activity_at, t.last_tx),
+        account_status   = COALESCE(v.action, a.account_status),
+        risk_level       = CASE WHEN v.account_id IS NULL
+                                THEN a.risk_level ELSE v.risk_level END
+    FROM touched t
+    LEFT JOIN verdict v ON v.account_id = t.account_id
+    WHERE a.account_id = t.account_id;
+
+    RETURN NULL;
+END;
+$fn$ LANGUAGE plpgsql;
+$tpl$, src, array_to_string(branches, E'\n        UNION ALL\n        '));
+
+    digest := md5(body);
+    IF obj_description('detect_fraud_on_transactions()'::regprocedure, 'pg_proc')
+       IS NOT DISTINCT FROM 'compiled:' || digest THEN
+        RETURN FALSE;
+    END IF;
+
+    EXECUTE body;
+    EXECUTE format('COMMENT ON FUNCTION detect_fraud_on_transactions() IS %L',
+                   'compiled:' || digest);
+    RETURN TRUE;
+END;
+$$ LANGUAGE plpgsql;
+
+SELECT compile_fraud_rules();
+
+COMMIT;
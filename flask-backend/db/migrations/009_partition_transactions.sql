@@ -0,0 +1,265 @@
+-- Range-partition Transactions by month on transaction_time.
+--
+-- The table is rebuilt: rows are copied into the partitioned table while
+-- Transactions is locked, so plan a maintenance window proportional to its
+-- size. Afterwards partitions are managed by partitions.py:
+--   flask --app app partitions-maintain   create partitions ahead of time
+--   flask --app app partitions-archive    detach (or drop) old months
+--   flask --app app partitions-check      confirm hot queries prune
+--
+-- A partitioned table's unique keys must include the partition key, so the
+-- primary key becomes (transaction_id, transaction_time) and the
+-- TransactionLogs -> Transactions foreign key is dropped (it could not
+-- survive archiving old partitions anyway). Archiving detaches with
+-- DETACH PARTITION ... CONCURRENTLY, which needs PostgreSQL 14+.
+BEGIN;
+
+LOCK TABLE Transactions IN ACCESS EXCLUSIVE MODE;
+
+ALTER TABLE TransactionLogs DROP CONSTRAINT IF EXISTS transactionlogs_transaction_id_fkey;
+ALTER TABLE Transactions RENAME TO transactions_unpartitioned;
+
+CREATE TABLE Transactions (
+    transaction_id   INT NOT NULL DEFAULT nextval('transactions_transaction_id_seq'),
+    account_id       INT,
+    transaction_type VARCHAR(50) NOT NULL,
+    amount           NUMERIC(15, 2) NOT NULL,
+    transaction_time TIMESTAMP NOT NULL DEFAULT NOW(),
+    details          TEXT
+) PARTITION BY RANGE (transaction_time);
+
+ALTER SEQUENCE transactions_transaction_id_seq OWNED BY Transactions.transaction_id;
+
+-- Monthly partitions transactions_yYYYYmMM covering [from_ts, to_ts].
+CREATE OR REPLACE FUNCTION create_transaction_partitions(from_ts TIMESTAMP, to_ts TIMESTAMP)
+RETURNS INT AS $$
+DECLARE
+    month   TIMESTAMP := date_trunc('month', from_ts);
+    created INT := 0;
+    part    TEXT;
+BEGIN
+    IF from_ts IS NULL OR to_ts IS NULL THEN
+        RETURN 0;
+    END IF;
+    WHILE month <= to_ts LOOP
+        part := format('transactions_y%sm%s', to_char(month, 'YYYY'), to_char(month, 'MM'));
+        IF to_regclass(part) IS NULL THEN
+            EXECUTE format(
+                'CREATE TABLE %I PARTITION OF Transactions FOR VALUES FROM (%L) TO (%L)',
+                part, month, month + INTERVAL '1 month');
+            created := created + 1;
+        END IF;
+        month := month + INTERVAL '1 month';
+    END LOOP;
+    RETURN created;
+END;
+$$ LANGUAGE plpgsql;
+
+SELECT create_transaction_partitions(
+    LEAST(MIN(transaction_time), NOW()::timestamp),
+    NOW()::timestamp + INTERVAL '3 months')
+FROM transactions_unpartitioned;
+
+-- Copy before creating the triggers: existing rows were already scored
+-- and counted.
+INSERT INTO Transactions
+    (transaction_id, account_id, transaction_type, amount, transaction_time, details)
+SELECT transaction_id, account_id, transaction_type, amount,
+       COALESCE(transaction_time, NOW()), details
+FROM transactions_unpartitioned;
+
+DROP TABLE transactions_unpartitioned;
+
+-- Keys are added after the copy (and after the old table's constraint
+-- names are free again).
+ALTER TABLE Transactions ADD PRIMARY KEY (transaction_id, transaction_time);
+ALTER TABLE Transactions ADD FOREIGN KEY (account_id)
+    REFERENCES Accounts(account_id) ON DELETE CASCADE;
+
+-- Indexes from migration 001, now per partition.
+CREATE INDEX idx_transactions_time_id
+    ON Transactions (transaction_time DESC, transaction_id DESC);
+CREATE INDEX idx_transactions_account_time_id
+    ON Transactions (account_id, transaction_time DESC, transaction_id DESC);
+
+-- Triggers from migrations 002 and 003 (statement level on the root).
+CREATE TRIGGER trigger_detect_fraud
+AFTER INSERT ON Transactions
+REFERENCING NEW TABLE AS new_transactions
+FOR EACH STATEMENT
+EXECUTE FUNCTION detect_fraud_on_transactions();
+
+CREATE TRIGGER count_transactions_ins AFTER INSERT ON Transactions
+REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION count_rows_inserted('total_transactions');
+
+CREATE TRIGGER count_transactions_del AFTER DELETE ON Transactions
+REFERENCING OLD TABLE AS old_rows
+FOR EACH STATEMENT EXECUTE FUNCTION count_rows_deleted('total_transactions');
+
+-- Recompile the trigger with plain bounds next to the row comparisons in
+-- its probes, so each probe prunes to the partitions of its time window.
+CREATE OR REPLACE FUNCTION compile_fraud_rules()
+RETURNS BOOLEAN AS $$
+DECLARE
+    r         RECORD;
+    w         JSONB;
+    branches  TEXT[] := '{}';
+    branch    TEXT;
+    needs_idle BOOLEAN := FALSE;
+    src       TEXT;
+    body      TEXT;
+    digest    TEXT;
+BEGIN
+    -- Serialize compiles so concurrent rule changes cannot interleave.
+    PERFORM pg_advisory_xact_lock(hashtext('compile_fraud_rules'));
+
+    FOR r IN
+        SELECT rule_id, rule_name, condition
+        FROM FraudRules
+        WHERE active AND condition IS NOT NULL
+        ORDER BY rule_id
+    LOOP
+        w := r.condition->'window';
+        IF r.condition->'where' @? '$[*] ? (@.field == "idle_seconds")' THEN
+            needs_idle := TRUE;
+        END IF;
+
+        branch := format(
+            'SELECT s.transaction_id, s.account_id, %s AS rule_id, %L::VARCHAR AS rule_name FROM src s',
+            r.rule_id, r.rule_name);
+
+        IF w IS NULL THEN
+            branch := branch || ' WHERE ' || fraud_predicate(r.condition->'where', 's');
+        ELSE
+            IF w->>'aggregate' IS NULL OR w->>'aggregate' NOT IN ('count', 'sum') THEN
+                RAISE EXCEPTION 'fraud rule %: unknown aggregate %', r.rule_id, w->>'aggregate';
+            END IF;
+            IF r.condition->'where' @? '$[*] ? (@.field == "idle_seconds")' THEN
+                RAISE EXCEPTION 'fraud rule %: idle_seconds cannot be used with window', r.rule_id;
+            END IF;
+            IF (w->>'seconds')::numeric IS NULL OR (w->>'seconds')::numeric <= 0 THEN
+                RAISE EXCEPTION 'fraud rule %: window.seconds must be positive', r.rule_id;
+            END IF;
+            IF w->>'op' NOT IN ('=', '!=', '>', '>=', '<', '<=') THEN
+                RAISE EXCEPTION 'fraud rule %: unknown window operator %', r.rule_id, w->>'op';
+            END IF;
+            branch := branch || format(
+                ' CROSS JOIN LATERAL (SELECT %s AS agg FROM %s) w WHERE %s AND w.agg %s %L::numeric',
+                CASE w->>'aggregate'
+                    WHEN 'count' THEN 'COUNT(*)'
+                    ELSE 'COALESCE(SUM(t.amount), 0)' END,
+                -- An index range scan on (account_id, transaction_time);
+                -- '>'/'>=' counts stop as soon as the threshold is passed.
+                -- The ORDER BY pins the bounded probe to that index: with
+                -- extra `where` filters the planner otherwise bets on a
+                -- LIMITed seq scan stopping early.
+                CASE WHEN w->>'aggregate' = 'count' AND w->>'op' IN ('>', '>=')
+                     THEN format('(SELECT t.amount FROM Transactions t WHERE %s'
+                                 ' ORDER BY t.transaction_time DESC, t.transaction_id DESC'
+                                 ' LIMIT %s) t',
+                                 '%WINDOW%', floor((w->>'value')::numeric)::bigint + 1)
+                     ELSE 'Transactions t WHERE %WINDOW%' END,
+                fraud_predicate(r.condition->'where', 's'),
+                CASE w->>'op' WHEN '!=' THEN '<>' ELSE w->>'op' END,
+                w->>'value');
+            branch := replace(branch, '%WINDOW%', format(
+                't.account_id = s.account_id'
+                ' AND (t.transaction_time, t.transaction_id)'
+                ' <= (s.transaction_time, s.transaction_id)'
+                ' AND t.transaction_time <= s.transaction_time'
+                ' AND t.transaction_time > s.transaction_time - make_interval(secs => %s)'
+                ' AND %s',
+                (w->>'seconds')::numeric, fraud_predicate(r.condition->'where', 't')));
+        END IF;
+        branches := branches || branch;
+    END LOOP;
+
+    IF needs_idle THEN
+        -- Previous activity: the prior row of the same statement, else
+        -- Accounts.last_activity_at, else (not yet backfilled) a one-row
+        -- index probe, else account creation.
+        src := '
+            SELECT n.*,
+                   EXTRACT(EPOCH FROM n.transaction_time - COALESCE(
+                       LAG(n.transaction_time) OVER (
+                           PARTITION BY n.account_id
+                           ORDER BY n.transaction_time, n.transaction_id),
+                       a.last_activity_at,
+                       (SELECT t.transaction_time
+                        FROM Transactions t
+                        WHERE t.account_id = n.account_id
+                          AND (t.transaction_time, t.transaction_id)
+                              < (n.transaction_time, n.transaction_id)
+                          AND t.transaction_time <= n.transaction_time
+                        ORDER BY t.transaction_time DESC, t.transaction_id DESC
+                        LIMIT 1),
+                       a.created_at)) AS idle_seconds
+            FROM new_transactions n
+            JOIN Accounts a ON a.account_id = n.account_id';
+    ELSE
+        src := 'SELECT * FROM new_transactions';
+    END IF;
+
+    IF cardinality(branches) = 0 THEN
+        branches := ARRAY['SELECT NULL::INT AS transaction_id, NULL::INT AS account_id,'
+                          ' NULL::INT AS rule_id, NULL::VARCHAR AS rule_name WHERE FALSE'];
+    END IF;
+
+    body := format($tpl$
+CREATE OR REPLACE FUNCTION detect_fraud_on_transactions()
+RETURNS TRIGGER AS $fn$
+BEGIN
+    WITH src AS (%s),
+    matches AS (
+        %s
+    ),
+    logged AS (
+        INSERT INTO TransactionLogs (transaction_id, rule_id, detected_rule)
+        SELECT transaction_id, rule_id, rule_name
+        FROM matches
+    ),
+    verdict AS (
+        SELECT DISTINCT ON (m.account_id)
+               m.account_id, r.action, r.risk_level
+        FROM matches m
+        JOIN FraudRules r ON r.rule_id = m.rule_id
+        ORDER BY m.account_id, m.transaction_id DESC, r.precedence DESC, r.rule_id DESC
+    ),
+    touched AS (
+        SELECT account_id, MAX(transaction_time) AS last_tx
+        FROM new_transactions
+        GROUP BY account_id
+    )
+    UPDATE Accounts a
+    SET last_activity_at = GREATEST(a.last_activity_at, t.last_tx),
+        account_status   = COALESCE(v.action, a.account_status),
+        risk_level       = CASE WHEN v.account_id IS NULL
+                                THEN a.risk_level ELSE v.risk_level END
+    FROM touched t
+    LEFT JOIN verdict v ON v.account_id = t.account_id
+    WHERE a.account_id = t.account_id;
+
+    RETURN NULL;
+END;
+$fn$ LANGUAGE plpgsql;
+$tpl$, src, array_to_string(branches, E'\n        UNION ALL\n        '));
+
+    digest := md5(body);
+    IF obj_description('detect_fraud_on_transactions()'::regprocedure, 'pg_proc')
+       IS NOT DISTINCT FROM 'compiled:' || digest THEN
+        RETURN FALSE;
+    END IF;
+
+    EXECUTE body;
+    EXECUTE format('COMMENT ON FUNCTION detect_fraud_on_transactions() IS %L',
+                   'compiled:' || digest);
+    RETURN TRUE;
+END;
+$$ LANGUAGE plpgsql;
+
+SELECT compile_fraud_rules();
+
+COMMIT;
+
+ANALYZE Transactions;
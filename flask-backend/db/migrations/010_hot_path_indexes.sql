@@ -0,0 +1,36 @@
+-- Secondary indexes for the hot query paths in app.py and the fraud
+-- trigger. Verify with: flask --app app check-indexes
+-- Apply with: flask --app app migrate
+-- (No BEGIN/COMMIT: CONCURRENTLY cannot run inside a transaction block,
+-- so the runner executes it statement by statement. Do not run it with
+-- psql -f: that skips the schema_migrations record. A failed build leaves
+-- an INVALID index behind; the runner names it and will not record the
+-- file until it is dropped and the migration re-run.)
+
+-- /api/admin/fraud-logs: only pending logs, covering the columns the
+-- route reads from TransactionLogs. Resolved logs never enter the index.
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_transactionlogs_pending
+    ON TransactionLogs (created_at DESC, log_id)
+    INCLUDE (transaction_id, detected_rule)
+    WHERE status = 'pending';
+
+-- Logs of given transactions: bulk ingest detection counts, and the
+-- lookups the dropped foreign key used to serve (db/migrations/009).
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_transactionlogs_transaction_id
+    ON TransactionLogs (transaction_id);
+
+-- /api/user/accounts lists a user's accounts newest first; also serves
+-- the account lookup of /api/user/transactions, replacing the plain
+-- user_id index from migration 001. Balance is deliberately not
+-- INCLUDEd: it would turn every balance update into a non-HOT update.
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_accounts_user_created
+    ON Accounts (user_id, created_at DESC);
+DROP INDEX CONCURRENTLY IF EXISTS idx_accounts_user_id;
+
+-- /api/auth/login and signup look users up by name.
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_users_username
+    ON Users (username);
+
+ANALYZE TransactionLogs;
+ANALYZE Accounts;
+ANALYZE Users;
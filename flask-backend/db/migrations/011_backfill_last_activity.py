@@ -0,0 +1,8 @@
+# Backfill Accounts.last_activity_at (added by 005) in committed batches,
+# so the Inactive Account Activity rule stops falling back to the
+# per-row index probe for accounts with history.
+from backfills import backfill_last_activity
+
+
+def migrate(conn, log):
+    backfill_last_activity(conn, chunk_size=1000, log=log)
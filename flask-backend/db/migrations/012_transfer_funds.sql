@@ -0,0 +1,61 @@
+-- Transfers as one server-side call. Both account rows are locked in
+-- account_id order, so two opposite-direction transfers queue on the same
+-- first row instead of each holding the row the other needs (deadlock).
+-- Validation errors are raised as plain exceptions (SQLSTATE P0001) whose
+-- message is shown to the user.
+BEGIN;
+
+CREATE OR REPLACE FUNCTION transfer_funds(
+    p_user_id INT, p_source_id INT, p_dest_id INT, p_amount NUMERIC)
+RETURNS SETOF Transactions AS $$
+DECLARE
+    src Accounts%ROWTYPE;
+    dst Accounts%ROWTYPE;
+    acct Accounts%ROWTYPE;
+BEGIN
+    IF p_amount IS NULL OR p_amount <= 0 THEN
+        RAISE EXCEPTION 'Invalid amount';
+    END IF;
+    IF p_source_id = p_dest_id THEN
+        RAISE EXCEPTION 'Source and destination must differ';
+    END IF;
+
+    FOR acct IN
+        SELECT * FROM Accounts
+        WHERE account_id IN (p_source_id, p_dest_id)
+        ORDER BY account_id
+        FOR UPDATE
+    LOOP
+        IF acct.account_id = p_source_id THEN
+            src := acct;
+        ELSE
+            dst := acct;
+        END IF;
+    END LOOP;
+
+    IF src.account_id IS NULL OR src.user_id IS DISTINCT FROM p_user_id THEN
+        RAISE EXCEPTION 'Source account not found';
+    END IF;
+    IF dst.account_id IS NULL THEN
+        RAISE EXCEPTION 'Destination account not found';
+    END IF;
+    IF src.balance < p_amount THEN
+        RAISE EXCEPTION 'Insufficient funds';
+    END IF;
+
+    UPDATE Accounts
+    SET balance = balance + CASE WHEN account_id = p_source_id
+                                 THEN -p_amount ELSE p_amount END
+    WHERE account_id IN (p_source_id, p_dest_id);
+
+    -- One statement, so the fraud trigger scores both legs together.
+    RETURN QUERY
+    INSERT INTO Transactions (account_id, transaction_type, amount, details)
+    VALUES
+        (p_source_id, 'transfer_out', p_amount, 'To ' || p_dest_id),
+        (p_dest_id,   'transfer_in',  p_amount, 'From ' || p_source_id)
+    RETURNING *;
+END;
+$$ LANGUAGE plpgsql;
+
+COMMIT;
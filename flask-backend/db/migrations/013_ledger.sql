@@ -0,0 +1,436 @@
+-- Append-only double-entry ledger as the source of truth for balances,
+-- so writers to one busy account no longer queue on its Accounts row.
+--
+--   LedgerPostings   one row per posting; the postings of a journal sum
+--                    to zero. Never updated or deleted.
+--   AccountBalances  the ledger summed per account into up to
+--                    ledger_shard_count() rows; each journal adds to a
+--                    random shard, so concurrent credits to the same
+--                    account update different tuples.
+--
+-- A balance is SUM(AccountBalances.balance) for the account. Deposits take
+-- no lock on the account; withdrawals and transfers lock their Accounts
+-- rows FOR NO KEY UPDATE, which does not block the foreign key checks of
+-- concurrent credits, so the funds check cannot race. Money entering or
+-- leaving the bank is posted against the SYS-CASH account.
+-- Accounts.balance becomes a snapshot refreshed by
+-- `flask --app app ledger-rollup`.
+BEGIN;
+
+CREATE SEQUENCE ledger_journal_seq;
+
+CREATE TABLE LedgerPostings (
+    posting_id     BIGSERIAL PRIMARY KEY,
+    journal_id     BIGINT NOT NULL,
+    account_id     INT NOT NULL REFERENCES Accounts(account_id),
+    amount         NUMERIC(15, 2) NOT NULL CHECK (amount <> 0),
+    transaction_id INT,
+    posted_at      TIMESTAMP NOT NULL DEFAULT NOW()
+);
+CREATE INDEX idx_ledgerpostings_account ON LedgerPostings (account_id, posting_id);
+CREATE INDEX idx_ledgerpostings_journal ON LedgerPostings (journal_id);
+
+CREATE OR REPLACE FUNCTION ledger_append_only()
+RETURNS TRIGGER AS $$
+BEGIN
+    RAISE EXCEPTION 'LedgerPostings is append-only; post a reversing journal instead';
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER ledger_append_only
+BEFORE UPDATE OR DELETE OR TRUNCATE ON LedgerPostings
+FOR EACH STATEMENT EXECUTE FUNCTION ledger_append_only();
+
+CREATE TABLE AccountBalances (
+    account_id INT NOT NULL REFERENCES Accounts(account_id),
+    shard      SMALLINT NOT NULL,
+    balance    NUMERIC(15, 2) NOT NULL DEFAULT 0,
+    PRIMARY KEY (account_id, shard)
+);
+
+INSERT INTO Accounts (user_id, account_number, balance)
+VALUES (NULL, 'SYS-CASH', 0)
+ON CONFLICT (account_number) DO NOTHING;
+
+CREATE OR REPLACE FUNCTION cash_account_id()
+RETURNS INT AS $$
+    SELECT account_id FROM Accounts WHERE account_number = 'SYS-CASH';
+$$ LANGUAGE sql STABLE;
+
+-- Raising it spreads new journals over more rows; existing rows keep
+-- counting, so no data migration is needed.
+CREATE OR REPLACE FUNCTION ledger_shard_count()
+RETURNS INT AS $$
+    SELECT 8;
+$$ LANGUAGE sql IMMUTABLE;
+
+-- Append one balanced journal and fold it into the balance shards.
+CREATE OR REPLACE FUNCTION post_journal(
+    p_accounts INT[], p_amounts NUMERIC[], p_transactions INT[])
+RETURNS BIGINT AS $$
+DECLARE
+    journal BIGINT := nextval('ledger_journal_seq');
+BEGIN
+    IF (SELECT SUM(m) FROM unnest(p_amounts) AS m) IS DISTINCT FROM 0 THEN
+        RAISE EXCEPTION 'Unbalanced journal: postings sum to %',
+            (SELECT SUM(m) FROM unnest(p_amounts) AS m);
+    END IF;
+
+    INSERT INTO LedgerPostings (journal_id, account_id, amount, transaction_id)
+    SELECT journal, p.account_id, p.amount, p.transaction_id
+    FROM unnest(p_accounts, p_amounts, p_transactions) AS p(account_id, amount, transaction_id);
+
+    -- Accounts in id order, so concurrent journals lock shard rows in a
+    -- consistent order.
+    INSERT INTO AccountBalances AS b (account_id, shard, balance)
+    SELECT p.account_id, floor(random() * ledger_shard_count()), SUM(p.amount)
+    FROM unnest(p_accounts, p_amounts) AS p(account_id, amount)
+    GROUP BY p.account_id
+    ORDER BY p.account_id
+    ON CONFLICT (account_id, shard) DO UPDATE SET balance = b.balance + EXCLUDED.balance;
+
+    RETURN journal;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION account_balance(p_account_id INT)
+RETURNS NUMERIC AS $$
+    SELECT COALESCE(SUM(balance), 0) FROM AccountBalances WHERE account_id = p_account_id;
+$$ LANGUAGE sql STABLE;
+
+-- ─── MONEY MOVEMENT ──────────────────────────────────────────────────────────
+-- Validation errors are raised as plain exceptions (SQLSTATE P0001), or
+-- P0002 when the caller's own account does not exist; the message is
+-- shown to the user.
+CREATE OR REPLACE FUNCTION deposit_funds(p_user_id INT, p_account_id INT, p_amount NUMERIC)
+RETURNS SETOF Transactions AS $$
+DECLARE
+    tx Transactions%ROWTYPE;
+BEGIN
+    p_amount := round(p_amount, 2);
+    IF p_amount IS NULL OR p_amount <= 0 THEN
+        RAISE EXCEPTION 'Invalid amount';
+    END IF;
+    PERFORM 1 FROM Accounts WHERE account_id = p_account_id AND user_id = p_user_id;
+    IF NOT FOUND THEN
+        RAISE EXCEPTION 'Not found' USING ERRCODE = 'no_data_found';
+    END IF;
+
+    INSERT INTO Transactions (account_id, transaction_type, amount, details)
+    VALUES (p_account_id, 'deposit', p_amount, 'User deposit')
+    RETURNING * INTO tx;
+    PERFORM post_journal(ARRAY[p_account_id, cash_account_id()],
+                         ARRAY[p_amount, -p_amount],
+                         ARRAY[tx.transaction_id, tx.transaction_id]);
+    RETURN NEXT tx;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION withdraw_funds(p_user_id INT, p_account_id INT, p_amount NUMERIC)
+RETURNS SETOF Transactions AS $$
+DECLARE
+    tx Transactions%ROWTYPE;
+BEGIN
+    p_amount := round(p_amount, 2);
+    IF p_amount IS NULL OR p_amount <= 0 THEN
+        RAISE EXCEPTION 'Invalid amount';
+    END IF;
+    PERFORM 1 FROM Accounts
+    WHERE account_id = p_account_id AND user_id = p_user_id
+    FOR NO KEY UPDATE;
+    IF NOT FOUND THEN
+        RAISE EXCEPTION 'Not found' USING ERRCODE = 'no_data_found';
+    END IF;
+    IF account_balance(p_account_id) < p_amount THEN
+        RAISE EXCEPTION 'Insufficient funds';
+    END IF;
+
+    INSERT INTO Transactions (account_id, transaction_type, amount, details)
+    VALUES (p_account_id, 'withdrawal', p_amount, 'User withdrawal')
+    RETURNING * INTO tx;
+    PERFORM post_journal(ARRAY[p_account_id, cash_account_id()],
+                         ARRAY[-p_amount, p_amount],
+                         ARRAY[tx.transaction_id, tx.transaction_id]);
+    RETURN NEXT tx;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Replaces the version from 012. Both rows are still locked in account_id
+-- order, because the fraud trigger may write the destination's verdict,
+-- but FOR NO KEY UPDATE no longer blocks concurrent credits, and neither
+-- row's balance is rewritten: both legs go through the shards.
+CREATE OR REPLACE FUNCTION transfer_funds(
+    p_user_id INT, p_source_id INT, p_dest_id INT, p_amount NUMERIC)
+RETURNS SETOF Transactions AS $$
+DECLARE
+    acct Accounts%ROWTYPE;
+    src  Accounts%ROWTYPE;
+    dst  Accounts%ROWTYPE;
+    tx   Transactions%ROWTYPE;
+    ids  INT[] := '{}';
+BEGIN
+    p_amount := round(p_amount, 2);
+    IF p_amount IS NULL OR p_amount <= 0 THEN
+        RAISE EXCEPTION 'Invalid amount';
+    END IF;
+    IF p_source_id = p_dest_id THEN
+        RAISE EXCEPTION 'Source and destination must differ';
+    END IF;
+
+    FOR acct IN
+        SELECT * FROM Accounts
+        WHERE account_id IN (p_source_id, p_dest_id)
+        ORDER BY account_id
+        FOR NO KEY UPDATE
+    LOOP
+        IF acct.account_id = p_source_id THEN
+            src := acct;
+        ELSE
+            dst := acct;
+        END IF;
+    END LOOP;
+
+    IF src.account_id IS NULL OR src.user_id IS DISTINCT FROM p_user_id THEN
+        RAISE EXCEPTION 'Source account not found';
+    END IF;
+    IF dst.account_id IS NULL THEN
+        RAISE EXCEPTION 'Destination account not found';
+    END IF;
+    IF account_balance(p_source_id) < p_amount THEN
+        RAISE EXCEPTION 'Insufficient funds';
+    END IF;
+
+    -- One statement, so the fraud trigger scores both legs together.
+    FOR tx IN
+        INSERT INTO Transactions (account_id, transaction_type, amount, details)
+        VALUES
+            (p_source_id, 'transfer_out', p_amount, 'To ' || p_dest_id),
+            (p_dest_id,   'transfer_in',  p_amount, 'From ' || p_source_id)
+        RETURNING *
+    LOOP
+        ids := ids || tx.transaction_id;
+        RETURN NEXT tx;
+    END LOOP;
+    PERFORM post_journal(ARRAY[p_source_id, p_dest_id], ARRAY[-p_amount, p_amount], ids);
+END;
+$$ LANGUAGE plpgsql;
+
+-- Opening journals: carry the current balances over, against SYS-CASH.
+INSERT INTO LedgerPostings (journal_id, account_id, amount)
+SELECT j.journal_id, p.account_id, p.amount
+FROM (
+    SELECT account_id, balance, nextval('ledger_journal_seq') AS journal_id
+    FROM Accounts
+    WHERE balance <> 0 AND account_number <> 'SYS-CASH'
+) j
+CROSS JOIN LATERAL (
+    VALUES (j.account_id, j.balance), (cash_account_id(), -j.balance)
+) AS p(account_id, amount);
+
+INSERT INTO AccountBalances (account_id, shard, balance)
+SELECT account_id, 0, SUM(amount)
+FROM LedgerPostings
+GROUP BY account_id;
+
+UPDATE Accounts SET balance = account_balance(cash_account_id())
+WHERE account_number = 'SYS-CASH';
+
+-- ─── FRAUD TRIGGER ───────────────────────────────────────────────────────────
+-- Statement triggers on one event fire in name order. Counting after
+-- trigger_detect_fraud keeps every writer taking its Accounts row before
+-- a DashboardCounters shard: a deposit takes the row only when the fraud
+-- trigger writes a new verdict, withdrawals and transfers up front, and
+-- the opposite order deadlocks the two against each other.
+ALTER TRIGGER count_transactions_ins ON Transactions RENAME TO tx_count_ins;
+ALTER TRIGGER count_transactions_del ON Transactions RENAME TO tx_count_del;
+
+-- The trigger's per-statement Accounts UPDATE was the other write every
+-- transaction made to its account row.
+CREATE OR REPLACE FUNCTION compile_fraud_rules()
+RETURNS BOOLEAN AS $$
+DECLARE
+    r         RECORD;
+    w         JSONB;
+    branches  TEXT[] := '{}';
+    branch    TEXT;
+    needs_idle BOOLEAN := FALSE;
+    src       TEXT;
+    body      TEXT;
+    digest    TEXT;
+BEGIN
+    -- Serialize compiles so concurrent rule changes cannot interleave.
+    PERFORM pg_advisory_xact_lock(hashtext('compile_fraud_rules'));
+
+    FOR r IN
+        SELECT rule_id, rule_name, condition
+        FROM FraudRules
+        WHERE active AND condition IS NOT NULL
+        ORDER BY rule_id
+    LOOP
+        w := r.condition->'window';
+        IF r.condition->'where' @? '$[*] ? (@.field == "idle_seconds")' THEN
+            needs_idle := TRUE;
+        END IF;
+
+        branch := format(
+            'SELECT s.transaction_id, s.account_id, %s AS rule_id, %L::VARCHAR AS rule_name FROM src s',
+            r.rule_id, r.rule_name);
+
+        IF w IS NULL THEN
+            branch := branch || ' WHERE ' || fraud_predicate(r.condition->'where', 's');
+        ELSE
+            IF w->>'aggregate' IS NULL OR w->>'aggregate' NOT IN ('count', 'sum') THEN
+                RAISE EXCEPTION 'fraud rule %: unknown aggregate %', r.rule_id, w->>'aggregate';
+            END IF;
+            IF r.condition->'where' @? '$[*] ? (@.field == "idle_seconds")' THEN
+                RAISE EXCEPTION 'fraud rule %: idle_seconds cannot be used with window', r.rule_id;
+            END IF;
+            IF (w->>'seconds')::numeric IS NULL OR (w->>'seconds')::numeric <= 0 THEN
+                RAISE EXCEPTION 'fraud rule %: window.seconds must be positive', r.rule_id;
+            END IF;
+            IF w->>'op' NOT IN ('=', '!=', '>', '>=', '<', '<=') THEN
+                RAISE EXCEPTION 'fraud rule %: unknown window operator %', r.rule_id, w->>'op';
+            END IF;
+            branch := branch || format(
+                ' CROSS JOIN LATERAL (SELECT %s AS agg FROM %s) w WHERE %s AND w.agg %s %L::numeric',
+                CASE w->>'aggregate'
+                    WHEN 'count' THEN 'COUNT(*)'
+                    ELSE 'COALESCE(SUM(t.amount), 0)' END,
+                -- An index range scan on (account_id, transaction_time);
+                -- '>'/'>=' counts stop as soon as the threshold is passed.
+                -- The ORDER BY pins the bounded probe to that index: with
+                -- extra `where` filters the planner otherwise bets on a
+                -- LIMITed seq scan stopping early.
+                CASE WHEN w->>'aggregate' = 'count' AND w->>'op' IN ('>', '>=')
+                     THEN format('(SELECT t.amount FROM Transactions t WHERE %s'
+                                 ' ORDER BY t.transaction_time DESC, t.transaction_id DESC'
+                                 ' LIMIT %s) t',
+                                 '%WINDOW%', floor((w->>'value')::numeric)::bigint + 1)
+                     ELSE 'Transactions t WHERE %WINDOW%' END,
+                fraud_predicate(r.condition->'where', 's'),
+                CASE w->>'op' WHEN '!=' THEN '<>' ELSE w->>'op' END,
+                w->>'value');
+            branch := replace(branch, '%WINDOW%', format(
+                't.account_id = s.account_id'
+                ' AND (t.transaction_time, t.transaction_id)'
+                ' <= (s.transaction_time, s.transaction_id)'
+                ' AND t.transaction_time <= s.transaction_time'
+                ' AND t.transaction_time > s.transaction_time - make_interval(secs => %s)'
+                ' AND %s',
+                (w->>'seconds')::numeric, fraud_predicate(r.condition->'where', 't')));
+        END IF;
+        branches := branches || branch;
+    END LOOP;
+
+    IF needs_idle THEN
+        -- Previous activity: the prior row of the same statement, else the
+        -- later of Accounts.last_activity_at and a one-row index probe
+        -- bounded below by it (the column may lag, see below), else
+        -- account creation.
+        src := '
+            SELECT n.*,
+                   EXTRACT(EPOCH FROM n.transaction_time - COALESCE(
+                       LAG(n.transaction_time) OVER (
+                           PARTITION BY n.account_id
+                           ORDER BY n.transaction_time, n.transaction_id),
+                       GREATEST(a.last_activity_at,
+                           (SELECT t.transaction_time
+                            FROM Transactions t
+                            WHERE t.account_id = n.account_id
+                              AND (t.transaction_time, t.transaction_id)
+                                  < (n.transaction_time, n.transaction_id)
+                              AND t.transaction_time <= n.transaction_time
+                              AND t.transaction_time >= COALESCE(a.last_activity_at, ''-infinity'')
+                            ORDER BY t.transaction_time DESC, t.transaction_id DESC
+                            LIMIT 1)),
+                       a.created_at)) AS idle_seconds
+            FROM new_transactions n
+            JOIN Accounts a ON a.account_id = n.account_id';
+    ELSE
+        src := 'SELECT * FROM new_transactions';
+    END IF;
+
+    IF cardinality(branches) = 0 THEN
+        branches := ARRAY['SELECT NULL::INT AS transaction_id, NULL::INT AS account_id,'
+                          ' NULL::INT AS rule_id, NULL::VARCHAR AS rule_name WHERE FALSE'];
+    END IF;
+
+    body := format($tpl$
+CREATE OR REPLACE FUNCTION detect_fraud_on_transactions()
+RETURNS TRIGGER AS $fn$
+BEGIN
+    WITH src AS (%s),
+    matches AS (
+        %s
+    ),
+    logged AS (
+        INSERT INTO TransactionLogs (transaction_id, rule_id, detected_rule)
+        SELECT transaction_id, rule_id, rule_name
+        FROM matches
+    ),
+    verdict AS (
+        SELECT DISTINCT ON (m.account_id)
+               m.account_id, r.action, r.risk_level
+        FROM matches m
+        JOIN FraudRules r ON r.rule_id = m.rule_id
+        ORDER BY m.account_id, m.transaction_id DESC, r.precedence DESC, r.rule_id DESC
+    ),
+    touched AS (
+        SELECT account_id, MAX(transaction_time) AS last_tx
+        FROM new_transactions
+        GROUP BY account_id
+    ),
+    -- Only verdicts that change an account are written: the credited
+    -- side of a transfer is not locked by transfer_funds, and rewriting
+    -- an unchanged verdict on every match would queue (or deadlock) its
+    -- writers on the Accounts row.
+    flagged AS (
+        UPDATE Accounts a
+        SET last_activity_at = GREATEST(a.last_activity_at, t.last_tx),
+            account_status   = v.action,
+            risk_level       = v.risk_level
+        FROM verdict v
+        JOIN touched t ON t.account_id = v.account_id
+        WHERE a.account_id = v.account_id
+          AND (a.account_status IS DISTINCT FROM v.action
+               OR a.risk_level IS DISTINCT FROM v.risk_level)
+        RETURNING a.account_id
+    ),
+    -- Activity-only touches skip rows another transaction holds and
+    -- values less than a minute old, so a busy account's writers do not
+    -- queue on its Accounts row; the idle probe above covers the lag.
+    active AS (
+        SELECT a.account_id, t.last_tx
+        FROM Accounts a
+        JOIN touched t ON t.account_id = a.account_id
+        WHERE a.account_id NOT IN (SELECT account_id FROM flagged)
+          AND (a.last_activity_at IS NULL
+               OR a.last_activity_at < t.last_tx - INTERVAL '1 minute')
+        FOR NO KEY UPDATE OF a SKIP LOCKED
+    )
+    UPDATE Accounts a
+    SET last_activity_at = GREATEST(a.last_activity_at, x.last_tx)
+    FROM active x
+    WHERE a.account_id = x.account_id;
+
+    RETURN NULL;
+END;
+$fn$ LANGUAGE plpgsql;
+$tpl$, src, array_to_string(branches, E'\n        UNION ALL\n        '));
+
+    digest := md5(body);
+    IF obj_description('detect_fraud_on_transactions()'::regprocedure, 'pg_proc')
+       IS NOT DISTINCT FROM 'compiled:' || digest THEN
+        RETURN FALSE;
+    END IF;
+
+    EXECUTE body;
+    EXECUTE format('COMMENT ON FUNCTION detect_fraud_on_transactions() IS %L',
+                   'compiled:' || digest);
+    RETURN TRUE;
+END;
+$$ LANGUAGE plpgsql;
+
+SELECT compile_fraud_rules();
+
+COMMIT;
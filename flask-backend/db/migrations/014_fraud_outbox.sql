@@ -0,0 +1,65 @@
+-- Opt-in asynchronous fraud detection. In 'async' mode the INSERT trigger
+-- only queues the new transactions in FraudOutbox, in the inserting
+-- transaction, so a committed transaction is always queued; the workers
+-- in outbox.py (`flask --app app fraud-workers`) claim batches with
+-- FOR UPDATE SKIP LOCKED, score them with the rule engine and write
+-- TransactionLogs and account verdicts. 'sync' (the default) keeps
+-- scoring inside the trigger.
+--
+--   SELECT set_fraud_detection_mode('async');   -- or 'sync'
+--
+-- Switching back to 'sync' leaves queued rows for the workers to drain.
+BEGIN;
+
+CREATE TABLE FraudOutbox (
+    outbox_id        BIGSERIAL PRIMARY KEY,
+    transaction_id   INT NOT NULL,
+    account_id       INT NOT NULL,
+    transaction_time TIMESTAMP NOT NULL,
+    queued_at        TIMESTAMP NOT NULL DEFAULT clock_timestamp()
+);
+
+CREATE OR REPLACE FUNCTION queue_fraud_detection()
+RETURNS TRIGGER AS $$
+BEGIN
+    INSERT INTO FraudOutbox (transaction_id, account_id, transaction_time)
+    SELECT transaction_id, account_id, transaction_time
+    FROM new_transactions
+    ORDER BY transaction_time, transaction_id;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trigger_fraud_outbox
+AFTER INSERT ON Transactions
+REFERENCING NEW TABLE AS new_transactions
+FOR EACH STATEMENT
+EXECUTE FUNCTION queue_fraud_detection();
+
+ALTER TABLE Transactions DISABLE TRIGGER trigger_fraud_outbox;
+
+-- The mode is which of the two triggers is enabled.
+CREATE OR REPLACE FUNCTION fraud_detection_mode()
+RETURNS TEXT AS $$
+    SELECT CASE WHEN tgenabled = 'D' THEN 'sync' ELSE 'async' END
+    FROM pg_trigger
+    WHERE tgrelid = 'transactions'::regclass AND tgname = 'trigger_fraud_outbox';
+$$ LANGUAGE sql STABLE;
+
+CREATE OR REPLACE FUNCTION set_fraud_detection_mode(p_mode TEXT)
+RETURNS TEXT AS $$
+BEGIN
+    IF p_mode = 'async' THEN
+        ALTER TABLE Transactions ENABLE TRIGGER trigger_fraud_outbox;
+        ALTER TABLE Transactions DISABLE TRIGGER trigger_detect_fraud;
+    ELSIF p_mode = 'sync' THEN
+        ALTER TABLE Transactions ENABLE TRIGGER trigger_detect_fraud;
+        ALTER TABLE Transactions DISABLE TRIGGER trigger_fraud_outbox;
+    ELSE
+        RAISE EXCEPTION 'unknown fraud detection mode %', p_mode;
+    END IF;
+    RETURN p_mode;
+END;
+$$ LANGUAGE plpgsql;
+
+COMMIT;
@@ -0,0 +1,37 @@
+-- NOTIFY fraud_logs with the ids of TransactionLogs rows inserted, updated
+-- or deleted, for the admin event stream (events.py). One notification
+-- per statement and per 500 ids, which keeps the payload well under the
+-- 8000-byte limit; listeners re-read the rows themselves. Notifications
+-- are delivered on commit, and only if the transaction commits.
+BEGIN;
+
+CREATE OR REPLACE FUNCTION notify_fraud_logs()
+RETURNS TRIGGER AS $$
+DECLARE
+    ids INT[];
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        SELECT array_agg(log_id ORDER BY log_id) INTO ids FROM old_rows;
+    ELSE
+        SELECT array_agg(log_id ORDER BY log_id) INTO ids FROM new_rows;
+    END IF;
+    FOR i IN 1 .. coalesce(cardinality(ids), 0) BY 500 LOOP
+        PERFORM pg_notify('fraud_logs', array_to_json(ids[i : i + 499])::text);
+    END LOOP;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER notify_fraud_logs_ins AFTER INSERT ON TransactionLogs
+REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION notify_fraud_logs();
+
+CREATE TRIGGER notify_fraud_logs_upd AFTER UPDATE ON TransactionLogs
+REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION notify_fraud_logs();
+
+CREATE TRIGGER notify_fraud_logs_del AFTER DELETE ON TransactionLogs
+REFERENCING OLD TABLE AS old_rows
+FOR EACH STATEMENT EXECUTE FUNCTION notify_fraud_logs();
+
+COMMIT;
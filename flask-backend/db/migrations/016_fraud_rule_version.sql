@@ -0,0 +1,30 @@
+-- A version number for the rule set, bumped by every statement that
+-- changes FraudRules and announced on the fraud_rules channel when it
+-- commits. Processes cache the active rules against it (rule_cache.py)
+-- and GET /api/admin/fraud-rules derives its ETag from it. Rule writes
+-- already serialize on the compile lock (db/migrations/006), so the
+-- single row adds no contention.
+BEGIN;
+
+CREATE TABLE FraudRuleVersion (
+    singleton BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (singleton),
+    version   BIGINT NOT NULL
+);
+INSERT INTO FraudRuleVersion (version) VALUES (1);
+
+CREATE OR REPLACE FUNCTION bump_fraud_rule_version()
+RETURNS TRIGGER AS $$
+DECLARE
+    v BIGINT;
+BEGIN
+    UPDATE FraudRuleVersion SET version = version + 1 RETURNING version INTO v;
+    PERFORM pg_notify('fraud_rules', v::text);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER fraud_rules_version
+AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON FraudRules
+FOR EACH STATEMENT EXECUTE FUNCTION bump_fraud_rule_version();
+
+COMMIT;
@@ -0,0 +1,55 @@
+-- Stop materializing the SYS-CASH balance (db/migrations/013). Every
+-- deposit and withdrawal posts its second leg against SYS-CASH, so its
+-- ledger_shard_count() AccountBalances rows were updated, and held locked
+-- to commit, by every such transaction in the bank: deposits to different
+-- accounts queued on each other again.
+--
+-- post_journal() now folds only customer accounts into AccountBalances.
+-- Journals balance, so the SYS-CASH balance is the negated sum of all
+-- other balances; account_balance() derives it that way, and
+-- `flask --app app ledger-rollup` refreshes its Accounts.balance snapshot.
+-- Its postings are still appended to LedgerPostings as before.
+BEGIN;
+
+CREATE OR REPLACE FUNCTION post_journal(
+    p_accounts INT[], p_amounts NUMERIC[], p_transactions INT[])
+RETURNS BIGINT AS $$
+DECLARE
+    journal BIGINT := nextval('ledger_journal_seq');
+    cash    INT := cash_account_id();
+BEGIN
+    IF (SELECT SUM(m) FROM unnest(p_amounts) AS m) IS DISTINCT FROM 0 THEN
+        RAISE EXCEPTION 'Unbalanced journal: postings sum to %',
+            (SELECT SUM(m) FROM unnest(p_amounts) AS m);
+    END IF;
+
+    INSERT INTO LedgerPostings (journal_id, account_id, amount, transaction_id)
+    SELECT journal, p.account_id, p.amount, p.transaction_id
+    FROM unnest(p_accounts, p_amounts, p_transactions) AS p(account_id, amount, transaction_id);
+
+    -- Accounts in id order, so concurrent journals lock shard rows in a
+    -- consistent order.
+    INSERT INTO AccountBalances AS b (account_id, shard, balance)
+    SELECT p.account_id, floor(random() * ledger_shard_count()), SUM(p.amount)
+    FROM unnest(p_accounts, p_amounts) AS p(account_id, amount)
+    WHERE p.account_id IS DISTINCT FROM cash
+    GROUP BY p.account_id
+    ORDER BY p.account_id
+    ON CONFLICT (account_id, shard) DO UPDATE SET balance = b.balance + EXCLUDED.balance;
+
+    RETURN journal;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION account_balance(p_account_id INT)
+RETURNS NUMERIC AS $$
+    SELECT CASE WHEN p_account_id = cash_account_id()
+                THEN -COALESCE((SELECT SUM(balance) FROM AccountBalances), 0)
+                ELSE COALESCE((SELECT SUM(balance) FROM AccountBalances
+                               WHERE account_id = p_account_id), 0)
+           END;
+$$ LANGUAGE sql STABLE;
+
+DELETE FROM AccountBalances WHERE account_id = cash_account_id();
+
+COMMIT;
@@ -0,0 +1,63 @@
+-- Give Transactions a DEFAULT partition (db/migrations/009).
+--
+-- Partitions only exist up to where `flask --app app partitions-maintain`
+-- last created them (3 months ahead by default). Once NOW() passes that
+-- horizon, every deposit, withdrawal and transfer failed with "no partition
+-- of relation found for row". Rows for a month without a partition now land
+-- in transactions_default instead.
+--
+-- The default partition is a safety net, not the plan: partitions-maintain
+-- must still run on a schedule, e.g. daily from cron:
+--   15 3 * * *  cd /srv/flask-backend && flask --app app partitions-maintain
+-- Creating a month's partition scans transactions_default under an ACCESS
+-- EXCLUSIVE lock, and create_transaction_partitions() now moves that
+-- month's rows out of it first, so the longer the schedule lapses the more
+-- that catch-up costs. partitions-maintain also creates the months of any
+-- rows already in the default partition.
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS transactions_default PARTITION OF Transactions DEFAULT;
+
+CREATE OR REPLACE FUNCTION create_transaction_partitions(from_ts TIMESTAMP, to_ts TIMESTAMP)
+RETURNS INT AS $$
+DECLARE
+    month   TIMESTAMP := date_trunc('month', from_ts);
+    created INT := 0;
+    part    TEXT;
+BEGIN
+    IF from_ts IS NULL OR to_ts IS NULL THEN
+        RETURN 0;
+    END IF;
+    WHILE month <= to_ts LOOP
+        part := format('transactions_y%sm%s', to_char(month, 'YYYY'), to_char(month, 'MM'));
+        IF to_regclass(part) IS NULL THEN
+            IF EXISTS (SELECT 1 FROM transactions_default
+                       WHERE transaction_time >= month
+                         AND transaction_time < month + INTERVAL '1 month') THEN
+                -- The month's rows must leave the default partition before
+                -- its own partition can cover them. Statements on the
+                -- partitions do not fire the root's triggers, so fraud logs
+                -- and counters are untouched.
+                EXECUTE format('CREATE TABLE %I (LIKE Transactions INCLUDING DEFAULTS)', part);
+                EXECUTE format(
+                    'WITH moved AS (DELETE FROM transactions_default'
+                    ' WHERE transaction_time >= %L AND transaction_time < %L RETURNING *)'
+                    ' INSERT INTO %I SELECT * FROM moved',
+                    month, month + INTERVAL '1 month', part);
+                EXECUTE format(
+                    'ALTER TABLE Transactions ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)',
+                    part, month, month + INTERVAL '1 month');
+            ELSE
+                EXECUTE format(
+                    'CREATE TABLE %I PARTITION OF Transactions FOR VALUES FROM (%L) TO (%L)',
+                    part, month, month + INTERVAL '1 month');
+            END IF;
+            created := created + 1;
+        END IF;
+        month := month + INTERVAL '1 month';
+    END LOOP;
+    RETURN created;
+END;
+$$ LANGUAGE plpgsql;
+
+COMMIT;
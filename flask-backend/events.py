@@ -0,0 +1,228 @@
+# Postgres notifications for the process: one shared LISTEN connection,
+# the push of TransactionLogs changes to admin dashboards
+# (db/migrations/015) and, through rule_cache.py, rule set invalidation.
+import json
+import os
+import queue
+import select
+import threading
+import time
+
+import psycopg2
+import psycopg2.extensions
+from psycopg2.extras import RealDictCursor
+
+import config
+
+
+class Listener:
+    """A thread holding the process's LISTEN connection. Each channel has
+    a handler, called on the listener thread with the connection and the
+    payloads that arrived together, and a reset callback, called whenever
+    the channel starts being listened to (first connect, reconnects):
+    notifications sent before that point are lost."""
+
+    def __init__(self, dsn, poll_interval=1.0, log=print):
+        self.dsn = dsn
+        self.poll_interval = poll_interval   # also how soon new channels are picked up
+        self.log = log
+        self._cond = threading.Condition()
+        self._channels = {}    # channel -> (on_notify, on_reset)
+        self._active = set()   # channels LISTENed to on the current connection
+        self._thread = None
+
+    def register(self, channel, on_notify, on_reset):
+        with self._cond:
+            self._channels[channel] = (on_notify, on_reset)
+
+    def listening(self, channel):
+        with self._cond:
+            return channel in self._active
+
+    def start(self, channel, timeout=5.0):
+        """Start the thread if needed and wait until it listens on
+        channel. Returns whether it does."""
+        with self._cond:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="pg-listener",
+                                                daemon=True)
+                self._thread.start()
+            return self._cond.wait_for(lambda: channel in self._active, timeout)
+
+    def _listen_new(self, conn):
+        with self._cond:
+            channels = dict(self._channels)
+            new = [c for c in channels if c not in self._active]
+        for channel in new:
+            with conn.cursor() as cur:
+                cur.execute(f"LISTEN {channel};")
+            channels[channel][1]()
+            with self._cond:
+                self._active.add(channel)
+                self._cond.notify_all()
+        return channels
+
+    def _run(self):
+        while True:
+            conn = None
+            try:
+                conn = psycopg2.connect(self.dsn, cursor_factory=RealDictCursor)
+                conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+                while True:
+                    channels = self._listen_new(conn)
+                    if select.select([conn], [], [], self.poll_interval) == ([], [], []):
+                        continue
+                    conn.poll()
+                    payloads = {}
+                    while conn.notifies:
+                        n = conn.notifies.pop(0)
+                        payloads.setdefault(n.channel, []).append(n.payload)
+                    for channel, batch in payloads.items():
+                        channels[channel][0](conn, batch)
+            except psycopg2.Error as err:
+                self.log(f"listener: {err}")
+                time.sleep(1.0)
+            finally:
+                with self._cond:
+                    self._active.clear()
+                if conn is not None:
+                    conn.close()
+
+
+# ─── PROCESS-WIDE LISTENER ───────────────────────────────────────────────────
+_listener = None
+_listener_pid = None
+_listener_lock = threading.Lock()
+
+def get_listener():
+    # Like the pool (db.py), rebuilt lazily after fork().
+    global _listener, _listener_pid
+    if _listener is None or _listener_pid != os.getpid():
+        with _listener_lock:
+            if _listener is None or _listener_pid != os.getpid():
+                _listener = Listener(config.DATABASE_URL)
+                _listener_pid = os.getpid()
+    return _listener
+
+
+# ─── FRAUD LOG EVENTS ────────────────────────────────────────────────────────
+CHANNEL = "fraud_logs"
+
+# Columns as in GET /api/admin/fraud-logs.
+CHANGED_LOGS_QUERY = """
+  SELECT
+    f.log_id,
+    f.transaction_id,
+    t.account_id,
+    f.detected_rule,
+    f.status,
+    f.created_at,
+    t.amount,
+    t.transaction_time
+  FROM TransactionLogs f
+  LEFT JOIN Transactions t
+    ON f.transaction_id = t.transaction_id
+  WHERE f.log_id = ANY(%s);
+"""
+
+RESYNC = ("resync", "{}")
+
+
+class TooManySubscribers(Exception):
+    pass
+
+
+class Subscriber:
+    """One client's event queue. When it is full the queued deltas are
+    replaced by a single resync event: a slow client holds at most `size`
+    events and reloads the full list once it catches up, and the listener
+    never waits on it."""
+
+    def __init__(self, size):
+        self._queue = queue.Queue(maxsize=size)
+        self.dropped = 0
+
+    def put(self, event):
+        # Only the listener thread puts, so nothing refills the queue
+        # between draining it and queueing the resync.
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            while True:
+                try:
+                    self._queue.get_nowait()
+                    self.dropped += 1
+                except queue.Empty:
+                    break
+            self._queue.put_nowait(RESYNC)
+
+    def get(self, timeout):
+        """Next (event, data) pair, or None after timeout seconds."""
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class FraudLogEvents:
+    """Fan-out of fraud_logs notifications. Each event is (name, JSON text):
+
+      resync  the client must reload the list (sent first on subscribe,
+              after reconnects, overflows and oversized changes)
+      delta   {"rows": [...], "removed": [log_id, ...]}: current state of
+              changed logs, and ids of deleted ones
+    """
+
+    def __init__(self, listener, buffer_size=256, max_clients=100, max_delta=1000,
+                 dumps=json.dumps):
+        self.listener = listener
+        self.buffer_size = buffer_size
+        self.max_clients = max_clients
+        self.max_delta = max_delta
+        self.dumps = dumps
+        self._lock = threading.Lock()
+        self._subscribers = set()
+        listener.register(CHANNEL, self._on_notify, lambda: self._publish(RESYNC))
+
+    def subscribe(self):
+        # The client reloads on this first resync, which it can only read
+        # after subscribe() returns: whatever commits before the reload is
+        # in it, and anything later arrives as a delta.
+        sub = Subscriber(self.buffer_size)
+        sub.put(RESYNC)
+        # Check and add under one lock, so concurrent subscribers cannot all
+        # pass the check and overshoot max_clients.
+        with self._lock:
+            if len(self._subscribers) >= self.max_clients:
+                raise TooManySubscribers(self.max_clients)
+            self._subscribers.add(sub)
+        try:
+            self.listener.start(CHANNEL)
+        except Exception:
+            self.unsubscribe(sub)
+            raise
+        return sub
+
+    def unsubscribe(self, sub):
+        with self._lock:
+            self._subscribers.discard(sub)
+
+    def _publish(self, event):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for sub in subscribers:
+            sub.put(event)
+
+    def _on_notify(self, conn, payloads):
+        # Notifications that piled up are coalesced into one read.
+        ids = set()
+        for payload in payloads:
+            ids.update(json.loads(payload))
+        if len(ids) > self.max_delta:
+            self._publish(RESYNC)
+            return
+        with conn.cursor() as cur:
+            cur.execute(CHANGED_LOGS_QUERY, (sorted(ids),))
+            rows = cur.fetchall()
+        removed = ids - {r["log_id"] for r in rows}
+        self._publish(("delta", self.dumps({"rows": rows, "removed": sorted(removed)})))
@@ -0,0 +1,131 @@
+# Batch triage of fraud incidents: a list of operations on TransactionLogs
+# rows, each naming one log or every pending log of an account, applied in
+# one transaction with a fixed number of set-based statements.
+LOG_ACTIONS = {"resolved"}                               # log status only
+ACCOUNT_ACTIONS = {"active", "blocked", "restricted", "limited"}  # log and account status
+ACTIONS = LOG_ACTIONS | ACCOUNT_ACTIONS
+
+
+def clean_operation(op):
+    """Validate one operation and return (log_id, account_id, action), with
+    exactly one of the ids set; raises ValueError with a message for the
+    per-item result."""
+    if not isinstance(op, dict):
+        raise ValueError("expected an object")
+    action = op.get("action")
+    if action not in ACTIONS:
+        raise ValueError(f"action must be one of {', '.join(sorted(ACTIONS))}")
+    log_id, account_id = op.get("log_id"), op.get("account_id")
+    if (log_id is None) == (account_id is None):
+        raise ValueError("expected exactly one of log_id, account_id")
+    target = log_id if account_id is None else account_id
+    if isinstance(target, bool) or not isinstance(target, int) or target < 1:
+        raise ValueError("ids must be positive integers")
+    return log_id, account_id, action
+
+def apply_actions(cur, operations):
+    """Apply the operations in the caller's transaction and return one
+    result per operation, in order:
+
+      {"ok": true, "account_id": ..., "logs": n}   the operation matched n logs
+      {"ok": false, "error": "..."}                invalid, or no such log/account
+
+    A log operation sets the log's status to the action and, for account
+    actions, the status of the log's account; an account operation does the
+    same for every pending log of the account. Where operations overlap,
+    the later one wins."""
+    results = [None] * len(operations)
+    ops = []   # (index, log_id, account_id, action)
+    for i, op in enumerate(operations):
+        try:
+            ops.append((i, *clean_operation(op)))
+        except ValueError as err:
+            results[i] = {"ok": False, "error": str(err)}
+
+    by_log = [o for o in ops if o[1] is not None]
+    by_account = [o for o in ops if o[2] is not None]
+    targets = {}   # index -> [(log_id, account_id), ...]
+    if by_log:
+        cur.execute(
+          """
+          SELECT o.idx, f.log_id, t.account_id
+          FROM unnest(%s::int[], %s::int[]) AS o(idx, log_id)
+          JOIN TransactionLogs f ON f.log_id = o.log_id
+          LEFT JOIN Transactions t ON t.transaction_id = f.transaction_id;
+          """,
+          ([o[0] for o in by_log], [o[1] for o in by_log])
+        )
+        for row in cur.fetchall():
+            targets.setdefault(row["idx"], []).append((row["log_id"], row["account_id"]))
+    if by_account:
+        cur.execute(
+          """
+          SELECT o.idx, f.log_id, t.account_id
+          FROM unnest(%s::int[], %s::int[]) AS o(idx, account_id)
+          JOIN Transactions t ON t.account_id = o.account_id
+          JOIN TransactionLogs f ON f.transaction_id = t.transaction_id
+          WHERE f.status = 'pending';
+          """,
+          ([o[0] for o in by_account], [o[2] for o in by_account])
+        )
+        for row in cur.fetchall():
+            targets.setdefault(row["idx"], []).append((row["log_id"], row["account_id"]))
+
+    # Later operations overwrite earlier ones.
+    log_status, account_status = {}, {}
+    for idx, log_id, account_id, action in ops:
+        for target_log, target_account in targets.get(idx, ()):
+            log_status[target_log] = action
+            if action in ACCOUNT_ACTIONS and target_account is not None:
+                account_status[target_account] = action
+        if account_id is not None and action in ACCOUNT_ACTIONS:
+            account_status[account_id] = action
+
+    # Accounts row before DashboardCounters shard, like every other writer
+    # (db/migrations/013): lock the accounts in account_id order before the
+    # TransactionLogs update bumps fraud_incidents. Operations on an
+    # account without pending logs still need it to exist.
+    lock = sorted(set(account_status) | {o[2] for o in by_account})
+    existing = set()
+    if lock:
+        cur.execute(
+            "SELECT account_id FROM Accounts WHERE account_id = ANY(%s)"
+            " ORDER BY account_id FOR NO KEY UPDATE;", (lock,)
+        )
+        existing = {r["account_id"] for r in cur.fetchall()}
+    if account_status:
+        cur.execute(
+          """
+          UPDATE Accounts a
+          SET account_status = u.status
+          FROM unnest(%s::int[], %s::varchar[]) AS u(account_id, status)
+          WHERE a.account_id = u.account_id
+            AND a.account_status IS DISTINCT FROM u.status;
+          """,
+          (list(account_status), list(account_status.values()))
+        )
+    if log_status:
+        cur.execute(
+          """
+          UPDATE TransactionLogs f
+          SET status = u.status
+          FROM unnest(%s::int[], %s::varchar[]) AS u(log_id, status)
+          WHERE f.log_id = u.log_id
+            AND f.status IS DISTINCT FROM u.status;
+          """,
+          (list(log_status), list(log_status.values()))
+        )
+
+    for idx, log_id, account_id, action in ops:
+        found = targets.get(idx, [])
+        if log_id is not None and not found:
+            results[idx] = {"ok": False, "error": f"log {log_id} not found"}
+        elif account_id is not None and account_id not in existing:
+            results[idx] = {"ok": False, "error": f"account {account_id} not found"}
+        else:
+            results[idx] = {
+                "ok":         True,
+                "account_id": account_id if account_id is not None else found[0][1],
+                "logs":       len(found),
+            }
+    return results
@@ -0,0 +1,292 @@
+# Bulk transaction ingestion. Each chunk is COPY'd into a temp staging table
+# and moved into Transactions with one INSERT ... SELECT, so the statement
+# level fraud trigger evaluates the whole chunk set-wise.
+#
+# Ingested rows are money movements like any other: each gets its ledger
+# journal (db/migrations/013) in the same transaction, deposits and
+# withdrawals against SYS-CASH and a transfer_out together with the
+# transfer_in that must follow it. Like a backfill, ingestion records what
+# happened and does not check funds.
+#
+# transaction_time must fall between the start of the retained partitions
+# and a small margin past now, so a stray timestamp cannot make the chunk
+# create partitions for arbitrary months (db/migrations/009).
+import csv
+import io
+import json
+import time
+from datetime import datetime
+from decimal import ROUND_HALF_UP, Decimal, InvalidOperation
+
+from queries import INGEST_DETECTIONS
+
+TRANSACTION_TYPES = {"deposit", "withdrawal", "transfer_in", "transfer_out"}
+COLUMNS = ("account_id", "transaction_type", "amount", "transaction_time", "details")
+CENT = Decimal("0.01")
+MAX_AMOUNT = Decimal("9999999999999.99")  # NUMERIC(15, 2)
+MAX_ID = 2**31 - 1                         # INT
+
+
+def read_records(lines, fmt):
+    """Yield (line_no, record_or_None, error_or_None) from CSV (with a
+    header row) or NDJSON text lines."""
+    if fmt == "csv":
+        reader = csv.DictReader(lines)
+        for record in reader:
+            yield reader.line_num, record, None
+    elif fmt == "ndjson":
+        for line_no, line in enumerate(lines, 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError as err:
+                yield line_no, None, f"invalid JSON: {err}"
+                continue
+            if not isinstance(record, dict):
+                yield line_no, None, "expected a JSON object"
+                continue
+            yield line_no, record, None
+    else:
+        raise ValueError(f"unknown format {fmt!r}; expected csv or ndjson")
+
+def clean_record(record, window=None):
+    """Validate one record and return the staged column tuple; raises
+    ValueError with a message for the reject report. `window` is the
+    (earliest, latest) transaction_time accepted."""
+    # A value the INT column cannot hold would fail the chunk's COPY. JSON
+    # floats and booleans are not ids even though int() takes them.
+    account_id = record.get("account_id")
+    try:
+        if isinstance(account_id, (bool, float)):
+            raise ValueError
+        account_id = int(account_id)
+    except (TypeError, ValueError):
+        raise ValueError("account_id must be an integer")
+    if not 1 <= account_id <= MAX_ID:
+        raise ValueError(f"account_id must be between 1 and {MAX_ID}")
+    ttype = record.get("transaction_type")
+    if ttype not in TRANSACTION_TYPES:
+        raise ValueError(f"transaction_type must be one of {sorted(TRANSACTION_TYPES)}")
+    try:
+        amount = Decimal(str(record.get("amount")))
+    except InvalidOperation:
+        raise ValueError("amount must be a number")
+    # Checked after rounding to cents as PostgreSQL does (half away from
+    # zero): 0.004 would be stored as a zero posting, 9999999999999.999
+    # would overflow the column.
+    try:
+        amount = amount.quantize(CENT, rounding=ROUND_HALF_UP)
+    except InvalidOperation:
+        amount = None
+    if amount is None or not amount.is_finite() or not CENT <= amount <= MAX_AMOUNT:
+        raise ValueError(f"amount must be between {CENT} and {MAX_AMOUNT}")
+    ts = record.get("transaction_time") or None
+    if ts is not None:
+        try:
+            parsed = datetime.fromisoformat(ts)
+        except (TypeError, ValueError):
+            raise ValueError("transaction_time must be an ISO 8601 timestamp")
+        # The column is TIMESTAMP: PostgreSQL ignores any offset, so must we.
+        parsed = parsed.replace(tzinfo=None)
+        if window is not None and not window[0] <= parsed <= window[1]:
+            raise ValueError(f"transaction_time must be between {window[0]:%Y-%m-%d %H:%M} "
+                             f"and {window[1]:%Y-%m-%d %H:%M}")
+        ts = parsed.isoformat()
+    details = record.get("details") or None
+    return account_id, ttype, amount, ts, details
+
+def _copy_value(value):
+    if value is None:
+        return r"\N"
+    return (str(value).replace("\\", "\\\\").replace("\t", "\\t")
+            .replace("\n", "\\n").replace("\r", "\\r"))
+
+def _load_chunk(conn, chunk, report, max_rejects):
+    buf = io.StringIO()
+    for line_no, pair_no, values in chunk:
+        buf.write("\t".join(_copy_value(v) for v in (line_no, pair_no) + values) + "\n")
+    buf.seek(0)
+
+    with conn.cursor() as cur:
+        cur.execute(
+          """
+          CREATE TEMP TABLE IF NOT EXISTS ingest_staging (
+            line_no          INT,
+            pair_no          INT,
+            transaction_id   INT DEFAULT nextval('transactions_transaction_id_seq'),
+            account_id       INT,
+            transaction_type VARCHAR(50),
+            amount           NUMERIC(15, 2),
+            transaction_time TIMESTAMP,
+            details          TEXT
+          ) ON COMMIT DELETE ROWS;
+          """
+        )
+        cur.copy_expert(
+            "COPY ingest_staging (line_no, pair_no, %s) FROM STDIN" % ", ".join(COLUMNS), buf
+        )
+        # A transfer leg is only posted together with its counterpart, so an
+        # unknown account rejects the whole pair.
+        cur.execute(
+          """
+          DELETE FROM ingest_staging s
+          WHERE s.pair_no IN (
+            SELECT x.pair_no FROM ingest_staging x
+            WHERE NOT EXISTS (SELECT 1 FROM Accounts a WHERE a.account_id = x.account_id))
+          RETURNING s.line_no,
+                    EXISTS (SELECT 1 FROM Accounts a WHERE a.account_id = s.account_id) AS known;
+          """
+        )
+        for row in sorted(cur.fetchall(), key=lambda r: r["line_no"]):
+            _reject(report, row["line_no"],
+                    "transfer counterpart rejected" if row["known"] else "unknown account_id",
+                    max_rejects)
+
+        # Backdated or future-dated rows may need a month that has no
+        # partition yet (db/migrations/009).
+        cur.execute(
+          """
+          SELECT create_transaction_partitions(MIN(transaction_time), MAX(transaction_time))
+          FROM ingest_staging;
+          """
+        )
+        cur.execute(
+          """
+          INSERT INTO Transactions
+            (transaction_id, account_id, transaction_type, amount, transaction_time, details)
+          SELECT s.transaction_id, s.account_id, s.transaction_type, s.amount,
+                 COALESCE(s.transaction_time, NOW()), s.details
+          FROM ingest_staging s
+          ORDER BY s.line_no
+          RETURNING transaction_id;
+          """
+        )
+        ids = [row["transaction_id"] for row in cur.fetchall()]
+
+        # One journal per deposit, withdrawal or transfer pair; the SYS-CASH
+        # leg is appended but not folded into AccountBalances
+        # (db/migrations/017).
+        cur.execute(
+          """
+          INSERT INTO LedgerPostings (journal_id, account_id, amount, transaction_id, posted_at)
+          SELECT j.journal_id, p.account_id, p.amount, s.transaction_id,
+                 COALESCE(s.transaction_time, NOW())
+          FROM ingest_staging s
+          JOIN (SELECT pair_no, nextval('ledger_journal_seq') AS journal_id
+                FROM ingest_staging GROUP BY pair_no) j ON j.pair_no = s.pair_no
+          CROSS JOIN LATERAL (VALUES
+            (s.account_id,
+             CASE WHEN s.transaction_type IN ('deposit', 'transfer_in')
+                  THEN s.amount ELSE -s.amount END),
+            (cash_account_id(),
+             CASE s.transaction_type WHEN 'deposit' THEN -s.amount
+                                     WHEN 'withdrawal' THEN s.amount END)
+          ) AS p(account_id, amount)
+          WHERE p.amount IS NOT NULL
+          ORDER BY s.line_no;
+          """
+        )
+        cur.execute(
+          """
+          INSERT INTO AccountBalances AS b (account_id, shard, balance)
+          SELECT s.account_id, floor(random() * ledger_shard_count()),
+                 SUM(CASE WHEN s.transaction_type IN ('deposit', 'transfer_in')
+                          THEN s.amount ELSE -s.amount END)
+          FROM ingest_staging s
+          WHERE s.account_id <> cash_account_id()
+          GROUP BY s.account_id
+          ORDER BY s.account_id
+          ON CONFLICT (account_id, shard) DO UPDATE SET balance = b.balance + EXCLUDED.balance;
+          """
+        )
+
+        cur.execute(INGEST_DETECTIONS, {"ids": ids})
+        report["detections"] += cur.fetchone()["n"]
+    conn.commit()
+    report["inserted"] += len(ids)
+
+def _reject(report, line_no, error, max_rejects):
+    report["rejected"] += 1
+    if len(report["rejects"]) < max_rejects:
+        report["rejects"].append({"line": line_no, "error": error})
+
+def _completes(out, values):
+    """Whether `values` is the transfer_in leg matching transfer_out `out`."""
+    return (values[1] == "transfer_in" and values[0] != out[0]
+            and values[2] == out[2] and values[3] == out[3])
+
+def ingest_window(conn, keep_months, future_days):
+    """(earliest, latest) transaction_time accepted: the first retained
+    month, as partitions-archive counts it, to `future_days` past now."""
+    with conn.cursor() as cur:
+        cur.execute(
+          """
+          SELECT date_trunc('month', NOW()::timestamp) - make_interval(months => %s) AS earliest,
+                 NOW()::timestamp + make_interval(days => %s) AS latest;
+          """,
+          (keep_months, future_days)
+        )
+        row = cur.fetchone()
+    conn.commit()
+    return row["earliest"], row["latest"]
+
+def ingest(conn, lines, fmt, chunk_size=10000, max_rejects=100, keep_months=24, future_days=1):
+    """Stream records into Transactions in committed chunks of `chunk_size`.
+
+    A transfer_out must be immediately followed by its transfer_in (another
+    account, same amount and transaction_time); the two legs share a journal
+    and a chunk, and an unpaired leg is rejected.
+
+    Rows whose transaction_time falls outside ingest_window() are rejected.
+
+    Returns a report with row, insert, reject and detection counts and the
+    throughput. Chunks already committed stay committed if a later one fails.
+    """
+    report = {"rows": 0, "inserted": 0, "rejected": 0, "detections": 0,
+              "chunks": 0, "rejects": []}
+    started = time.perf_counter()
+    window = ingest_window(conn, keep_months, future_days)
+    chunk = []
+    pending = None  # (line_no, values) of a transfer_out awaiting its transfer_in
+    for line_no, record, error in read_records(lines, fmt):
+        report["rows"] += 1
+        values = None
+        if error is None:
+            try:
+                values = clean_record(record, window)
+            except ValueError as err:
+                error = str(err)
+        if pending is not None:
+            if values is not None and _completes(pending[1], values):
+                chunk.append((pending[0], pending[0], pending[1]))
+                chunk.append((line_no, pending[0], values))
+                pending = None
+                values = None
+            else:
+                _reject(report, pending[0],
+                        "transfer_out must be followed by its transfer_in", max_rejects)
+                pending = None
+        if error is not None:
+            _reject(report, line_no, error, max_rejects)
+        elif values is not None:
+            if values[1] == "transfer_out":
+                pending = (line_no, values)
+            elif values[1] == "transfer_in":
+                _reject(report, line_no, "transfer_in must follow its transfer_out", max_rejects)
+            else:
+                chunk.append((line_no, line_no, values))
+        if len(chunk) >= chunk_size:
+            _load_chunk(conn, chunk, report, max_rejects)
+            report["chunks"] += 1
+            chunk = []
+    if pending is not None:
+        _reject(report, pending[0], "transfer_out must be followed by its transfer_in", max_rejects)
+    if chunk:
+        _load_chunk(conn, chunk, report, max_rejects)
+        report["chunks"] += 1
+
+    elapsed = time.perf_counter() - started
+    report["seconds"] = round(elapsed, 3)
+    report["rows_per_sec"] = round(report["rows"] / elapsed, 1) if elapsed else 0.0
+    return report
@@ -0,0 +1,86 @@
+# Upkeep of the ledger (db/migrations/013, 017): the Accounts.balance snapshot
+# and integrity checks of the materialized balance shards.
+from psycopg2.extensions import ISOLATION_LEVEL_REPEATABLE_READ
+
+from backfills import backfill_in_batches
+
+
+def rollup_balances(conn, chunk_size=1000, log=print):
+    """Copy each account's shard total into Accounts.balance, in committed
+    account_id batches, then SYS-CASH's derived balance (db/migrations/017).
+    Only rows whose snapshot changed are written, so a periodic run does
+    not touch idle accounts. Returns rows updated."""
+    updated = backfill_in_batches(
+        conn, "Accounts", "account_id",
+        """
+        UPDATE Accounts a
+        SET balance = s.balance
+        FROM (
+          SELECT account_id, SUM(balance) AS balance
+          FROM AccountBalances
+          WHERE account_id >= %(lo)s AND account_id < %(hi)s
+          GROUP BY account_id
+        ) s
+        WHERE a.account_id = s.account_id
+          AND a.balance IS DISTINCT FROM s.balance;
+        """,
+        chunk_size, log=log
+    )
+    with conn.cursor() as cur:
+        cur.execute(
+          """
+          UPDATE Accounts
+          SET balance = account_balance(account_id)
+          WHERE account_number = 'SYS-CASH'
+            AND balance IS DISTINCT FROM account_balance(account_id);
+          """
+        )
+        updated += cur.rowcount
+    conn.commit()
+    return updated
+
+def verify_ledger(conn, limit=100):
+    """Check that every journal balances and that the shards of every
+    account add up to its postings, from one REPEATABLE READ snapshot.
+
+    Returns {"unbalanced_journals": [...], "drift": [(account_id, shards,
+    postings), ...], "total": sum of all postings (always 0 when sound)}.
+    """
+    old_level = conn.isolation_level
+    conn.set_isolation_level(ISOLATION_LEVEL_REPEATABLE_READ)
+    try:
+        with conn.cursor() as cur:
+            cur.execute(
+              """
+              SELECT journal_id FROM LedgerPostings
+              GROUP BY journal_id HAVING SUM(amount) <> 0
+              ORDER BY journal_id LIMIT %s;
+              """,
+              (limit,)
+            )
+            unbalanced = [r["journal_id"] for r in cur.fetchall()]
+            cur.execute(
+              """
+              SELECT account_id,
+                     COALESCE(b.balance, 0) AS shards,
+                     COALESCE(p.balance, 0) AS postings
+              FROM (SELECT account_id, SUM(amount) AS balance
+                    FROM LedgerPostings GROUP BY account_id) p
+              FULL JOIN (SELECT account_id, SUM(balance) AS balance
+                         FROM AccountBalances GROUP BY account_id) b
+                USING (account_id)
+              WHERE COALESCE(b.balance, 0) <> COALESCE(p.balance, 0)
+                -- SYS-CASH has no shards (db/migrations/017); a zero total
+                -- below means its postings match its derived balance.
+                AND account_id <> cash_account_id()
+              ORDER BY account_id LIMIT %s;
+              """,
+              (limit,)
+            )
+            drift = [(r["account_id"], r["shards"], r["postings"]) for r in cur.fetchall()]
+            cur.execute("SELECT COALESCE(SUM(amount), 0) AS total FROM LedgerPostings;")
+            total = cur.fetchone()["total"]
+        conn.commit()
+    finally:
+        conn.set_isolation_level(old_level)
+    return {"unbalanced_journals": unbalanced, "drift": drift, "total": total}
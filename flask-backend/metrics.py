@@ -0,0 +1,180 @@
+# Per-endpoint request metrics in the Prometheus text format. Each thread
+# records into its own store, so a request takes no lock; a scrape merges
+# the stores. Database time and rows come from the pooled connections'
+# statement hooks (db.py); the rest of a request's time is Python time.
+import bisect
+import threading
+import time
+
+from flask import request
+
+from db import add_statement_hook
+
+# Seconds; the Prometheus client defaults.
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class _Series:
+    """Totals for one (endpoint, method)."""
+
+    __slots__ = ("buckets", "count", "seconds", "db_seconds", "statements", "rows", "statuses")
+
+    def __init__(self):
+        self.buckets = [0] * (len(BUCKETS) + 1)   # per bucket, not cumulative; last is +Inf
+        self.count = 0
+        self.seconds = 0.0
+        self.db_seconds = 0.0
+        self.statements = 0
+        self.rows = 0
+        self.statuses = {}
+
+    def merge(self, other):
+        for i, n in enumerate(list(other.buckets)):
+            self.buckets[i] += n
+        self.count += other.count
+        self.seconds += other.seconds
+        self.db_seconds += other.db_seconds
+        self.statements += other.statements
+        self.rows += other.rows
+        for status, n in list(other.statuses.items()):
+            self.statuses[status] = self.statuses.get(status, 0) + n
+
+
+class _Request:
+    __slots__ = ("started", "db_seconds", "statements", "rows")
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.db_seconds = 0.0
+        self.statements = 0
+        self.rows = 0
+
+
+class RequestMetrics:
+    def __init__(self):
+        self._local = threading.local()
+        self._lock = threading.Lock()    # registration and scrapes only
+        self._stores = []                # (thread, {(endpoint, method): _Series})
+        self._retired = {}               # folded in from threads that exited
+
+    def init_app(self, app):
+        app.before_request(self._before)
+        app.after_request(self._after)
+        add_statement_hook(self._on_statement)
+
+    # ── recording, on the request's thread ──
+    def _store(self):
+        store = getattr(self._local, "store", None)
+        if store is None:
+            store = self._local.store = {}
+            with self._lock:
+                self._stores.append((threading.current_thread(), store))
+        return store
+
+    def _before(self):
+        self._local.request = _Request()
+
+    def _on_statement(self, cursor, query, vars, seconds, rows):
+        req = getattr(self._local, "request", None)
+        if req is not None:
+            req.db_seconds += seconds
+            req.statements += 1
+            req.rows += rows
+
+    def _after(self, resp):
+        req = getattr(self._local, "request", None)
+        if req is None:
+            return resp
+        key = (request.endpoint or "unmatched", request.method)
+        status = resp.status_code
+        if resp.is_streamed:
+            # The body is produced after this point; the request ends when
+            # the server closes the response.
+            resp.call_on_close(lambda: self._finish(req, key, status))
+        else:
+            self._finish(req, key, status)
+        return resp
+
+    def _finish(self, req, key, status):
+        seconds = time.perf_counter() - req.started
+        if getattr(self._local, "request", None) is req:
+            self._local.request = None
+        store = self._store()
+        series = store.get(key)
+        if series is None:
+            series = store[key] = _Series()
+        series.buckets[bisect.bisect_left(BUCKETS, seconds)] += 1
+        series.count += 1
+        series.seconds += seconds
+        series.db_seconds += req.db_seconds
+        series.statements += req.statements
+        series.rows += req.rows
+        series.statuses[status] = series.statuses.get(status, 0) + 1
+
+    # ── scraping ──
+    def snapshot(self):
+        """Merged totals by (endpoint, method). Stores are read while their
+        threads keep writing, so a series may be one request behind."""
+        merged = {}
+        def fold(into, store):
+            for key, series in list(store.items()):
+                into.setdefault(key, _Series()).merge(series)
+        with self._lock:
+            alive = []
+            for thread, store in self._stores:
+                if thread.is_alive():
+                    alive.append((thread, store))
+                else:
+                    fold(self._retired, store)
+            self._stores = alive
+            fold(merged, self._retired)
+            for _, store in alive:
+                fold(merged, store)
+        return merged
+
+    def render(self):
+        merged = sorted(self.snapshot().items())
+        lines = []
+        def family(name, kind, help):
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        family("http_requests_total", "counter", "Requests by endpoint, method and status.")
+        for (endpoint, method), s in merged:
+            for status, n in sorted(s.statuses.items()):
+                lines.append(f"http_requests_total{_labels(endpoint, method, status=status)} {n}")
+
+        family("http_request_duration_seconds", "histogram", "Request latency, to the end of the body.")
+        for (endpoint, method), s in merged:
+            cumulative = 0
+            for bound, n in zip(BUCKETS + ("+Inf",), s.buckets):
+                cumulative += n
+                lines.append(f"http_request_duration_seconds_bucket"
+                             f"{_labels(endpoint, method, le=bound)} {cumulative}")
+            lines.append(f"http_request_duration_seconds_sum{_labels(endpoint, method)} {s.seconds:.6f}")
+            lines.append(f"http_request_duration_seconds_count{_labels(endpoint, method)} {s.count}")
+
+        totals = (
+            ("http_request_db_seconds_total", "Time spent in database statements.",
+             lambda s: f"{s.db_seconds:.6f}"),
+            ("http_request_python_seconds_total", "Request time outside database statements.",
+             lambda s: f"{max(s.seconds - s.db_seconds, 0.0):.6f}"),
+            ("http_request_db_statements_total", "Database round trips.",
+             lambda s: s.statements),
+            ("http_request_db_rows_total", "Rows returned by the database.",
+             lambda s: s.rows),
+        )
+        for name, help, value in totals:
+            family(name, "counter", help)
+            for (endpoint, method), s in merged:
+                lines.append(f"{name}{_labels(endpoint, method)} {value(s)}")
+        return "\n".join(lines) + "\n"
+
+
+def _labels(endpoint, method, **extra):
+    pairs = [("endpoint", endpoint), ("method", method)] + list(extra.items())
+    body = ",".join(f'{k}="{_escape(v)}"' for k, v in pairs)
+    return "{" + body + "}"
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
@@ -0,0 +1,288 @@
+# Forward-only schema migrations from db/migrations, recorded in the
+# schema_migrations table.
+#
+#   NNN_name.sql  statements are run one at a time in autocommit mode, so a
+#                 file either wraps itself in BEGIN/COMMIT (and is recorded
+#                 inside that transaction) or runs CONCURRENTLY builds
+#                 statement by statement (and must be safe to re-run).
+#   NNN_name.py   defines migrate(conn, log); for batched backfills that
+#                 commit as they go (see backfills.backfill_in_batches).
+#
+# Every session runs with a lock_timeout: a migration waiting on a lock
+# would otherwise queue every later query on that table behind it. On a
+# lock timeout the migration is retried with backoff.
+import hashlib
+import importlib.util
+import os
+import re
+import time
+
+import psycopg2
+from psycopg2 import errors, extensions
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "db", "migrations")
+FILENAME_RE = re.compile(r"^(\d{3})_(\w+)\.(sql|py)$")
+DOLLAR_QUOTE_RE = re.compile(r"\$(?:[A-Za-z_]\w*)?\$")
+
+
+class MigrationError(Exception):
+    pass
+
+
+def discover(directory=MIGRATIONS_DIR):
+    """Return [(version, name, path)] sorted by version."""
+    found = {}
+    for filename in sorted(os.listdir(directory)):
+        m = FILENAME_RE.match(filename)
+        if not m:
+            continue
+        version = int(m.group(1))
+        if version in found:
+            raise MigrationError(f"duplicate migration version {version:03d}")
+        found[version] = (version, filename, os.path.join(directory, filename))
+    return [found[v] for v in sorted(found)]
+
+def checksum(path):
+    with open(path, "rb") as f:
+        return hashlib.md5(f.read()).hexdigest()
+
+def split_statements(sql):
+    """Split a SQL script on top-level semicolons, skipping comments and
+    quoted / dollar-quoted text. Leading comments are dropped."""
+    statements, start, i, n = [], None, 0, len(sql)
+    while i < n:
+        c = sql[i]
+        if sql.startswith("--", i):
+            j = sql.find("\n", i)
+            i = n if j < 0 else j + 1
+            continue
+        if sql.startswith("/*", i):
+            j = sql.find("*/", i + 2)
+            i = n if j < 0 else j + 2
+            continue
+        if c.isspace():
+            i += 1
+            continue
+        if c == ";":
+            if start is not None:
+                statements.append(sql[start:i].strip())
+            start = None
+            i += 1
+            continue
+        if start is None:
+            start = i
+        if c in "'\"":
+            j = i + 1
+            while True:
+                j = sql.find(c, j)
+                if j < 0 or not sql.startswith(c * 2, j):
+                    break
+                j += 2
+            i = n if j < 0 else j + 1
+            continue
+        m = DOLLAR_QUOTE_RE.match(sql, i) if c == "$" else None
+        if m:
+            j = sql.find(m.group(0), m.end())
+            i = n if j < 0 else j + len(m.group(0))
+            continue
+        i += 1
+    if start is not None:
+        statements.append(sql[start:].strip())
+    return statements
+
+
+# ─── STATE ───────────────────────────────────────────────────────────────────
+def ensure_version_table(cur):
+    cur.execute(
+      """
+      CREATE TABLE IF NOT EXISTS schema_migrations (
+        version     INT PRIMARY KEY,
+        name        TEXT NOT NULL,
+        checksum    TEXT NOT NULL,
+        applied_at  TIMESTAMP NOT NULL DEFAULT NOW(),
+        duration_ms INT
+      );
+      """
+    )
+
+def applied_versions(cur):
+    cur.execute("SELECT version, name, checksum, applied_at FROM schema_migrations ORDER BY version;")
+    return {r["version"]: r for r in cur.fetchall()}
+
+def _record(cur, version, name, digest, duration_ms):
+    cur.execute(
+      """
+      INSERT INTO schema_migrations (version, name, checksum, duration_ms)
+      VALUES (%s, %s, %s, %s)
+      ON CONFLICT (version) DO NOTHING;
+      """,
+      (version, name, digest, duration_ms)
+    )
+
+def status(conn):
+    """Return [(version, name, state)] where state is applied, pending or
+    changed (applied, but the file differs from what was applied)."""
+    with conn.cursor() as cur:
+        ensure_version_table(cur)
+        applied = applied_versions(cur)
+    conn.commit()
+    rows = []
+    for version, name, path in discover():
+        if version not in applied:
+            state = "pending"
+        elif applied[version]["checksum"] != checksum(path):
+            state = "changed"
+        else:
+            state = "applied"
+        rows.append((version, name, state))
+    return rows
+
+
+# ─── APPLY ───────────────────────────────────────────────────────────────────
+def _invalid_indexes(cur):
+    """Schema-qualified names of INVALID indexes, as left by a failed
+    CREATE INDEX CONCURRENTLY."""
+    cur.execute(
+      """
+      SELECT format('%I.%I', n.nspname, c.relname) AS name
+      FROM pg_index i
+      JOIN pg_class c ON c.oid = i.indexrelid
+      JOIN pg_namespace n ON n.oid = c.relnamespace
+      WHERE NOT i.indisvalid
+      ORDER BY 1;
+      """
+    )
+    return [r["name"] for r in cur.fetchall()]
+
+def _drop_invalid_indexes(conn, log):
+    """Drop INVALID indexes so a retried CREATE INDEX CONCURRENTLY IF NOT
+    EXISTS builds them again instead of skipping them."""
+    conn.autocommit = True
+    try:
+        with conn.cursor() as cur:
+            for name in _invalid_indexes(cur):
+                log(f"dropping INVALID index {name}")
+                cur.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name};")
+    finally:
+        conn.autocommit = False
+
+def _apply_sql(conn, version, name, path, digest, started):
+    with open(path, encoding="utf-8") as f:
+        statements = split_statements(f.read())
+    upper = [s.upper() for s in statements]
+    # A BEGIN ... COMMIT file records itself inside its own transaction.
+    commit_at = None
+    if upper and upper[0] in ("BEGIN", "START TRANSACTION") and "COMMIT" in upper:
+        commit_at = len(upper) - 1 - upper[::-1].index("COMMIT")
+
+    conn.autocommit = True
+    with conn.cursor() as cur:
+        for i, statement in enumerate(statements):
+            if i == commit_at:
+                _record(cur, version, name, digest, int((time.perf_counter() - started) * 1000))
+            cur.execute(statement)
+        if commit_at is None:
+            # IF NOT EXISTS skips an INVALID index from an earlier failed
+            # build, so check before calling the file applied.
+            invalid = _invalid_indexes(cur)
+            if invalid:
+                raise MigrationError(f"{name}: INVALID indexes: {', '.join(invalid)}")
+            _record(cur, version, name, digest, int((time.perf_counter() - started) * 1000))
+
+def _apply_py(conn, version, name, path, digest, started, log):
+    spec = importlib.util.spec_from_file_location(f"migration_{version:03d}", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    conn.autocommit = False
+    module.migrate(conn, log)
+    with conn.cursor() as cur:
+        _record(cur, version, name, digest, int((time.perf_counter() - started) * 1000))
+    conn.commit()
+
+def _apply(conn, version, name, path, log):
+    digest = checksum(path)
+    started = time.perf_counter()
+    try:
+        if path.endswith(".py"):
+            _apply_py(conn, version, name, path, digest, started, log)
+        else:
+            _apply_sql(conn, version, name, path, digest, started)
+    except Exception:
+        # In autocommit mode the file's own BEGIN is invisible to psycopg2.
+        if conn.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+            if conn.autocommit:
+                with conn.cursor() as cur:
+                    cur.execute("ROLLBACK;")
+            else:
+                conn.rollback()
+        raise
+    finally:
+        conn.autocommit = False
+    return time.perf_counter() - started
+
+def migrate(conn, target=None, lock_timeout="5s", retries=5, log=print):
+    """Apply pending migrations up to `target` (all by default), in order.
+
+    Returns the list of versions applied. Migrations run one after another
+    under a session advisory lock, so concurrent deploys do not interleave.
+    """
+    applied_now = []
+    conn.autocommit = True
+    with conn.cursor() as cur:
+        cur.execute("SELECT pg_advisory_lock(hashtext('schema_migrations'));")
+        cur.execute("SELECT set_config('lock_timeout', %s, false);", (lock_timeout,))
+    conn.autocommit = False
+    try:
+        with conn.cursor() as cur:
+            ensure_version_table(cur)
+            applied = applied_versions(cur)
+        conn.commit()
+
+        for version, name, path in discover():
+            if version in applied or (target is not None and version > target):
+                continue
+            for attempt in range(retries + 1):
+                try:
+                    seconds = _apply(conn, version, name, path, log)
+                    break
+                except errors.LockNotAvailable:
+                    if attempt == retries:
+                        with conn.cursor() as cur:
+                            invalid = _invalid_indexes(cur)
+                        conn.rollback()
+                        hint = f" (INVALID indexes left behind: {', '.join(invalid)})" if invalid else ""
+                        raise MigrationError(
+                            f"{name}: lock_timeout ({lock_timeout}) hit {retries + 1} times{hint}")
+                    delay = min(2 ** attempt, 30)
+                    log(f"{name}: lock timeout, retrying in {delay}s")
+                    time.sleep(delay)
+                    try:
+                        _drop_invalid_indexes(conn, log)
+                    except errors.LockNotAvailable:
+                        pass   # the next attempt's check reports them
+                except psycopg2.Error as err:
+                    with conn.cursor() as cur:
+                        invalid = _invalid_indexes(cur)
+                    conn.rollback()
+                    hint = f" (INVALID indexes left behind: {', '.join(invalid)})" if invalid else ""
+                    raise MigrationError(f"{name}: {err.pgerror or err}{hint}") from err
+            log(f"{name}: applied in {seconds:.1f}s")
+            applied_now.append(version)
+    finally:
+        conn.rollback()
+        conn.autocommit = True
+        with conn.cursor() as cur:
+            cur.execute("RESET lock_timeout;")
+            cur.execute("SELECT pg_advisory_unlock(hashtext('schema_migrations'));")
+        conn.autocommit = False
+    return applied_now
+
+def baseline(conn, version):
+    """Record every migration up to `version` as applied without running
+    it, for databases migrated by hand before the runner existed."""
+    with conn.cursor() as cur:
+        ensure_version_table(cur)
+        for v, name, path in discover():
+            if v <= version:
+                _record(cur, v, name, checksum(path), None)
+    conn.commit()
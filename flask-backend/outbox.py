@@ -0,0 +1,214 @@
+# Asynchronous fraud detection (db/migrations/014): a local pool of worker
+# threads drains FraudOutbox in batches, scores each batch with the rule
+# engine and writes TransactionLogs and account verdicts.
+import threading
+import traceback
+
+from db import get_db_connection, run_in_transaction
+from rule_cache import active_rules
+from rule_engine import TransactionBatch, evaluate, load_context
+
+
+def outbox_lag(cur):
+    """Current mode, queued transactions and the age in seconds of the
+    oldest one (None when the outbox is empty)."""
+    cur.execute(
+      """
+      SELECT fraud_detection_mode() AS mode,
+             COUNT(*) AS pending,
+             EXTRACT(EPOCH FROM clock_timestamp() - MIN(queued_at)) AS oldest_age_seconds
+      FROM FraudOutbox;
+      """
+    )
+    row = dict(cur.fetchone())
+    if row["oldest_age_seconds"] is not None:
+        row["oldest_age_seconds"] = round(float(row["oldest_age_seconds"]), 3)
+    return row
+
+def process_batch(cur, batch_size):
+    """Claim up to batch_size queued transactions and score them, in the
+    caller's transaction. Claimed rows are deleted, so a rollback puts
+    them back. Returns the number claimed."""
+    cur.execute(
+      """
+      DELETE FROM FraudOutbox
+      WHERE outbox_id IN (
+        SELECT outbox_id FROM FraudOutbox
+        ORDER BY outbox_id
+        LIMIT %s
+        FOR UPDATE SKIP LOCKED
+      )
+      RETURNING transaction_id, transaction_time;
+      """,
+      (batch_size,)
+    )
+    claimed = cur.fetchall()
+    if not claimed:
+        return 0
+    cur.execute(
+      """
+      SELECT t.transaction_id, t.account_id, t.transaction_type, t.amount,
+             t.transaction_time, t.details
+      FROM Transactions t
+      JOIN unnest(%s::int[], %s::timestamp[]) AS o(transaction_id, transaction_time)
+        ON t.transaction_id = o.transaction_id
+       AND t.transaction_time = o.transaction_time;
+      """,
+      ([r["transaction_id"] for r in claimed], [r["transaction_time"] for r in claimed])
+    )
+    rows = cur.fetchall()
+    if rows:
+        batch = TransactionBatch.from_rows(rows)
+        rules = active_rules().engine_rules
+        # The batch is already stored, exactly as for a replay.
+        history, prior = load_context(cur, batch, rules, replay=True)
+        logs, verdicts = evaluate(batch, rules, history, prior)
+        _write_results(cur, rows, logs, verdicts)
+    return len(claimed)
+
+def _write_results(cur, rows, logs, verdicts):
+    times = {r["transaction_id"]: r["transaction_time"] for r in rows}
+    last_tx = {}
+    for r in rows:
+        acct, ts = r["account_id"], r["transaction_time"]
+        if acct not in last_tx or ts > last_tx[acct]:
+            last_tx[acct] = ts
+    flagged_tx = {}
+    for log in logs:
+        flagged_tx[log["account_id"]] = max(log["transaction_id"], flagged_tx.get(log["account_id"], 0))
+
+    # Accounts row before DashboardCounters shard, like every other writer
+    # (db/migrations/013): lock the accounts to be judged, in account_id
+    # order, before the TransactionLogs insert bumps fraud_incidents.
+    accounts = sorted(verdicts)
+    if accounts:
+        cur.execute(
+            "SELECT account_id FROM Accounts WHERE account_id = ANY(%s)"
+            " ORDER BY account_id FOR NO KEY UPDATE;", (accounts,)
+        )
+    if logs:
+        cur.execute(
+          """
+          INSERT INTO TransactionLogs (transaction_id, rule_id, detected_rule)
+          SELECT * FROM unnest(%s::int[], %s::int[], %s::varchar[]);
+          """,
+          ([l["transaction_id"] for l in logs], [l["rule_id"] for l in logs],
+           [l["detected_rule"] for l in logs])
+        )
+    if accounts:
+        # Batches are claimed concurrently and may commit out of order: a
+        # verdict only stands if no later transaction of the account has
+        # been flagged since.
+        cur.execute(
+          """
+          UPDATE Accounts a
+          SET account_status = v.action,
+              risk_level     = v.risk_level
+          FROM unnest(%s::int[], %s::int[], %s::timestamp[], %s::varchar[], %s::varchar[])
+               AS v(account_id, transaction_id, transaction_time, action, risk_level)
+          WHERE a.account_id = v.account_id
+            AND (a.account_status IS DISTINCT FROM v.action
+                 OR a.risk_level IS DISTINCT FROM v.risk_level)
+            AND NOT EXISTS (
+              SELECT 1
+              FROM Transactions t
+              JOIN TransactionLogs l ON l.transaction_id = t.transaction_id
+              WHERE t.account_id = v.account_id
+                AND t.transaction_time >= v.transaction_time
+                AND t.transaction_id > v.transaction_id
+            );
+          """,
+          (accounts,
+           [flagged_tx[a] for a in accounts],
+           [times[flagged_tx[a]] for a in accounts],
+           [verdicts[a]["action"] for a in accounts],
+           [verdicts[a]["risk_level"] for a in accounts])
+        )
+    # Activity touches skip rows held elsewhere, as in the trigger.
+    cur.execute(
+      """
+      UPDATE Accounts a
+      SET last_activity_at = GREATEST(a.last_activity_at, x.last_tx)
+      FROM (
+        SELECT a.account_id, t.last_tx
+        FROM Accounts a
+        JOIN unnest(%s::int[], %s::timestamp[]) AS t(account_id, last_tx)
+          ON t.account_id = a.account_id
+        WHERE a.last_activity_at IS NULL OR a.last_activity_at < t.last_tx
+        FOR NO KEY UPDATE OF a SKIP LOCKED
+      ) x
+      WHERE a.account_id = x.account_id;
+      """,
+      (list(last_tx), list(last_tx.values()))
+    )
+
+
+# ─── WORKER POOL ─────────────────────────────────────────────────────────────
+class OutboxWorkers:
+    """Worker threads draining FraudOutbox, each on its own pooled
+    connection. A worker sleeps poll_interval seconds whenever a claim
+    comes back short of batch_size. After an error it logs the traceback
+    and backs off, doubling the wait up to max_backoff seconds while the
+    errors continue."""
+
+    def __init__(self, workers=2, batch_size=500, poll_interval=0.5, max_backoff=30.0,
+                 log=print):
+        self.workers = workers
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.max_backoff = max_backoff
+        self.log = log
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._threads = []
+        self._batches = 0
+        self._processed = 0
+        self._errors = 0
+
+    def start(self):
+        self._stop.clear()
+        self._threads = [
+            threading.Thread(target=self._run, name=f"fraud-worker-{i}", daemon=True)
+            for i in range(self.workers)
+        ]
+        for t in self._threads:
+            t.start()
+
+    def stop(self):
+        self._stop.set()
+        for t in self._threads:
+            t.join()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "workers":   self.workers,
+                "batches":   self._batches,
+                "processed": self._processed,
+                "errors":    self._errors,
+            }
+
+    def _run(self):
+        failures = 0
+        while not self._stop.is_set():
+            try:
+                with get_db_connection() as conn:
+                    while not self._stop.is_set():
+                        n = run_in_transaction(
+                            conn, lambda cur: process_batch(cur, self.batch_size))
+                        failures = 0
+                        if n:
+                            with self._lock:
+                                self._batches += 1
+                                self._processed += n
+                        if n < self.batch_size:
+                            self._stop.wait(self.poll_interval)
+            except Exception:
+                # Whatever failed (the database, a rule that no longer
+                # validates, a bug), the batch was rolled back and stays
+                # queued; the worker must outlive it.
+                failures += 1
+                with self._lock:
+                    self._errors += 1
+                self.log(f"{threading.current_thread().name}: {traceback.format_exc()}")
+                self._stop.wait(min(self.poll_interval * 2 ** failures, self.max_backoff))
@@ -0,0 +1,199 @@
+# Maintenance of the monthly Transactions partitions (db/migrations/009):
+# create months ahead of time, detach old months for archiving, and check
+# that the hot queries only touch the partitions they need.
+#
+# `flask --app app partitions-maintain` must run on a schedule (daily is
+# plenty). Rows past the created months fall into transactions_default
+# (db/migrations/018), which is only a safety net.
+import json
+from datetime import datetime
+
+ARCHIVE_SCHEMA = "archive"
+
+
+def list_partitions(cur):
+    cur.execute(
+      """
+      SELECT c.relname AS name,
+             pg_get_expr(c.relpartbound, c.oid) AS bound,
+             c.reltuples::bigint AS est_rows,
+             pg_total_relation_size(c.oid) AS bytes,
+             i.inhdetachpending AS detach_pending
+      FROM pg_inherits i
+      JOIN pg_class c ON c.oid = i.inhrelid
+      WHERE i.inhparent = 'transactions'::regclass
+      ORDER BY c.relname;
+      """
+    )
+    return cur.fetchall()
+
+def ensure_partitions(conn, months_ahead=3):
+    """Create any missing partition from this month to `months_ahead`
+    months out, and for the months of any rows in the default partition.
+    Returns the number created."""
+    with conn.cursor() as cur:
+        cur.execute(
+          """
+          SELECT create_transaction_partitions(MIN(transaction_time), MAX(transaction_time))
+                 AS created
+          FROM transactions_default;
+          """
+        )
+        created = cur.fetchone()["created"]
+        cur.execute(
+          """
+          SELECT create_transaction_partitions(
+            NOW()::timestamp,
+            NOW()::timestamp + make_interval(months => %s)) AS created;
+          """,
+          (months_ahead,)
+        )
+        created += cur.fetchone()["created"]
+    conn.commit()
+    return created
+
+def _partition_month(name):
+    # transactions_yYYYYmMM
+    try:
+        return datetime.strptime(name, "transactions_y%Ym%m")
+    except ValueError:
+        return None
+
+def archive_partitions(conn, keep_months, drop=False, log=print):
+    """Detach partitions for months older than `keep_months` months ago and
+    move them to the archive schema (or drop them).
+
+    Detaching uses DETACH PARTITION ... CONCURRENTLY, so inserts and reads on
+    Transactions are not blocked; it runs outside a transaction block.
+    Fraud logs for archived transactions are kept.
+    """
+    with conn.cursor() as cur:
+        cur.execute(
+          "SELECT date_trunc('month', NOW()::timestamp) - make_interval(months => %s) AS cutoff;",
+          (keep_months,)
+        )
+        cutoff = cur.fetchone()["cutoff"]
+        partitions = list_partitions(cur)
+    conn.commit()
+
+    archived = []
+    conn.autocommit = True
+    try:
+        with conn.cursor() as cur:
+            if not drop:
+                cur.execute(f"CREATE SCHEMA IF NOT EXISTS {ARCHIVE_SCHEMA};")
+            for part in partitions:
+                month = _partition_month(part["name"])
+                if month is None or month >= cutoff:
+                    continue
+                # An interrupted concurrent detach must be finalized instead.
+                mode = "FINALIZE" if part["detach_pending"] else "CONCURRENTLY"
+                cur.execute(f"ALTER TABLE Transactions DETACH PARTITION {part['name']} {mode};")
+                if drop:
+                    cur.execute(f"DROP TABLE {part['name']};")
+                else:
+                    cur.execute(f"ALTER TABLE {part['name']} SET SCHEMA {ARCHIVE_SCHEMA};")
+                log(f"{part['name']}: {'dropped' if drop else 'archived'}")
+                archived.append(part["name"])
+    finally:
+        conn.autocommit = False
+    return archived
+
+
+# ─── PRUNING CHECK ───────────────────────────────────────────────────────────
+# Representative shapes of the hot queries: the keyset pages in app.py and
+# the window/idle probes of the fraud trigger and rule engine.
+PRUNING_QUERIES = {
+    "public page (cursor)": """
+      SELECT t.transaction_id FROM Transactions t
+      JOIN Accounts a ON t.account_id = a.account_id
+      WHERE (t.transaction_time, t.transaction_id) < (%(ts)s, %(id)s)
+        AND t.transaction_time <= %(ts)s
+      ORDER BY t.transaction_time DESC, t.transaction_id DESC
+      LIMIT 50;
+    """,
+    "user page (cursor)": """
+      SELECT t.transaction_id FROM Accounts a
+      CROSS JOIN LATERAL (
+        SELECT * FROM Transactions t
+        WHERE t.account_id = a.account_id
+          AND (t.transaction_time, t.transaction_id) < (%(ts)s, %(id)s)
+          AND t.transaction_time <= %(ts)s
+        ORDER BY t.transaction_time DESC, t.transaction_id DESC
+        LIMIT 50
+      ) t
+      WHERE a.user_id = %(user_id)s
+      ORDER BY t.transaction_time DESC, t.transaction_id DESC
+      LIMIT 50;
+    """,
+    "trigger window probe": """
+      SELECT s.transaction_id, w.n
+      FROM (SELECT * FROM Transactions
+            WHERE transaction_time <= %(ts)s
+            ORDER BY transaction_time DESC, transaction_id DESC
+            LIMIT 100) s
+      CROSS JOIN LATERAL (
+        SELECT COUNT(*) AS n FROM Transactions t
+        WHERE t.account_id = s.account_id
+          AND (t.transaction_time, t.transaction_id)
+              <= (s.transaction_time, s.transaction_id)
+          AND t.transaction_time <= s.transaction_time
+          AND t.transaction_time > s.transaction_time - INTERVAL '1 hour'
+      ) w;
+    """,
+    "trigger idle probe": """
+      SELECT s.transaction_id,
+             (SELECT t.transaction_time FROM Transactions t
+              WHERE t.account_id = s.account_id
+                AND (t.transaction_time, t.transaction_id)
+                    < (s.transaction_time, s.transaction_id)
+                AND t.transaction_time <= s.transaction_time
+              ORDER BY t.transaction_time DESC, t.transaction_id DESC
+              LIMIT 1) AS prev
+      FROM (SELECT * FROM Transactions
+            WHERE transaction_time <= %(ts)s
+            ORDER BY transaction_time DESC, transaction_id DESC
+            LIMIT 100) s;
+    """,
+    "rule engine history": """
+      SELECT transaction_id FROM Transactions
+      WHERE account_id = ANY(%(accounts)s)
+        AND transaction_time > %(ts)s::timestamp - INTERVAL '1 day'
+        AND transaction_time <= %(ts)s;
+    """,
+}
+
+def _scanned(plan, found):
+    rel = plan.get("Relation Name")
+    if rel and rel.startswith("transactions_") and plan.get("Actual Loops", 0) > 0:
+        found.add(rel)
+    for child in plan.get("Plans", ()):
+        _scanned(child, found)
+    return found
+
+def check_pruning(cur):
+    """EXPLAIN ANALYZE each query in PRUNING_QUERIES against the newest
+    transaction and return {name: sorted partitions actually scanned}."""
+    cur.execute(
+      """
+      SELECT t.transaction_id AS id, t.transaction_time AS ts, a.user_id
+      FROM Transactions t JOIN Accounts a ON a.account_id = t.account_id
+      ORDER BY t.transaction_time DESC, t.transaction_id DESC
+      LIMIT 1;
+      """
+    )
+    latest = cur.fetchone()
+    if latest is None:
+        return {}
+    cur.execute("SELECT array_agg(account_id) AS ids FROM Accounts WHERE user_id = %s;",
+                (latest["user_id"],))
+    params = dict(latest, accounts=cur.fetchone()["ids"])
+
+    report = {}
+    for name, query in PRUNING_QUERIES.items():
+        cur.execute("EXPLAIN (ANALYZE, FORMAT JSON) " + query, params)
+        plan = cur.fetchone()["QUERY PLAN"]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        report[name] = sorted(_scanned(plan[0]["Plan"], set()))
+    return report
@@ -0,0 +1,112 @@
+# EXPLAIN-based check that the route queries in app.py are served by the
+# indexes from db/migrations/001, 010 and 013. The query texts are the
+# routes' own, from queries.py.
+import json
+from datetime import datetime
+
+from queries import (
+    INGEST_DETECTIONS,
+    LOGIN_USER,
+    PENDING_FRAUD_LOGS,
+    PUBLIC_TRANSACTIONS_AFTER,
+    PUBLIC_TRANSACTIONS_PAGE,
+    PUBLIC_TRANSACTIONS_STREAM,
+    USER_ACCOUNTS,
+    USER_TRANSACTIONS_AFTER,
+    USER_TRANSACTIONS_PAGE,
+    USER_TRANSACTIONS_STREAM,
+)
+
+# route: (query, indexes the plan is expected to use)
+ROUTE_QUERIES = {
+    "POST /api/auth/login": (LOGIN_USER, {"idx_users_username"}),
+    "GET /api/user/accounts": (USER_ACCOUNTS, {"idx_accounts_user_created", "accountbalances_pkey"}),
+    "GET /api/user/transactions": (
+        USER_TRANSACTIONS_PAGE.format(after=""),
+        {"idx_accounts_user_created", "idx_transactions_account_time_id"}),
+    "GET /api/user/transactions (cursor)": (
+        USER_TRANSACTIONS_PAGE.format(after=USER_TRANSACTIONS_AFTER),
+        {"idx_accounts_user_created", "idx_transactions_account_time_id"}),
+    "GET /api/user/transactions (stream)": (
+        USER_TRANSACTIONS_STREAM, {"idx_accounts_user_created", "idx_transactions_account_time_id"}),
+    "GET /api/transactions": (
+        PUBLIC_TRANSACTIONS_PAGE.format(after=""), {"idx_transactions_time_id"}),
+    "GET /api/transactions (cursor)": (
+        PUBLIC_TRANSACTIONS_PAGE.format(after=PUBLIC_TRANSACTIONS_AFTER),
+        {"idx_transactions_time_id"}),
+    "GET /api/transactions (stream)": (PUBLIC_TRANSACTIONS_STREAM, {"idx_transactions_time_id"}),
+    "GET /api/admin/fraud-logs": (PENDING_FRAUD_LOGS, {"idx_transactionlogs_pending"}),
+    "POST /api/admin/transactions/bulk": (INGEST_DETECTIONS, {"idx_transactionlogs_transaction_id"}),
+}
+
+def _index_names(plan, found):
+    if "Index Name" in plan:
+        found.add(plan["Index Name"])
+    for child in plan.get("Plans", ()):
+        _index_names(child, found)
+    return found
+
+def _parent_indexes(cur):
+    # Partition indexes appear in plans under their own names.
+    cur.execute(
+      """
+      SELECT c.relname AS child, p.relname AS parent
+      FROM pg_inherits i
+      JOIN pg_class c ON c.oid = i.inhrelid
+      JOIN pg_class p ON p.oid = i.inhparent
+      WHERE c.relkind = 'i';
+      """
+    )
+    return {r["child"]: r["parent"] for r in cur.fetchall()}
+
+def _used_indexes(cur, query, params, parents):
+    cur.execute("EXPLAIN (FORMAT JSON) " + query, params)
+    plan = cur.fetchone()["QUERY PLAN"]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return {parents.get(name, name) for name in _index_names(plan[0]["Plan"], set())}
+
+def check_indexes(cur):
+    """EXPLAIN each query in ROUTE_QUERIES with sample parameters.
+
+    Returns {route: (status, indexes used)} where status is "ok", "seqscan"
+    (the indexes are usable but the planner prefers a sequential scan at
+    the current table sizes) or "missing" (not usable even with sequential
+    scans disabled: the index does not exist or does not match the query).
+    """
+    # The cursor sits on the user's newest transaction, as for page two.
+    cur.execute(
+      """
+      SELECT u.username, a.user_id, t.transaction_time AS ts, t.transaction_id AS id,
+             (SELECT array_agg(transaction_id) FROM
+                (SELECT transaction_id FROM Transactions
+                 ORDER BY transaction_time DESC, transaction_id DESC
+                 LIMIT 100) t) AS ids
+      FROM Accounts a
+      JOIN Users u ON u.user_id = a.user_id
+      JOIN LATERAL (
+        SELECT transaction_time, transaction_id FROM Transactions t
+        WHERE t.account_id = a.account_id
+        ORDER BY transaction_time DESC, transaction_id DESC
+        LIMIT 1
+      ) t ON TRUE
+      LIMIT 1;
+      """
+    )
+    params = cur.fetchone() or {"username": "", "user_id": 0, "ts": datetime.now(),
+                                "id": 0, "ids": []}
+    params = dict(params, ids=params["ids"] or [0], limit=51)
+    parents = _parent_indexes(cur)
+
+    report = {}
+    for route, (query, expected) in ROUTE_QUERIES.items():
+        used = _used_indexes(cur, query, params, parents)
+        status = "ok"
+        if not expected <= used:
+            cur.execute("SET LOCAL enable_seqscan = off;")
+            forced = _used_indexes(cur, query, params, parents)
+            cur.execute("SET LOCAL enable_seqscan = on;")
+            status = "seqscan" if expected <= forced else "missing"
+        report[route] = (status, sorted(used))
+    cur.connection.rollback()
+    return report
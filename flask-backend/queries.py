@@ -0,0 +1,124 @@
+# SQL of the hot routes, shared by app.py and the index check in plans.py
+# so the two cannot drift apart. Paged queries take an `{after}` slot that
+# is either empty (first page) or the matching *_AFTER keyset predicate;
+# the plain bound on transaction_time next to the row comparison lets the
+# planner prune partitions (db/migrations/009), the row comparison alone
+# does not.
+
+LOGIN_USER = """
+  SELECT user_id, role, password FROM Users WHERE username = %(username)s;
+"""
+
+USER_ACCOUNTS = """
+  SELECT a.account_id, a.account_number,
+         (SELECT COALESCE(SUM(b.balance), 0)
+          FROM AccountBalances b
+          WHERE b.account_id = a.account_id) AS balance,
+         a.account_status, a.risk_level, a.created_at
+  FROM Accounts a
+  WHERE a.user_id = %(user_id)s
+  ORDER BY a.created_at DESC;
+"""
+
+# Pending logs are read on their own first: joined directly, the planner
+# walks TransactionLogs in transaction_id order for the join and filters
+# out the resolved logs instead of using idx_transactionlogs_pending.
+PENDING_FRAUD_LOGS = """
+  WITH f AS MATERIALIZED (
+    SELECT log_id, transaction_id, detected_rule, status, created_at
+    FROM TransactionLogs
+    WHERE status = 'pending'
+  )
+  SELECT
+    f.log_id,
+    f.transaction_id,
+    t.account_id,
+    f.detected_rule,
+    f.status,
+    f.created_at,
+    t.amount,
+    t.transaction_time
+  FROM f
+  LEFT JOIN Transactions t
+    ON f.transaction_id = t.transaction_id
+  ORDER BY t.account_id, f.created_at DESC;
+"""
+
+PUBLIC_TRANSACTIONS_PAGE = """
+  SELECT
+    t.transaction_id,
+    a.account_id,
+    t.transaction_type,
+    t.amount,
+    t.transaction_time,
+    t.details
+  FROM Transactions t
+  JOIN Accounts a ON t.account_id = a.account_id
+  {after}
+  ORDER BY t.transaction_time DESC, t.transaction_id DESC
+  LIMIT %(limit)s;
+"""
+PUBLIC_TRANSACTIONS_AFTER = """
+  WHERE (t.transaction_time, t.transaction_id) < (%(ts)s, %(id)s)
+    AND t.transaction_time <= %(ts)s
+"""
+
+# Take at most `limit` rows per account from its own index range, then
+# merge: the cost is (#accounts x limit) however far back the page is.
+USER_TRANSACTIONS_PAGE = """
+  SELECT
+    t.transaction_id,
+    t.account_id,
+    t.transaction_type,
+    t.amount,
+    t.transaction_time,
+    t.details
+  FROM Accounts a
+  CROSS JOIN LATERAL (
+    SELECT *
+    FROM Transactions t
+    WHERE t.account_id = a.account_id
+      {after}
+    ORDER BY t.transaction_time DESC, t.transaction_id DESC
+    LIMIT %(limit)s
+  ) t
+  WHERE a.user_id = %(user_id)s
+  ORDER BY t.transaction_time DESC, t.transaction_id DESC
+  LIMIT %(limit)s;
+"""
+USER_TRANSACTIONS_AFTER = """
+      AND (t.transaction_time, t.transaction_id) < (%(ts)s, %(id)s)
+      AND t.transaction_time <= %(ts)s
+"""
+
+# ?stream=1: the whole listing, newest first, read through a server-side
+# cursor (app.stream_rows).
+PUBLIC_TRANSACTIONS_STREAM = """
+  SELECT
+    t.transaction_id,
+    a.account_id,
+    t.transaction_type,
+    t.amount,
+    t.transaction_time,
+    t.details
+  FROM Transactions t
+  JOIN Accounts a ON t.account_id = a.account_id
+  ORDER BY t.transaction_time DESC, t.transaction_id DESC;
+"""
+USER_TRANSACTIONS_STREAM = """
+  SELECT
+    t.transaction_id,
+    t.account_id,
+    t.transaction_type,
+    t.amount,
+    t.transaction_time,
+    t.details
+  FROM Transactions t
+  JOIN Accounts a ON t.account_id = a.account_id
+  WHERE a.user_id = %(user_id)s
+  ORDER BY t.transaction_time DESC, t.transaction_id DESC;
+"""
+
+INGEST_DETECTIONS = """
+  SELECT COUNT(*) AS n FROM TransactionLogs WHERE transaction_id = ANY(%(ids)s);
+"""
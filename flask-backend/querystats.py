@@ -0,0 +1,144 @@
+# Per-statement timings for everything run on pooled connections, keyed by
+# normalized SQL, and a log of slow statements. A sampled share of the
+# slow ones is re-run under EXPLAIN (ANALYZE, BUFFERS) for its plan.
+import random
+import re
+import threading
+import time
+from collections import deque
+from functools import lru_cache
+
+import psycopg2
+import psycopg2.extensions
+
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b|%\(\w+\)s|%s")
+_PLACEHOLDER = re.compile(r"%\(\w+\)s|%s")
+_SPACE = re.compile(r"\s+")
+EXPLAINABLE = ("SELECT", "WITH", "INSERT", "UPDATE", "DELETE", "VALUES")
+
+OTHER = "<other statements>"
+
+
+@lru_cache(maxsize=4096)
+def normalize(query):
+    """One line, with placeholders and literals as ?."""
+    if isinstance(query, bytes):
+        query = query.decode("utf-8", "replace")
+    elif not isinstance(query, str):
+        query = str(query)   # psycopg2.sql.Composable
+    return _SPACE.sub(" ", _LITERALS.sub("?", query)).strip().rstrip(";").rstrip()
+
+
+class _Stat:
+    __slots__ = ("calls", "seconds", "max_seconds", "rows", "slow")
+
+    def __init__(self):
+        self.calls = 0
+        self.seconds = 0.0
+        self.max_seconds = 0.0
+        self.rows = 0
+        self.slow = 0
+
+
+class QueryStats:
+    """Statement hook (db.add_statement_hook) aggregating timings. Once
+    max_statements distinct statements are known, new ones are counted
+    together under OTHER."""
+
+    def __init__(self, slow_ms=200, explain_rate=0.1, keep=100, max_statements=1000,
+                 log=print):
+        self.slow_seconds = slow_ms / 1000
+        self.explain_rate = explain_rate
+        self.max_statements = max_statements
+        self.log = log
+        self._lock = threading.Lock()
+        self._stats = {}
+        self._slow = deque(maxlen=keep)   # most recent slow statements
+        self.since = time.time()
+
+    def record(self, cursor, query, vars, seconds, rows):
+        key = normalize(query)
+        slow = seconds >= self.slow_seconds
+        with self._lock:
+            stat = self._stats.get(key)
+            if stat is None:
+                if len(self._stats) >= self.max_statements:
+                    key = OTHER
+                stat = self._stats.setdefault(key, _Stat())
+            stat.calls += 1
+            stat.seconds += seconds
+            stat.max_seconds = max(stat.max_seconds, seconds)
+            stat.rows += rows
+            stat.slow += slow
+        if slow:
+            self._on_slow(cursor, query, vars, key, seconds, rows)
+
+    def _on_slow(self, cursor, query, vars, key, seconds, rows):
+        plan = None
+        if cursor is not None and random.random() < self.explain_rate:
+            plan = explain(cursor.connection, query, vars)
+        self.log(f"slow statement ({seconds * 1000:.1f}ms, {rows} rows): {key}"
+                 + (f"\n{plan}" if plan else ""))
+        with self._lock:
+            self._slow.append({
+                "statement":  key,
+                "ms":         round(seconds * 1000, 3),
+                "rows":       rows,
+                "at":         time.time(),
+                "plan":       plan,
+            })
+
+    def top(self, n=20, order="total"):
+        """The n statements with the highest total, mean or max time."""
+        sort_key = {
+            "total": lambda s: s.seconds,
+            "mean":  lambda s: s.seconds / s.calls,
+            "max":   lambda s: s.max_seconds,
+        }[order]
+        with self._lock:
+            items = sorted(self._stats.items(), key=lambda kv: sort_key(kv[1]), reverse=True)[:n]
+            return [{
+                "statement": key,
+                "calls":     s.calls,
+                "total_ms":  round(s.seconds * 1000, 3),
+                "mean_ms":   round(s.seconds * 1000 / s.calls, 3),
+                "max_ms":    round(s.max_seconds * 1000, 3),
+                "rows":      s.rows,
+                "slow":      s.slow,
+            } for key, s in items]
+
+    def slow(self):
+        """Recent slow statements, newest first."""
+        with self._lock:
+            return list(reversed(self._slow))
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+            self._slow.clear()
+            self.since = time.time()
+
+
+def explain(conn, query, vars):
+    """EXPLAIN (ANALYZE, BUFFERS) the statement again on its connection,
+    inside a savepoint that is rolled back, so its writes are undone. Locks
+    it takes are held to the end of the transaction, as the original's
+    are. Returns the plan text, or None when the statement can't be
+    explained here."""
+    if not isinstance(query, str) or not query.lstrip().upper().startswith(EXPLAINABLE):
+        return None
+    if vars is None and _PLACEHOLDER.search(query):
+        return None   # executemany: no single set of parameters
+    if conn.autocommit or conn.info.transaction_status != psycopg2.extensions.TRANSACTION_STATUS_INTRANS:
+        return None
+    # A plain cursor, so the EXPLAIN is not reported to the hooks itself.
+    with conn.cursor(cursor_factory=psycopg2.extensions.cursor) as cur:
+        cur.execute("SAVEPOINT explain_slow;")
+        try:
+            cur.execute("EXPLAIN (ANALYZE, BUFFERS) " + query, vars)
+            plan = "\n".join(row[0] for row in cur.fetchall())
+        except psycopg2.Error as err:
+            plan = f"EXPLAIN failed: {err}".strip()
+        cur.execute("ROLLBACK TO SAVEPOINT explain_slow;")
+        cur.execute("RELEASE SAVEPOINT explain_slow;")
+    return plan
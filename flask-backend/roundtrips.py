@@ -0,0 +1,79 @@
+# Database round trips per request (statements, server-side fetches,
+# COMMIT and ROLLBACK, as reported by db.py's statement hook), checked
+# against the budget each route declares with @round_trips.budget(n).
+# Requests over budget are logged; in debug mode, or with
+# ROUND_TRIPS_HEADER, every response reports "used/budget" in
+# X-DB-Round-Trips. RoundTrips.check() is the test-side enforcement.
+import threading
+
+from flask import current_app, request
+
+from db import add_statement_hook
+
+HEADER = "X-DB-Round-Trips"
+
+
+class RoundTripBudgetExceeded(AssertionError):
+    pass
+
+
+class RoundTrips:
+    def __init__(self, header=False, log=print):
+        self.header = header
+        self.log = log
+        self.budgets = {}   # endpoint -> round trips allowed
+        self._local = threading.local()
+
+    def budget(self, n):
+        """Declare that the decorated view makes at most n round trips
+        before its response is returned (a streamed body's own statements
+        come later and are not counted). Endpoints are named after their
+        view function, so this works above or below other decorators."""
+        def decorator(fn):
+            self.budgets[fn.__name__] = n
+            return fn
+        return decorator
+
+    def init_app(self, app):
+        app.before_request(self._before)
+        app.after_request(self._after)
+        add_statement_hook(self._on_statement)
+
+    def _before(self):
+        self._local.count = 0
+        self._local.last = None
+
+    def _on_statement(self, cursor, query, vars, seconds, rows):
+        if getattr(self._local, "count", None) is not None:
+            self._local.count += 1
+
+    def _after(self, resp):
+        used = getattr(self._local, "count", None)
+        if used is None:
+            return resp
+        self._local.count = None
+        endpoint = request.endpoint
+        budget = self.budgets.get(endpoint)
+        self._local.last = (endpoint, used, budget)
+        if budget is not None and used > budget:
+            self.log(f"{endpoint}: {used} database round trips, budget {budget}")
+        if self.header or current_app.debug:
+            resp.headers[HEADER] = f"{used}/{budget}" if budget is not None else str(used)
+        return resp
+
+    def last(self):
+        """(endpoint, used, budget) of the last request on this thread."""
+        return getattr(self._local, "last", None)
+
+    def check(self, client, method, path, **kwargs):
+        """Make a request with a Flask test client and return the response;
+        raises RoundTripBudgetExceeded when the endpoint declares no budget
+        or went over it."""
+        resp = client.open(path, method=method, **kwargs)
+        endpoint, used, budget = self.last() or (None, 0, None)
+        if budget is None:
+            raise RoundTripBudgetExceeded(f"{method} {path}: {endpoint} declares no round trip budget")
+        if used > budget:
+            raise RoundTripBudgetExceeded(
+                f"{method} {path}: {used} database round trips, {endpoint} allows {budget}")
+        return resp
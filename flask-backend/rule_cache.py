@@ -0,0 +1,92 @@
+# Process-wide cache of the active FraudRules, keyed by the rule set
+# version (db/migrations/016). A commit that changes FraudRules notifies
+# fraud_rules and every process drops its copy; while the listener is
+# disconnected nothing is cached, since a change could go unnoticed.
+import threading
+
+from db import get_db_connection
+from events import get_listener
+from rules import validate_condition
+
+CHANNEL = "fraud_rules"
+
+
+class RuleSet:
+    """The active rules at one version: rows as stored, ordered by
+    rule_id, and the validated subset the rule engine evaluates."""
+
+    def __init__(self, version, rows):
+        self.version = version
+        self.rows = rows
+        self.engine_rules = [
+            dict(row, condition=validate_condition(row["condition"]))
+            for row in rows if row["condition"] is not None
+        ]
+
+
+class RuleCache:
+    def __init__(self, listener):
+        self.listener = listener
+        self._lock = threading.Lock()
+        self._generation = 0   # bumped by every invalidation
+        self._rules = None
+        listener.register(CHANNEL, lambda conn, payloads: self.invalidate(), self.invalidate)
+
+    def invalidate(self):
+        with self._lock:
+            self._generation += 1
+            self._rules = None
+
+    def get(self):
+        """The current RuleSet, read from the database on a miss."""
+        listening = self.listener.listening(CHANNEL) or self.listener.start(CHANNEL)
+        with self._lock:
+            if self._rules is not None and listening:
+                return self._rules
+            generation = self._generation
+        rules = self._load()
+        with self._lock:
+            # An invalidation during the load may have come after it read.
+            if generation == self._generation and self.listener.listening(CHANNEL):
+                self._rules = rules
+        return rules
+
+    @staticmethod
+    def _load():
+        # One statement, so the version matches the rows.
+        with get_db_connection() as conn, conn.cursor() as cur:
+            cur.execute(
+              """
+              SELECT v.version, r.*
+              FROM FraudRuleVersion v
+              LEFT JOIN FraudRules r ON r.active
+              ORDER BY r.rule_id;
+              """
+            )
+            rows = cur.fetchall()
+            conn.commit()
+        version = rows[0]["version"]
+        rules = []
+        for row in rows:
+            if row["rule_id"] is not None:
+                row = dict(row)
+                del row["version"]
+                rules.append(row)
+        return RuleSet(version, rules)
+
+
+# ─── PROCESS-WIDE CACHE ──────────────────────────────────────────────────────
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_rule_cache():
+    global _cache
+    listener = get_listener()
+    if _cache is None or _cache.listener is not listener:
+        with _cache_lock:
+            if _cache is None or _cache.listener is not listener:
+                _cache = RuleCache(listener)
+    return _cache
+
+def active_rules():
+    return get_rule_cache().get()
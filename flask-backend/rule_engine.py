@@ -0,0 +1,290 @@
+# Vectorized evaluation of FraudRules outside the database, for backfills,
+# what-if analysis, offline replays and the outbox workers (outbox.py).
+# Semantics follow the compiled detect_fraud_on_transactions() trigger
+# (db/migrations/006): a batch here corresponds to one INSERT statement.
+import numpy as np
+
+from rules import NUMERIC_FIELDS, validate_condition
+
+KEY_DTYPE = np.dtype([("account_id", "<i8"), ("time", "<i8"), ("transaction_id", "<i8")])
+INT64_MAX = np.iinfo(np.int64).max
+
+
+class TransactionBatch:
+    """Column arrays for a set of transactions."""
+
+    def __init__(self, transaction_id, account_id, transaction_type, amount,
+                 transaction_time, details=None):
+        self.transaction_id   = np.asarray(transaction_id, dtype=np.int64)
+        self.account_id       = np.asarray(account_id, dtype=np.int64)
+        self.transaction_type = np.asarray(transaction_type, dtype=object)
+        self.amount           = np.asarray(amount, dtype=np.float64)
+        self.transaction_time = np.asarray(transaction_time, dtype="datetime64[us]")
+        if details is None:
+            details = [None] * len(self.transaction_id)
+        self.details          = np.asarray(details, dtype=object)
+
+    def __len__(self):
+        return len(self.transaction_id)
+
+    @classmethod
+    def from_rows(cls, rows):
+        return cls(
+            [r["transaction_id"] for r in rows],
+            [r["account_id"] for r in rows],
+            [r["transaction_type"] for r in rows],
+            [float(r["amount"]) for r in rows],
+            [r["transaction_time"] for r in rows],
+            [r.get("details") for r in rows],
+        )
+
+    def take(self, index):
+        return TransactionBatch(
+            self.transaction_id[index], self.account_id[index],
+            self.transaction_type[index], self.amount[index],
+            self.transaction_time[index], self.details[index],
+        )
+
+    def concat(self, other):
+        return TransactionBatch(*(
+            np.concatenate([getattr(self, c), getattr(other, c)])
+            for c in ("transaction_id", "account_id", "transaction_type",
+                      "amount", "transaction_time", "details")
+        ))
+
+
+# ─── LOADING ─────────────────────────────────────────────────────────────────
+def load_rules(cur):
+    cur.execute(
+      """
+      SELECT rule_id, rule_name, action, risk_level, precedence, condition
+      FROM FraudRules
+      WHERE active AND condition IS NOT NULL
+      ORDER BY rule_id;
+      """
+    )
+    rules = []
+    for row in cur.fetchall():
+        rule = dict(row)
+        rule["condition"] = validate_condition(rule["condition"])
+        rules.append(rule)
+    return rules
+
+def load_context(cur, batch, rules, replay=False):
+    """Fetch what the trigger would see besides the batch itself.
+
+    Returns (history, prior_activity): the accounts' other transactions
+    inside the widest rule window, and each account's previous activity
+    time: the later of last_activity_at (which may lag, see
+    db/migrations/013) and the latest earlier transaction. With
+    replay=True the batch is already stored, so last_activity_at is
+    ignored.
+    """
+    if not len(batch):
+        return TransactionBatch([], [], [], [], []), {}
+    accounts = np.unique(batch.account_id).tolist()
+    ids = batch.transaction_id.tolist()
+    widest = max((r["condition"]["window"]["seconds"]
+                  for r in rules if "window" in r["condition"]), default=0)
+
+    history = TransactionBatch([], [], [], [], [])
+    if widest:
+        cur.execute(
+          """
+          SELECT transaction_id, account_id, transaction_type, amount,
+                 transaction_time, details
+          FROM Transactions
+          WHERE account_id = ANY(%(accounts)s)
+            AND transaction_time > %(since)s::timestamp - make_interval(secs => %(widest)s)
+            AND transaction_time <= %(until)s
+            AND transaction_id <> ALL(%(ids)s);
+          """,
+          {
+            "accounts": accounts, "ids": ids, "widest": widest,
+            "since": batch.transaction_time.min().item(),
+            "until": batch.transaction_time.max().item(),
+          }
+        )
+        history = TransactionBatch.from_rows(cur.fetchall())
+
+    firsts = {}
+    for acct, ts in zip(batch.account_id.tolist(), batch.transaction_time.tolist()):
+        if acct not in firsts or ts < firsts[acct]:
+            firsts[acct] = ts
+    cur.execute(
+      f"""
+      SELECT a.account_id,
+             COALESCE(GREATEST({'NULL' if replay else 'a.last_activity_at'},
+                               (SELECT MAX(t.transaction_time)
+                                FROM Transactions t
+                                WHERE t.account_id = a.account_id
+                                  AND t.transaction_time < f.first_time
+                                  AND t.transaction_id <> ALL(%(ids)s))),
+                      a.created_at) AS prior
+      FROM Accounts a
+      JOIN unnest(%(accounts)s::int[], %(firsts)s::timestamp[]) AS f(account_id, first_time)
+        ON f.account_id = a.account_id;
+      """,
+      {"accounts": list(firsts), "firsts": list(firsts.values()), "ids": ids}
+    )
+    prior = {r["account_id"]: r["prior"] for r in cur.fetchall()}
+    return history, prior
+
+
+# ─── EVALUATION ──────────────────────────────────────────────────────────────
+def _predicate_mask(cols, pred):
+    values = cols[pred["field"]]
+    op, value = pred["op"], pred["value"]
+    if pred["field"] in NUMERIC_FIELDS:
+        present = ~np.isnan(values)
+        if op in ("in", "not_in"):
+            value = np.asarray(value, dtype=np.float64)
+    else:
+        present = np.array([v is not None for v in values], dtype=bool)
+        if op in ("in", "not_in"):
+            value = np.asarray(value, dtype=object)
+
+    if op == "=":
+        mask = values == value
+    elif op == "!=":
+        mask = values != value
+    elif op == ">":
+        mask = values > value
+    elif op == ">=":
+        mask = values >= value
+    elif op == "<":
+        mask = values < value
+    elif op == "<=":
+        mask = values <= value
+    elif op == "in":
+        mask = np.isin(values, value)
+    else:
+        mask = ~np.isin(values, value)
+    # SQL comparisons with NULL are never true.
+    return np.asarray(mask, dtype=bool) & present
+
+def _compare(values, op, value):
+    return {
+        "=": values == value, "!=": values != value,
+        ">": values > value,  ">=": values >= value,
+        "<": values < value,  "<=": values <= value,
+    }[op]
+
+def _idle_seconds(account_id, time_us, is_new, prior_activity):
+    # Previous activity per new row: the prior new row of the same account
+    # (LAG over the statement), else the account's prior activity.
+    idle = np.full(len(account_id), np.nan)
+    new_idx = np.flatnonzero(is_new)
+    acct, t = account_id[new_idx], time_us[new_idx]
+    prev = np.empty(len(new_idx), dtype=np.float64)
+    same = np.r_[False, acct[1:] == acct[:-1]]
+    prev[1:] = t[:-1]
+    for i in np.flatnonzero(~same):
+        p = prior_activity.get(int(acct[i]))
+        prev[i] = np.datetime64(p, "us").astype(np.int64) if p is not None else np.nan
+    idle[new_idx] = (t - prev) / 1e6
+    return idle
+
+def evaluate(batch, rules, history=None, prior_activity=None):
+    """Evaluate active rules over a batch.
+
+    Returns (logs, verdicts): TransactionLogs-shaped dicts for every
+    (transaction, rule) match in the batch, and {account_id: rule} with the
+    highest-precedence rule of each account's last flagged transaction.
+    """
+    prior_activity = prior_activity or {}
+    n_hist = len(history) if history is not None else 0
+    data = history.concat(batch) if n_hist else batch
+    is_new = np.r_[np.zeros(n_hist, dtype=bool), np.ones(len(batch), dtype=bool)]
+
+    time_us = data.transaction_time.astype(np.int64)
+    order = np.lexsort((data.transaction_id, time_us, data.account_id))
+    data, time_us, is_new = data.take(order), time_us[order], is_new[order]
+
+    cols = {
+        "amount":           data.amount,
+        "transaction_type": data.transaction_type,
+        "details":          data.details,
+    }
+    if any(p["field"] == "idle_seconds"
+           for r in rules for p in r["condition"]["where"]):
+        cols["idle_seconds"] = _idle_seconds(data.account_id, time_us, is_new, prior_activity)
+
+    keys = np.empty(len(data), dtype=KEY_DTYPE)
+    keys["account_id"], keys["time"], keys["transaction_id"] = (
+        data.account_id, time_us, data.transaction_id)
+    cents = np.round(data.amount * 100).astype(np.int64)
+
+    logs = []
+    for rule in rules:
+        cond = rule["condition"]
+        mask = np.ones(len(data), dtype=bool)
+        for pred in cond["where"]:
+            mask &= _predicate_mask(cols, pred)
+        hit = mask & is_new
+
+        window = cond.get("window")
+        if window is not None and hit.any():
+            # Rows in (t - seconds, t] of the same account that also pass
+            # `where`, found by binary search over the sorted keys.
+            eligible = keys[mask]
+            rows = np.flatnonzero(hit)
+            lower_keys = keys[rows].copy()
+            lower_keys["time"] -= int(window["seconds"] * 1e6)
+            lower_keys["transaction_id"] = INT64_MAX
+            upper = np.searchsorted(eligible, keys[rows], side="right")
+            lower = np.searchsorted(eligible, lower_keys, side="right")
+            if window["aggregate"] == "count":
+                agg = upper - lower
+                value = window["value"]
+            else:
+                csum = np.r_[0, np.cumsum(cents[mask])]
+                agg = csum[upper] - csum[lower]
+                value = window["value"] * 100
+            hit[rows] = _compare(agg, window["op"], value)
+
+        for tx_id, acct in zip(data.transaction_id[hit].tolist(), data.account_id[hit].tolist()):
+            logs.append({
+                "transaction_id": tx_id,
+                "account_id":     acct,
+                "rule_id":        rule["rule_id"],
+                "detected_rule":  rule["rule_name"],
+            })
+
+    by_id = {r["rule_id"]: r for r in rules}
+    verdicts = {}
+    # Last flagged transaction, then precedence, then rule_id (as the trigger).
+    for log in sorted(logs, key=lambda l: (l["transaction_id"],
+                                           by_id[l["rule_id"]]["precedence"],
+                                           l["rule_id"])):
+        verdicts[log["account_id"]] = by_id[log["rule_id"]]
+    return logs, verdicts
+
+
+# ─── REPLAY ──────────────────────────────────────────────────────────────────
+def replay(cur, since, until=None, batch_size=50000):
+    """Re-score stored transactions in [since, until) in keyset-ordered
+    batches. Yields (batch, logs, verdicts) per batch; nothing is written."""
+    rules = load_rules(cur)
+    key = (since, 0)
+    while True:
+        cur.execute(
+          """
+          SELECT transaction_id, account_id, transaction_type, amount,
+                 transaction_time, details
+          FROM Transactions
+          WHERE (transaction_time, transaction_id) > (%s, %s)
+            AND (%s::timestamp IS NULL OR transaction_time < %s)
+          ORDER BY transaction_time, transaction_id
+          LIMIT %s;
+          """,
+          (key[0], key[1], until, until, batch_size)
+        )
+        rows = cur.fetchall()
+        if not rows:
+            return
+        batch = TransactionBatch.from_rows(rows)
+        history, prior = load_context(cur, batch, rules, replay=True)
+        logs, verdicts = evaluate(batch, rules, history, prior)
+        yield batch, logs, verdicts
+        key = (rows[-1]["transaction_time"], rows[-1]["transaction_id"])
@@ -0,0 +1,78 @@
+# Structured FraudRules.condition, shared by the API and the SQL compiler in
+# db/migrations/006_compiled_fraud_rules.sql:
+#
+#   {"where":  [{"field": "amount", "op": ">", "value": 10000}, ...],
+#    "window": {"seconds": 300, "aggregate": "count", "op": ">", "value": 10}}
+
+NUMERIC_FIELDS = {"amount", "idle_seconds"}
+TEXT_FIELDS    = {"transaction_type", "details"}
+FIELDS         = NUMERIC_FIELDS | TEXT_FIELDS
+COMPARISONS    = {"=", "!=", ">", ">=", "<", "<="}
+OPERATORS      = COMPARISONS | {"in", "not_in"}
+AGGREGATES     = {"count", "sum"}
+
+
+class RuleError(ValueError):
+    pass
+
+
+def _number(value, what):
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise RuleError(f"{what} must be a number")
+    return value
+
+def _predicate(pred):
+    if not isinstance(pred, dict):
+        raise RuleError("where entries must be objects")
+    field, op, value = pred.get("field"), pred.get("op"), pred.get("value")
+    if field not in FIELDS:
+        raise RuleError(f"unknown field {field!r}; expected one of {sorted(FIELDS)}")
+    if op not in OPERATORS:
+        raise RuleError(f"unknown operator {op!r}; expected one of {sorted(OPERATORS)}")
+
+    values = value if op in ("in", "not_in") else [value]
+    if op in ("in", "not_in") and (not isinstance(value, list) or not value):
+        raise RuleError(f"{op} needs a non-empty list")
+    for v in values:
+        if field in NUMERIC_FIELDS:
+            _number(v, f"{field} value")
+        elif not isinstance(v, str):
+            raise RuleError(f"{field} value must be a string")
+        elif op not in ("=", "!=", "in", "not_in"):
+            raise RuleError(f"{field} only supports =, !=, in, not_in")
+    return {"field": field, "op": op, "value": value}
+
+def validate_condition(condition):
+    """Check a rule condition and return it normalized; raises RuleError."""
+    if not isinstance(condition, dict) or not condition:
+        raise RuleError("condition must be a non-empty object")
+    unknown = set(condition) - {"where", "window"}
+    if unknown:
+        raise RuleError(f"unknown condition keys: {sorted(unknown)}")
+
+    where = condition.get("where", [])
+    if not isinstance(where, list):
+        raise RuleError("where must be a list")
+    out = {"where": [_predicate(p) for p in where]}
+
+    window = condition.get("window")
+    if window is not None:
+        if not isinstance(window, dict):
+            raise RuleError("window must be an object")
+        if any(p["field"] == "idle_seconds" for p in out["where"]):
+            raise RuleError("idle_seconds cannot be combined with window")
+        if window.get("aggregate") not in AGGREGATES:
+            raise RuleError(f"window.aggregate must be one of {sorted(AGGREGATES)}")
+        if window.get("op") not in COMPARISONS:
+            raise RuleError(f"window.op must be one of {sorted(COMPARISONS)}")
+        if _number(window.get("seconds"), "window.seconds") <= 0:
+            raise RuleError("window.seconds must be positive")
+        out["window"] = {
+            "seconds":   window["seconds"],
+            "aggregate": window["aggregate"],
+            "op":        window["op"],
+            "value":     _number(window.get("value"), "window.value"),
+        }
+    elif not out["where"]:
+        raise RuleError("condition needs where predicates or a window")
+    return out
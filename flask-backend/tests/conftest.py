@@ -0,0 +1,35 @@
+# The app and its route tests run against the database at DATABASE_URL,
+# migrated with `flask --app app migrate`; without one they are skipped.
+import os
+import sys
+import uuid
+
+import psycopg2
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config
+from app import app
+from db import get_db_connection
+
+
+@pytest.fixture(scope="session")
+def client():
+    try:
+        psycopg2.connect(config.DATABASE_URL).close()
+    except psycopg2.OperationalError as err:
+        pytest.skip(f"no database at DATABASE_URL: {err}")
+    return app.test_client()
+
+@pytest.fixture(scope="session")
+def admin(client):
+    """(username, password) of an admin created for this run."""
+    username, password = f"test_admin_{uuid.uuid4().hex[:8]}", "password"
+    with get_db_connection() as conn, conn.cursor() as cur:
+        cur.execute(
+            "INSERT INTO Users (username, email, role, password) VALUES (%s, %s, 'admin', %s)",
+            (username, f"{username}@example.com", password)
+        )
+        conn.commit()
+    return username, password
@@ -67,7 +67,10 @@ export const createFraudRule = async (ruleData) => {
     headers: getAuthHeaders(),
     body: JSON.stringify(ruleData),
   });
-  if (!res.ok) throw new Error("Failed to create fraud rule");
+  if (!res.ok) {
+    const err = await res.json().catch(() => ({}));
+    throw new Error(err.error || "Failed to create fraud rule");
+  }
   return res.json();
 };
 
@@ -79,6 +82,64 @@ export const fetchFraudLogsAdmin = async () => {
   return res.json();
 };
 
+// Server-Sent Events from /admin/fraud-logs/events. Read with fetch rather
+// than EventSource, which cannot send the Authorization header. Calls
+// onResync() when the list must be (re)loaded, first right after connecting,
+// and onDelta({ rows, removed }) for changes. Reconnects after network
+// errors; onError(err) is called when the server refuses the stream.
+export const subscribeFraudLogEvents = ({ onResync, onDelta, onError }) => {
+  const controller = new AbortController();
+  let retryMs = 3000;
+
+  const dispatch = (block) => {
+    let event = "message";
+    let data = "";
+    for (const line of block.split("\n")) {
+      if (line.startsWith("event:")) event = line.slice(6).trim();
+      else if (line.startsWith("data:")) data += line.slice(5).trim();
+      else if (line.startsWith("retry:")) retryMs = Number(line.slice(6)) || retryMs;
+    }
+    if (event === "resync") onResync();
+    else if (event === "delta") onDelta(JSON.parse(data));
+  };
+
+  const connect = async () => {
+    while (!controller.signal.aborted) {
+      try {
+        const res = await fetch(`${API_BASE_URL}/admin/fraud-logs/events`, {
+          headers: getAuthHeaders(),
+          signal: controller.signal,
+        });
+        if (res.status >= 400 && res.status < 500) {
+          onError?.(new Error("Failed to open fraud log events"));
+          return;
+        }
+        if (!res.ok) throw new Error("Failed to open fraud log events");
+        const reader = res.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = "";
+        for (;;) {
+          const { value, done } = await reader.read();
+          if (done) break;
+          buffer += decoder.decode(value, { stream: true });
+          let end;
+          while ((end = buffer.indexOf("\n\n")) !== -1) {
+            dispatch(buffer.slice(0, end));
+            buffer = buffer.slice(end + 2);
+          }
+        }
+      } catch (err) {
+        if (controller.signal.aborted) return;
+        console.error(err);
+      }
+      await new Promise((resolve) => setTimeout(resolve, retryMs));
+    }
+  };
+
+  connect();
+  return () => controller.abort();
+};
+
 export const updateFraudAction = async ({ log_id, account_id, new_status }) => {
   const res = await fetch(`${API_BASE_URL}/admin/update-fraud-action`, {
     method: "POST",
@@ -89,6 +150,19 @@ export const updateFraudAction = async ({ log_id, account_id, new_status }) => {
   return res.json();
 };
 
+// Batch triage: [{ log_id | account_id, action }, ...] in one request and
+// one transaction. Resolves to { applied, failed, results } with a result
+// per operation; a failed operation does not fail the request.
+export const applyFraudActions = async (operations) => {
+  const res = await fetch(`${API_BASE_URL}/admin/fraud-logs/actions`, {
+    method: "POST",
+    headers: getAuthHeaders(),
+    body: JSON.stringify({ operations }),
+  });
+  if (!res.ok) throw new Error("Failed to apply fraud actions");
+  return res.json();
+};
+
 export const resolveFraud = async (logId) => {
   const res = await fetch(`${API_BASE_URL}/admin/resolve/${logId}`, {
     method: "POST",
@@ -147,12 +221,13 @@ export const transfer = async (source_id, dest_id, amount) => {
   return res.json();
 };
 
-export const fetchUserTransactions = async () => {
-  const res = await fetch(`${API_BASE_URL}/user/transactions`, {
+export const fetchUserTransactions = async (cursor) => {
+  const qs = cursor ? `?cursor=${encodeURIComponent(cursor)}` : "";
+  const res = await fetch(`${API_BASE_URL}/user/transactions${qs}`, {
     headers: getAuthHeaders(),
   });
   if (!res.ok) throw new Error("Failed to fetch your transactions");
-  return res.json();
+  return res.json(); // { items, next_cursor }
 };
 
 // ─── LEGACY ALIASES ──────────────────────────────────────────────────────────
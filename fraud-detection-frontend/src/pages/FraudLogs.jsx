@@ -1,4 +1,4 @@
-import React, { useEffect, useState } from "react";
+import React, { useCallback, useEffect, useRef, useState } from "react";
 import {
   Box,
   Paper,
@@ -14,46 +14,83 @@ import {
   MenuItem,
   CircularProgress,
 } from "@mui/material";
-import { fetchFraudLogs, updateFraudAction } from "../api/service";
+import {
+  fetchFraudLogs,
+  subscribeFraudLogEvents,
+  applyFraudActions,
+} from "../api/service";
 import { ToastContainer, toast } from "react-toastify";
 import "react-toastify/dist/ReactToastify.css";
 
+const sortLogs = (data) =>
+  data.sort((a, b) => {
+    // primary: account_id ascending
+    if (a.account_id !== b.account_id) {
+      return a.account_id - b.account_id;
+    }
+    // secondary: newest transaction_time first
+    return new Date(b.transaction_time) - new Date(a.transaction_time);
+  });
+
+// Merge a pushed change: changed rows replace their old version, and rows
+// deleted or no longer pending drop out.
+const applyDelta = (logs, { rows, removed }) => {
+  const gone = new Set([...removed, ...rows.map((r) => r.log_id)]);
+  const kept = logs.filter((l) => !gone.has(l.log_id));
+  return sortLogs([...kept, ...rows.filter((r) => r.status === "pending")]);
+};
+
 export default function FraudLogs() {
   const [logs, setLogs]       = useState(null);
   const [error, setError]     = useState(null);
   const [actions, setActions] = useState({});
+  // Deltas that arrive while the list is loading are applied after it.
+  const loading = useRef(false);
+  const pending = useRef([]);
 
   // 1) Load & sort logs
-  const loadFraudLogs = async () => {
+  const loadFraudLogs = useCallback(async () => {
     setLogs(null);
     setError(null);
+    loading.current = true;
+    pending.current = [];
     try {
       const data = await fetchFraudLogs();
-      data.sort((a, b) => {
-        // primary: account_id ascending
-        if (a.account_id !== b.account_id) {
-          return a.account_id - b.account_id;
-        }
-        // secondary: newest transaction_time first
-        return new Date(b.transaction_time) - new Date(a.transaction_time);
-      });
-      setLogs(data);
+      setLogs(pending.current.reduce(applyDelta, sortLogs(data)));
     } catch (err) {
       console.error(err);
       setError(err.message || "Failed to fetch fraud logs.");
-      setLogs([]); 
+      setLogs([]);
+    } finally {
+      loading.current = false;
     }
-  };
-
-  useEffect(() => {
-    loadFraudLogs();
   }, []);
 
+  // 2) Live updates; the stream's first event triggers the initial load
+  useEffect(
+    () =>
+      subscribeFraudLogEvents({
+        onResync: loadFraudLogs,
+        onDelta: (delta) => {
+          if (loading.current) {
+            pending.current.push(delta);
+          } else {
+            setLogs((prev) => (prev ? applyDelta(prev, delta) : prev));
+          }
+        },
+        onError: (err) => {
+          setError(err.message);
+          setLogs([]);
+        },
+      }),
+    [loadFraudLogs]
+  );
+
   const handleActionChange = (logId, value) => {
     setActions(prev => ({ ...prev, [logId]: value }));
   };
 
-  // 2) Apply action & remove all logs for that account
+  // 3) Apply action & remove all logs for that account
   const handleApplyAction = async (log) => {
     const newStatus = actions[log.log_id];
     if (!newStatus) {
@@ -61,11 +98,13 @@ export default function FraudLogs() {
     }
 
     try {
-      await updateFraudAction({
-        log_id:      log.log_id,
-        account_id:  log.account_id,
-        new_status:  newStatus,
-      });
+      // Applies to every pending log of the account, server-side too.
+      const { results } = await applyFraudActions([
+        { account_id: log.account_id, action: newStatus },
+      ]);
+      if (!results[0].ok) {
+        return toast.error(results[0].error);
+      }
       toast.success("Action applied successfully!");
       // Remove every log for this account
       setLogs(prev => prev.filter(l => l.account_id !== log.account_id));
@@ -29,6 +29,7 @@ export default function ManageFraudRules() {
     action:           "",
     risk_level:       "",
     precedence:       "",
+    condition:        "",
   });
 
   // Fetch rules from the server
@@ -52,9 +53,16 @@ export default function ManageFraudRules() {
 
   const handleSubmit = async (e) => {
     e.preventDefault();
+    let condition;
+    try {
+      condition = JSON.parse(formData.condition);
+    } catch {
+      alert("Condition must be valid JSON");
+      return;
+    }
     setSubmitting(true);
     try {
-      await createFraudRule(formData);
+      await createFraudRule({ ...formData, condition });
       // Clear form
       setFormData({
         rule_name:        "",
@@ -62,6 +70,7 @@ export default function ManageFraudRules() {
         action:           "",
         risk_level:       "",
         precedence:       "",
+        condition:        "",
       });
       loadRules();
     } catch (err) {
@@ -157,6 +166,17 @@ export default function ManageFraudRules() {
             required
             InputProps={{ inputProps: { min: 1 } }}
           />
+          <TextField
+            label="Condition (JSON)"
+            name="condition"
+            value={formData.condition}
+            onChange={handleChange}
+            multiline
+            rows={4}
+            required
+            placeholder='{"where": [{"field": "amount", "op": ">", "value": 10000}]}'
+            helperText='Optional window: {"seconds": 300, "aggregate": "count", "op": ">", "value": 10}'
+          />
           <Button
             type="submit"
             variant="contained"
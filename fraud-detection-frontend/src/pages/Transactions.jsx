@@ -20,16 +20,29 @@ export default function Transactions() {
   const [transactions, setTransactions] = useState([]);
   const [loading, setLoading]           = useState(true);
   const [error, setError]               = useState(null);
+  const [nextCursor, setNextCursor]     = useState(null);
 
   const loadTransactions = () => {
     setLoading(true);
     setError(null);
     fetchTransactions()
-      .then((data) => setTransactions(data))
+      .then((data) => {
+        setTransactions(data.items);
+        setNextCursor(data.next_cursor);
+      })
       .catch((err) => setError(err.message || "Failed to load transactions"))
       .finally(() => setLoading(false));
   };
 
+  const loadMore = () => {
+    fetchTransactions(nextCursor)
+      .then((data) => {
+        setTransactions((prev) => [...prev, ...data.items]);
+        setNextCursor(data.next_cursor);
+      })
+      .catch((err) => setError(err.message || "Failed to load transactions"));
+  };
+
   useEffect(() => {
     loadTransactions();
   }, []);
@@ -103,6 +116,14 @@ export default function Transactions() {
           </TableBody>
         </Table>
       </TableContainer>
+
+      {nextCursor && (
+        <Box textAlign="center" mt={2}>
+          <Button variant="outlined" onClick={loadMore}>
+            Load more
+          </Button>
+        </Box>
+      )}
     </Box>
   );
 }